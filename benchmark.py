@@ -0,0 +1,305 @@
+# Importing necessary modules for the benchmark suite.
+# The `argparse` module reads the benchmark options from the command line.
+# The `builtins` and `contextlib` modules let the interactive operations run without a user, by answering their
+# prompts from a script and discarding what they print.
+# The `json` module writes the results in a machine-readable form that can be compared between releases.
+# The `multiprocessing` module runs every measurement in a fresh process, so that peak memory is measured per operation.
+# The `os`, `platform`, `shutil`, `sys` and `tempfile` modules manage the scratch directory and describe the machine.
+# The `random` module generates the synthetic records, seeded so that every run uses the same data.
+# The `datetime` module generates the values of date fields.
+# The `time` module measures the latency of each call.
+# The `resource` module reports the peak memory of a process. It is not available on every platform; without it, peak
+# memory is reported as `null`.
+import argparse
+import builtins
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+import database_operations as db_ops
+import file_manager as fm
+from database import Database
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# The table sizes benchmarked by default, and how many times each operation is called. Whole-table operations
+# (loading and paging to the end) are much slower per call than single-record ones, so they are repeated less often.
+DEFAULT_ROWS = (1000, 100000, 1000000)
+DEFAULT_CALLS = 1000
+DEFAULT_TABLE_CALLS = 5
+DEFAULT_SCHEMAS = ("sample_system.json", "student_info_system.json")
+
+# The operations that can be benchmarked, in the order they run. Each one runs against the table left behind by the
+# one before it.
+OPERATIONS = ("load_data_file", "view_records", "view_records_last_page", "view_records_sorted", "aggregate",
+              "add_record", "edit_record", "delete_record")
+TABLE_OPERATIONS = ("load_data_file", "view_records_last_page", "view_records_sorted", "aggregate")
+
+# Fields this short get numeric values, so that sorted indexes and range queries have numbers to work on.
+NUMERIC_WIDTH = 4
+
+
+# This function generates one value for a field: a value of its type for typed fields, and for text fields a number
+# if the field is short and random letters otherwise, never longer than the maximum length of the field.
+def generate_value(max_length, rng, field_type="str"):
+    if field_type == "date":
+        return (datetime.date(1970, 1, 1) + datetime.timedelta(days=rng.randrange(20000))).isoformat()
+    if field_type == "float" and max_length >= 3:
+        return str(rng.randrange(10 ** (max_length - 2)) / 10)
+    if field_type in ("int", "float") or max_length <= NUMERIC_WIDTH:
+        return str(rng.randrange(10 ** min(max_length, 18)))
+    return "".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(1, max_length)))
+
+
+# This function yields `count` synthetic records that satisfy the field lengths and types of a schema.
+def generate_records(fields, count, seed=0, types=None):
+    types = types or {}
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield {field: generate_value(max_length, rng, types.get(field, "str")) for field, max_length in fields.items()}
+
+
+# This function creates a database filled with `count` synthetic records for the schema in `schema_path`, inside
+# `workdir`. It returns the name of the new database.
+def create_dataset(workdir, schema_path, count, storage, seed=0):
+    os.chdir(workdir)
+    with open(schema_path, 'r') as f:
+        fields, types = fm.parse_schema(json.load(f))
+    db_name = os.path.basename(schema_path)[:-len("_system.json")] + f"_{storage}_{count}"
+    with quiet_output():
+        fm.create_database_files(db_name, fields, storage, types)
+        fm.save_data_file(db_name, fm.assign_ids(list(generate_records(fields, count, seed, types))))
+    return db_name
+
+
+# The Discard class is a stand-in for `sys.stdout` that drops everything written to it, so the tables and messages
+# printed by the operations cost no terminal or file output during a measurement.
+class Discard:
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+# This context manager silences everything the operations print.
+def quiet_output():
+    return contextlib.redirect_stdout(Discard())
+
+
+# This context manager answers the `input()` prompts of the interactive operations from a list of answers.
+@contextlib.contextmanager
+def scripted_input(answers):
+    answers = iter(answers)
+    original_input = builtins.input
+    builtins.input = lambda prompt="": next(answers)
+    try:
+        yield
+    finally:
+        builtins.input = original_input
+
+
+# This function returns the number of bytes written by this process so far, as (bytes that reached the page cache,
+# bytes passed to write calls). The first count includes records changed through a memory-mapped record store, which
+# never go through a write call. Both are `None` where the kernel does not report them.
+def bytes_written():
+    try:
+        with open("/proc/self/io", 'r') as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["write_bytes"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+# This function returns the peak resident memory of this process in KiB, or `None` if it cannot be measured.
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes, Linux KiB
+
+
+# This function returns the given percentile of a sorted list of latencies.
+def percentile(latencies, share):
+    if not latencies:
+        return None
+    return latencies[min(int(share * len(latencies)), len(latencies) - 1)]
+
+
+# This function prepares the prompt answers for one call of an operation and returns the function to call.
+# Sorted views sort the table by its first field. Aggregates average the first numeric field of the schema, or count
+# the records if it has none. Record IDs for edits and deletes are picked at random from the IDs the table starts
+# with; deleted IDs are not picked twice.
+def prepare_call(operation, database, fields, rows, rng, deleted):
+    if operation == "load_data_file":
+        return lambda: fm.load_data_file(database.name), []
+    if operation == "view_records":
+        return lambda: db_ops.view_records(database), ["q"]
+    if operation == "view_records_last_page":
+        last_page = max((len(database) + db_ops.PAGE_SIZE - 1) // db_ops.PAGE_SIZE, 1)
+        return lambda: db_ops.view_records(database), [f"j {last_page}", "q"]
+    if operation == "view_records_sorted":
+        last_page = max((len(database) + db_ops.PAGE_SIZE - 1) // db_ops.PAGE_SIZE, 1)
+        return lambda: db_ops.view_records(database, order_by=list(fields)[0]), [f"j {last_page}", "q"]
+    types = database.types
+    if operation == "aggregate":
+        field = next((field for field, width in fields.items()
+                      if types.get(field) in ("int", "float") or width <= NUMERIC_WIDTH), None)
+        return lambda: db_ops.aggregate(database, "avg" if field else "count", field), []
+    if operation == "add_record":
+        values = [generate_value(width, rng, types.get(field, "str")) for field, width in fields.items()]
+        return lambda: db_ops.add_record(database), values
+
+    while True:
+        record_id = rng.randint(1, rows)
+        if record_id not in deleted:
+            break
+    if operation == "edit_record":
+        values = [generate_value(width, rng, types.get(field, "str")) for field, width in fields.items()]
+        return lambda: db_ops.edit_record(database, record_id), values
+    deleted.add(record_id)
+    return lambda: db_ops.delete_record(database, record_id), ["yes"]
+
+
+# This function measures one operation against a database and returns its results. It runs in a process of its own,
+# started from the directory that holds the database, so that peak memory reflects this operation alone.
+def measure(workdir, db_name, rows, operation, calls, seed):
+    os.chdir(workdir)
+    rng = random.Random(seed)
+    database = Database(db_name)
+    fields = database.fields  # Open the database before measuring, as a CLI session would
+    calls = min(calls, rows) if operation == "delete_record" else calls
+
+    latencies = []
+    deleted = set()
+    written_before, syscall_before = bytes_written()
+    started = time.perf_counter()
+    with quiet_output():
+        for _ in range(calls):
+            call, answers = prepare_call(operation, database, fields, rows, rng, deleted)
+            with scripted_input(answers):
+                call_started = time.perf_counter()
+                call()
+                latencies.append(time.perf_counter() - call_started)
+        close_started = time.perf_counter()
+        database.close()
+    close_seconds = time.perf_counter() - close_started
+    seconds = time.perf_counter() - started
+    written_after, syscall_after = bytes_written()
+
+    latencies.sort()
+    written = None if written_before is None else written_after - written_before
+    syscall_written = None if syscall_before is None else syscall_after - syscall_before
+    return {
+        "operation": operation,
+        "calls": calls,
+        "seconds": round(seconds, 6),
+        "close_seconds": round(close_seconds, 6),
+        "throughput_per_second": round(calls / seconds, 2) if seconds else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else None,
+            "p50": round(percentile(latencies, 0.50) * 1000, 4) if latencies else None,
+            "p90": round(percentile(latencies, 0.90) * 1000, 4) if latencies else None,
+            "p99": round(percentile(latencies, 0.99) * 1000, 4) if latencies else None,
+            "max": round(latencies[-1] * 1000, 4) if latencies else None,
+        },
+        "peak_rss_kb": peak_rss_kb(),
+        "bytes_written": written,
+        "bytes_written_per_call": round(written / calls, 1) if written is not None and calls else None,
+        "write_call_bytes": syscall_written,
+    }
+
+
+# This function runs the benchmark for every combination of schema, table size and storage format and returns the
+# results. Every table is generated afresh in a scratch directory that is removed afterwards. Tables are generated in
+# a separate process as well: a new process inherits the peak memory of the process that starts it, so this one has
+# to stay small for the measurements to be meaningful.
+def run_benchmarks(schemas, row_counts, storages, operations, calls, table_calls, seed=0):
+    context = multiprocessing.get_context("spawn")
+    results = []
+    workdir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        for schema_path in schemas:
+            schema_path = os.path.abspath(schema_path)
+            for rows in row_counts:
+                for storage in storages:
+                    print(f"Generating {rows} records for {os.path.basename(schema_path)} ({storage})...",
+                          file=sys.stderr)
+                    with context.Pool(1) as pool:
+                        db_name = pool.apply(create_dataset, (workdir, schema_path, rows, storage, seed))
+                    for operation in operations:
+                        count = table_calls if operation in TABLE_OPERATIONS else calls
+                        print(f"  {operation} x{count}", file=sys.stderr)
+                        with context.Pool(1) as pool:
+                            result = pool.apply(measure, (workdir, db_name, rows, operation, count, seed))
+                        results.append(dict({"schema": os.path.basename(schema_path), "storage": storage,
+                                             "rows": rows}, **result))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# This function parses a comma-separated list of table sizes, accepting suffixes such as "1k" and "1M".
+def parse_rows(text):
+    row_counts = []
+    for item in text.split(","):
+        item = item.strip().lower()
+        multiplier = {"k": 1000, "m": 1000000}.get(item[-1:], 1)
+        row_counts.append(int(item.rstrip("km")) * multiplier)
+    return row_counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the database operations on synthetic data.")
+    parser.add_argument("schemas", nargs="*", default=list(DEFAULT_SCHEMAS),
+                        help="system files (*_system.json) whose schemas the synthetic records follow")
+    parser.add_argument("--rows", type=parse_rows, default=list(DEFAULT_ROWS),
+                        help="comma-separated table sizes, e.g. 1k,100k,1M")
+    parser.add_argument("--storage", choices=("json", "binary", "zlib", "lzma", "columnar", "both", "all"),
+                        default="both",
+                        help="storage format; 'both' is json and binary, 'all' adds the compressed and columnar formats")
+    parser.add_argument("--operations", default=",".join(OPERATIONS),
+                        help="comma-separated operations to run: " + ", ".join(OPERATIONS))
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALLS, help="calls per single-record operation")
+    parser.add_argument("--table-calls", type=int, default=DEFAULT_TABLE_CALLS, help="calls per whole-table operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this file instead of standard output")
+    args = parser.parse_args(argv)
+
+    operations = [operation.strip() for operation in args.operations.split(",")]
+    unknown = [operation for operation in operations if operation not in OPERATIONS]
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(unknown)}")
+    storages = {"both": ["json", "binary"],
+                "all": ["json", "binary", "zlib", "lzma", "columnar"]}.get(args.storage, [args.storage])
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "seed": args.seed,
+        "results": run_benchmarks(args.schemas, args.rows, storages, operations, args.calls, args.table_calls,
+                                  args.seed),
+    }
+    output = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+        print(f"Results written to '{args.output}'.", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
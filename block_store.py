@@ -0,0 +1,236 @@
+# Importing necessary modules for the compressed, block-structured data files.
+# The `bisect` module finds the block holding a record position or ID in the block index.
+# The `json` module encodes the rows of a block and the block index.
+# The `lzma` and `zlib` modules compress the blocks; the codec is chosen when the database is created.
+# The `os` and `struct` modules read and write the file header and replace files atomically.
+import bisect
+import json
+import lzma
+import os
+import struct
+import zlib
+
+# A compressed data file starts with a fixed-size header: a magic marker, the format version, the codec, the number
+# of records per block, the number of stored records, and where the block index starts and how long it is.
+# The compressed blocks follow the header back to back, and the block index comes last.
+MAGIC = b"SDBZ"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQQQ")
+HEADER_SIZE = 64
+
+# The codecs a compressed data file can use, with the number identifying each in the header.
+CODECS = {"zlib": 1, "lzma": 2}
+DEFAULT_CODEC = "zlib"
+
+# The number of records packed into one block. Reading a single record decompresses the block holding it, so smaller
+# blocks make random access cheaper and larger ones compress better.
+BLOCK_RECORDS = 1000
+
+
+# This function returns the path of the compressed data file for a database.
+def data_path(db_name):
+    return f"{db_name}_data.zdb"
+
+
+# This function checks whether a database uses a compressed data file.
+def store_exists(db_name):
+    return os.path.exists(data_path(db_name))
+
+
+# These functions compress and decompress data with the named codec.
+def compress(data, codec):
+    return lzma.compress(data) if codec == "lzma" else zlib.compress(data)
+
+
+def decompress(data, codec):
+    return lzma.decompress(data) if codec == "lzma" else zlib.decompress(data)
+
+
+# This function returns the name of the codec identified by a number in the header.
+def codec_name(codec_id):
+    for name, number in CODECS.items():
+        if number == codec_id:
+            return name
+    raise ValueError(f"Unknown codec {codec_id}.")
+
+
+# This function turns a record into a row: its ID followed by the values of the fields in the order of the system file,
+# so field names are stored once for the whole file instead of once per record. The tombstone of a deleted record is
+# stored as a row holding only its ID.
+def encode_row(record, fields):
+    if record.get("_deleted"):
+        return [record["_id"]]
+    return [record["_id"]] + [str(record.get(field, "")) for field in fields]
+
+
+# This function turns a row back into a record (or a tombstone).
+def decode_row(row, fields):
+    if len(row) == 1:
+        return {"_id": row[0], "_deleted": True}
+    record = dict(zip(fields, row[1:]))
+    record["_id"] = row[0]
+    return record
+
+
+# This function writes records to the compressed data file of a database, replacing any previous file atomically.
+# `fields` lists the field names in the order of the system file. Records must carry their `_id`, in increasing order.
+def write_store(db_name, fields, records, codec=DEFAULT_CODEC, block_records=BLOCK_RECORDS):
+    fields = list(fields)
+    temp_file = data_path(db_name) + ".tmp"
+    blocks = []
+    count = 0
+    with open(temp_file, 'wb') as f:
+        f.seek(HEADER_SIZE)
+        rows = []
+        for record in records:
+            rows.append(encode_row(record, fields))
+            if len(rows) == block_records:
+                blocks.append(_write_block(f, rows, codec))
+                count += len(rows)
+                rows = []
+        if rows:
+            blocks.append(_write_block(f, rows, codec))
+            count += len(rows)
+        index = compress(json.dumps({"fields": fields, "blocks": blocks}, separators=(",", ":")).encode("utf-8"), codec)
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, CODECS[codec], block_records, count, index_offset, len(index))
+                .ljust(HEADER_SIZE, b"\0"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, data_path(db_name))
+
+
+# Compresses one block of rows at the end of the file and returns its entry for the block index:
+# [offset, length, number of records, first ID, last ID, number of live records].
+def _write_block(f, rows, codec):
+    data = compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), codec)
+    offset = f.tell()
+    f.write(data)
+    return [offset, len(data), len(rows), rows[0][0], rows[-1][0], sum(1 for row in rows if len(row) > 1)]
+
+
+# The BlockReader class reads records from a compressed data file without decompressing all of it. The header and
+# block index are read when the file is opened; reading a record, or a range of records, only reads and decompresses
+# the blocks that hold them. Positions count stored records, tombstones included, from 0. The most recently used
+# block is kept decompressed, so reading neighbouring records does not decompress the same block again.
+# A reader can also be created over the contents of the file already read into memory (`data`).
+class BlockReader:
+    def __init__(self, db_name=None, data=None):
+        self._data = data
+        self._file = open(data_path(db_name), 'rb') if data is None else None
+        try:
+            magic, version, codec_id, self.block_records, self.count, index_offset, index_length = \
+                HEADER.unpack(self._read(0, HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"'{data_path(db_name)}' is not a valid compressed data file.")
+            self.codec = codec_name(codec_id)
+            index = json.loads(decompress(self._read(index_offset, index_length), self.codec))
+        except (ValueError, struct.error, zlib.error, lzma.LZMAError) as e:
+            self.close()
+            raise ValueError(f"'{data_path(db_name)}' is not a valid compressed data file: {e}")
+        self.fields = index["fields"]
+        self.blocks = index["blocks"]
+        self._starts = []  # Position of the first record of each block
+        position = 0
+        for block in self.blocks:
+            self._starts.append(position)
+            position += block[2]
+        self._first_ids = [block[3] for block in self.blocks]
+        self._cached = (None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    # The number of live records, counted from the block index without reading any block.
+    @property
+    def live_count(self):
+        return sum(block[5] for block in self.blocks)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read(self, offset, length):
+        if self._data is not None:
+            return self._data[offset:offset + length]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    # Returns the decoded records of a block.
+    def read_block(self, number):
+        if self._cached[0] != number:
+            offset, length = self.blocks[number][:2]
+            rows = json.loads(decompress(self._read(offset, length), self.codec))
+            self._cached = (number, [decode_row(row, self.fields) for row in rows])
+        return self._cached[1]
+
+    # Returns the stored record at a position.
+    def read(self, position):
+        if not 0 <= position < self.count:
+            raise IndexError(f"Position {position} is out of range.")
+        number = bisect.bisect_right(self._starts, position) - 1
+        return self.read_block(number)[position - self._starts[number]]
+
+    # Returns the stored records from position `start` up to (not including) `stop`.
+    def read_range(self, start, stop=None):
+        return list(self.iter_from(start, stop))
+
+    # Yields the stored records from position `start` up to `stop`, decompressing one block at a time and skipping
+    # the blocks before `start` entirely.
+    def iter_from(self, start=0, stop=None):
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        number = bisect.bisect_right(self._starts, start) - 1
+        position = self._starts[number]
+        while position < stop:
+            records = self.read_block(number)
+            for record in records[max(start - position, 0):stop - position]:
+                yield record
+            position += len(records)
+            number += 1
+
+    # Yields the live records, skipping the first `start` of them. Blocks that hold only skipped records are not read.
+    def iter_live(self, start=0):
+        for number, block in enumerate(self.blocks):
+            if start >= block[5]:
+                start -= block[5]
+                continue
+            for record in self.read_block(number):
+                if record.get("_deleted"):
+                    continue
+                if start > 0:
+                    start -= 1
+                    continue
+                yield record
+
+    # Returns the stored record with the given ID (a tombstone if it was deleted), or `None` if there is none.
+    # The block is found by binary search over the first ID of each block.
+    def get(self, record_id):
+        number = bisect.bisect_right(self._first_ids, record_id) - 1
+        if number < 0 or record_id > self.blocks[number][4]:
+            return None
+        records = self.read_block(number)
+        ids = [record["_id"] for record in records]
+        at = bisect.bisect_left(ids, record_id)
+        if at < len(ids) and ids[at] == record_id:
+            return records[at]
+        return None
+
+    def read_all(self):
+        return list(self.iter_from(0))
+
+
+# This function returns the codec of the compressed data file of a database.
+def store_codec(db_name):
+    with open(data_path(db_name), 'rb') as f:
+        return codec_name(HEADER.unpack(f.read(HEADER.size))[2])
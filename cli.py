@@ -1,31 +1,61 @@
 # Importing necessary modules. The `os` module is used to interact with the file system for listing and managing files.
+# The `argparse`, `contextlib`, `json` and `sys` modules support the non-interactive script mode, which reads commands
+# as JSON Lines and reports a JSON result for each of them.
+# The `instrumentation` module provides the `--profile` option.
+# The `block_store` module lists the codecs that compressed databases can use.
+# The `time` module formats the modification times shown in the list of databases.
 # Custom modules `file_manager` and `database_operations` are used to handle file-level operations and database-specific 
 # operations such as adding, editing, and deleting records.
+import argparse
+import contextlib
+import json
 import os
+import sys
+import time
+import block_store as bs
 import file_manager as fm
 import database_operations as db_ops
+import instrumentation as instr
+from database import Database
 
 # This function displays the main menu for the Simple DBMS application. It provides options for users to create a new database, 
-# open an existing one, delete a database, or exit the program. The menu is shown repeatedly until the user selects "Exit."
+# open an existing one, delete a database, rebuild the database catalog, or exit the program. The menu is shown repeatedly
+# until the user selects "Exit."
 def main_menu():
     print("\nSimple DBMS Main Menu")
     print("1. Create a new database")
     print("2. Open an existing database")
     print("3. Delete a database")
-    print("4. Exit")
+    print("4. Rebuild the database catalog")
+    print("5. Exit")
 
 # The database menu function displays additional options once a specific database is opened. 
-# Users can add new records, edit existing ones, delete records, view all records, or go back to the main menu.
-def database_menu(db_name):
-    print(f"\nDatabase Menu - {db_name}")
+# Users can add new records, edit existing ones, delete records, view all records, index and search fields,
+# query records, import or export records in bulk, compact the database, group changes in a transaction, or go back
+# to the main menu. While a transaction is open, the number of changes it holds is shown.
+def database_menu(db_name, transaction=None):
+    if transaction is None:
+        print(f"\nDatabase Menu - {db_name}")
+    else:
+        print(f"\nDatabase Menu - {db_name} (transaction open, {len(transaction)} change(s))")
     print("1. Add a record")
     print("2. Edit a record")
     print("3. Delete a record")
     print("4. View all records")
-    print("5. Back to Main Menu")
+    print("5. Create an index")
+    print("6. Find records by field")
+    print("7. Query records")
+    print("8. Import records from CSV / JSON Lines")
+    print("9. Export records to CSV / JSON Lines")
+    print("10. Compact the database")
+    print("11. Aggregate records")
+    print("12. Begin a transaction")
+    print("13. Commit the transaction")
+    print("14. Roll back the transaction")
+    print("15. Back to Main Menu")
 
 # The create_database function allows users to create a new database. It prompts the user to provide a database name 
-# and define its structure by specifying field names and their maximum lengths. The function validates the inputs, 
+# and define its structure by specifying field names, their maximum lengths and, optionally, their types. The function validates the inputs, 
 # ensures the database doesn't already exist, and uses the file_manager module to create necessary files.
 def create_database():
     db_name = input("Enter the name of the new database: ").strip()
@@ -38,6 +68,7 @@ def create_database():
         return
 
     fields = {}
+    types = {}
     while True:
         field_name = input("Enter field name (or type 'done' to finish): ").strip()
         if field_name.lower() == 'done':
@@ -54,12 +85,24 @@ def create_database():
             if max_length <= 0:
                 print("Maximum length must be a positive integer.")
                 continue
-            fields[field_name] = max_length
         except ValueError:
             print("Please enter a valid integer for field length.")
+            continue
+        field_type = input(f"Type of field '{field_name}' - {', '.join(fm.FIELD_TYPES)} (default str): "
+                           ).strip().lower() or "str"
+        if field_type not in fm.FIELD_TYPES:
+            print(f"Unknown type '{field_type}'. Using str.")
+            field_type = "str"
+        fields[field_name] = max_length
+        types[field_name] = field_type
 
     if fields:
-        success = fm.create_database_files(db_name, fields)
+        storage = input("Storage format - 'json', fixed-width 'binary', compressed 'zlib'/'lzma', or typed 'columnar' "
+                        "(default json): ").strip().lower() or "json"
+        if storage not in ("json", "binary", "columnar") + tuple(bs.CODECS):
+            print(f"Unknown storage format '{storage}'. Using json.")
+            storage = "json"
+        success = fm.create_database_files(db_name, fields, storage, types)
         if success:
             print(f"Database '{db_name}' created successfully with fields: {fields}")
         else:
@@ -67,24 +110,33 @@ def create_database():
     else:
         print("No fields defined. Database creation aborted.")
 
-# This function displays a list of all available databases by scanning the current directory for database files. 
-# Each database is identified by a system file that ends with '_system.json'. If no databases are found, 
-# the user is informed accordingly.
+# This function displays a list of all available databases, as recorded in the database catalog, with the storage
+# format, number of records, size and last modification time of each. If no databases are found, the user is
+# informed accordingly.
 def display_databases():
-    databases = [file.replace('_system.json', '') for file in os.listdir() if file.endswith('_system.json')]
-    if not databases:
+    catalog = fm.load_catalog()
+    if not catalog:
         print("No databases found.")
     else:
         print("Available Databases:")
-        for i, db in enumerate(databases, start=1):
-            print(f"{i}. {db}")
+        for i, db in enumerate(sorted(catalog), start=1):
+            entry = catalog[db]
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["modified"]))
+            print(f"{i}. {db} ({entry['storage']}, {entry['rows']} records, {entry['size']} bytes, modified {modified})")
+
+# This function rebuilds the database catalog from the files in the current directory, for when databases were added
+# or removed without going through this program.
+def rebuild_catalog():
+    catalog = fm.rebuild_catalog()
+    print(f"Catalog rebuilt: {len(catalog)} database(s) found.")
 
 # The open_database function allows users to interact with an existing database. 
 # It displays the list of databases, lets the user select one, and then presents a database menu for further actions 
 # like adding, editing, deleting, or viewing records. The function validates user inputs and performs corresponding operations 
-# through the database_operations module.
+# through the database_operations module. Records added, edited or deleted while a transaction is open go into the
+# transaction; a transaction still open when the user goes back is committed or rolled back, as the user chooses.
 def open_database():
-    databases = [file.replace('_system.json', '') for file in os.listdir() if file.endswith('_system.json')]
+    databases = fm.list_databases()
 
     if not databases:
         print("No databases found. Returning to the main menu.")
@@ -97,35 +149,103 @@ def open_database():
         print(f"Database '{db_name}' does not exist.")
         return
 
+    # The database is opened once for the whole session; its schema and records stay in memory between menu actions.
+    database = Database(db_name)
+    transaction = None
     while True:
-        database_menu(db_name)
+        database_menu(db_name, transaction)
         choice = input("Select an option: ").strip()
 
         if choice == "1":
-            db_ops.add_record(db_name)
+            db_ops.add_record(database, transaction)
         elif choice == "2":
             try:
-                record_index = int(input("Enter the index of the record to edit: ")) - 1
-                db_ops.edit_record(db_name, record_index)
+                record_id = int(input("Enter the ID of the record to edit: "))
+                db_ops.edit_record(database, record_id, transaction)
             except ValueError:
-                print("Invalid input. Please enter a valid integer for the record index.")
+                print("Invalid input. Please enter a valid integer for the record ID.")
         elif choice == "3":
             try:
-                record_index = int(input("Enter the index of the record to delete: ")) - 1
-                db_ops.delete_record(db_name, record_index)
+                record_id = int(input("Enter the ID of the record to delete: "))
+                db_ops.delete_record(database, record_id, transaction)
             except ValueError:
-                print("Invalid input. Please enter a valid integer for the record index.")
+                print("Invalid input. Please enter a valid integer for the record ID.")
         elif choice == "4":
-            db_ops.view_records(db_name)
+            order_by, descending = db_ops.prompt_order(database.fields,
+                                                       "Sort by fields (comma-separated, prefix with '-' for "
+                                                       "descending; blank for insertion order): ")
+            if order_by is not None:
+                db_ops.view_records(database, order_by=order_by, descending=descending)
         elif choice == "5":
+            db_ops.create_index(database)
+        elif choice == "6":
+            db_ops.find_records(database)
+        elif choice == "7":
+            db_ops.query_records(database)
+        elif choice == "8":
+            import_records(database)
+        elif choice == "9":
+            export_records(database)
+        elif choice == "10":
+            db_ops.compact_database(database)
+        elif choice == "11":
+            db_ops.aggregate_records(database)
+        elif choice == "12":
+            if transaction is not None:
+                print("A transaction is already open.")
+            else:
+                transaction = db_ops.begin(database)
+                print("Transaction started. Changes are applied when it is committed.")
+        elif choice in ("13", "14"):
+            if transaction is None:
+                print("No transaction is open.")
+            elif choice == "13":
+                db_ops.commit(transaction)
+                transaction = None
+            else:
+                db_ops.rollback(transaction)
+                transaction = None
+        elif choice == "15":
+            if transaction is not None:
+                confirm = input(f"Commit the open transaction ({len(transaction)} change(s))? (yes/no): ")
+                if confirm.strip().lower() == 'yes':
+                    db_ops.commit(transaction)
+                else:
+                    db_ops.rollback(transaction)
             break
         else:
             print("Invalid choice. Please try again.")
+    database.close()
+
+# The import_records function loads records in bulk from a CSV or JSON Lines file into the open database.
+# Pending changes are flushed first, since the import rewrites the data file in one go.
+def import_records(database):
+    path = input("Enter the path of the CSV or JSON Lines file to import: ").strip()
+    if not os.path.exists(path):
+        print(f"File '{path}' not found.")
+        return
+    database.flush()
+    fm.import_records(database.name, path)
+
+# The export_records function writes every record of the open database to a CSV or JSON Lines file, in insertion
+# order or sorted by the fields the user chooses.
+def export_records(database):
+    path = input("Enter the path of the CSV or JSON Lines file to export to: ").strip()
+    if not path:
+        print("File path cannot be empty.")
+        return
+    order_by, descending = db_ops.prompt_order(database.fields,
+                                               "Sort by fields (comma-separated, prefix with '-' for descending; "
+                                               "blank for insertion order): ")
+    if order_by is None:
+        return
+    database.flush()
+    fm.export_records(database.name, path, order_by=order_by, descending=descending)
 
 # The delete_database function allows users to remove an existing database. It lists all databases, lets the user select one, 
 # and asks for confirmation before proceeding with deletion. The deletion process is handled by the file_manager module.
 def delete_database():
-    databases = [file.replace('_system.json', '') for file in os.listdir() if file.endswith('_system.json')]
+    databases = fm.list_databases()
 
     if not databases:
         print("No databases found. Returning to the main menu.")
@@ -144,6 +264,50 @@ def delete_database():
     else:
         print("Deletion canceled.")
 
+# The run_script function runs commands against a database without any menus. Commands are read from `script` (an
+# open file) as JSON objects, one per line, in the format of `database_operations.execute_command`, for example
+# `{"op": "add", "record": {...}}`. The database is opened once and every command runs inside a single batch, which
+# is committed when the script ends. One JSON result per command is written to `output`: the line number, the op,
+# whether it succeeded, and its result or error. The results are written once the batch is committed; if it cannot
+# be, every change the script made is reported as failed. Messages the operations print are sent to standard error,
+# so the output stays machine-readable. It returns the number of commands that failed.
+def run_script(db_name, script, output=sys.stdout):
+    if not fm.database_exists(db_name):
+        print(f"Database '{db_name}' does not exist.", file=sys.stderr)
+        return 1
+
+    failures = 0
+    results = []
+    database = Database(db_name)
+    try:
+        with contextlib.redirect_stdout(sys.stderr), database.batch():
+            for line_number, line in enumerate(script, start=1):
+                if not line.strip():
+                    continue
+                result = {"line": line_number}
+                try:
+                    command = json.loads(line)
+                    result["op"] = command.get("op") if isinstance(command, dict) else None
+                    outcome = db_ops.execute_command(database, command)
+                    result["ok"] = True
+                    result.update(outcome)
+                except (ValueError, TypeError) as e:  # json.JSONDecodeError is a ValueError
+                    result.update(ok=False, error=str(e))
+                    failures += 1
+                results.append(result)
+    except ValueError as e:
+        for position, result in enumerate(results):
+            if result["ok"] and result["op"] in db_ops.WRITE_OPERATIONS:
+                results[position] = {"line": result["line"], "op": result["op"], "ok": False,
+                                     "error": f"the batch could not be committed: {e}"}
+                failures += 1
+    for result in results:
+        output.write(json.dumps(result) + "\n")
+    with contextlib.redirect_stdout(sys.stderr):
+        database.close()
+    output.flush()
+    return failures
+
 # The run_cli function serves as the entry point for the Simple DBMS application. 
 # It displays the main menu and executes the corresponding functionality based on user input. 
 # The loop continues until the user selects the "Exit" option.
@@ -159,11 +323,48 @@ def run_cli():
         elif option == '3':
             delete_database()
         elif option == '4':
+            rebuild_catalog()
+        elif option == '5':
             print("Exiting the program.")
             break
         else:
             print("Invalid option, please try again.")
 
+# The main function starts the interactive menus, or runs a command script when a database and script are given:
+#   python cli.py --database students --script commands.jsonl
+#   producer | python cli.py --database students --script -
+# The exit status is 1 if any command of the script failed. With `--profile`, a summary of where the time went is
+# printed on exit; `--profile out.prof` also writes a cProfile profile to that file.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simple DBMS")
+    parser.add_argument("--database", help="database to run the script against")
+    parser.add_argument("--script", help="file of JSON Lines commands to run, or '-' for standard input")
+    parser.add_argument("--rebuild-catalog", action="store_true",
+                        help="rebuild the database catalog from the files in the current directory and exit")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="PATH",
+                        help=f"print timings and counters on exit, and write a cProfile profile to PATH if given "
+                             f"(also enabled by the {instr.ENV_VAR} environment variable)")
+    args = parser.parse_args(argv)
+    if args.profile:
+        instr.enable(None if args.profile == "1" else args.profile)
+
+    if args.rebuild_catalog:
+        rebuild_catalog()
+        return 0
+    if args.script is None:
+        run_cli()
+        return 0
+    if not args.database:
+        parser.error("--script requires --database")
+    if args.script == "-":
+        return 1 if run_script(args.database, sys.stdin) else 0
+    try:
+        with open(args.script, 'r') as script:
+            return 1 if run_script(args.database, script) else 0
+    except IOError as e:
+        print(f"Error reading script '{args.script}': {e}", file=sys.stderr)
+        return 1
+
 # This condition ensures the script runs the CLI only when executed directly (not when imported as a module).
 if __name__ == "__main__":
-    run_cli()
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# Importing necessary modules for the database client.
+# The `socket` module connects to the database server over TCP or a Unix socket.
+# The `argparse`, `json` and `sys` modules read requests and print responses when the client is run from the shell.
+# The `itertools` module numbers the requests so that responses can be matched to them.
+import argparse
+import itertools
+import json
+import socket
+import sys
+
+# The address of the server, matching the defaults of `server.py`.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+# The Client class talks to a database server (see `server.py`). Each method sends one request and waits for its
+# response; `pipeline` sends many requests before reading any response, which lets the server commit their writes
+# together. Failed requests raise `ValueError` with the error reported by the server.
+#
+#   with Client() as client:
+#       record_id = client.add("students", {"Roll No": "1", "fname": "Ali", ...})
+#       print(client.query("students", "class=5", limit=10))
+class Client:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, timeout=None):
+        if unix_path:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(unix_path)
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._socket.settimeout(timeout)
+        self._file = self._socket.makefile('rwb')
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def _send(self, request):
+        self._file.write((json.dumps(request) + "\n").encode("utf-8"))
+
+    def _receive(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        return json.loads(line)
+
+    # Sends many requests at once and returns their responses, in the order of the requests. Responses are dicts with
+    # "ok" and either "result" or "error"; failed requests do not raise.
+    def pipeline(self, requests):
+        ids = []
+        for request in requests:
+            request = dict(request, request_id=next(self._ids))
+            ids.append(request["request_id"])
+            self._send(request)
+        self._file.flush()
+        responses = {}
+        while len(responses) < len(ids):
+            response = self._receive()
+            responses[response.get("request_id")] = response
+        return [responses[request_id] for request_id in ids]
+
+    # Sends one request and returns its result.
+    def request(self, db_name, op, **arguments):
+        response = self.pipeline([dict(arguments, db=db_name, op=op)])[0]
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    def list_databases(self):
+        return self.request(None, "list")["databases"]
+
+    def add(self, db_name, record):
+        return self.request(db_name, "add", record=record)["id"]
+
+    def edit(self, db_name, record_id, record):
+        self.request(db_name, "edit", id=record_id, record=record)
+
+    def delete(self, db_name, record_id):
+        self.request(db_name, "delete", id=record_id)
+
+    # Makes several changes at once: `commands` are "add", "edit" and "delete" requests without "db", for example
+    # `{"op": "delete", "id": 3}`. Either all of them are made or, if one fails, none. It returns the record IDs of
+    # the changes, the new IDs for added records.
+    def transaction(self, db_name, commands):
+        return self.request(db_name, "transaction", commands=commands)["ids"]
+
+    def get(self, db_name, record_id):
+        return self.request(db_name, "get", id=record_id)["record"]
+
+    # Returns a page of records, starting at the 0-based position `start`, and the total number of records.
+    def view(self, db_name, start=0, limit=20):
+        result = self.request(db_name, "view", start=start, limit=limit)
+        return result["records"], result["total"]
+
+    def query(self, db_name, where=None, fields=None, order_by=None, limit=None, descending=False):
+        return self.request(db_name, "query", where=where, fields=fields, order_by=order_by, limit=limit,
+                            descending=descending)["records"]
+
+    # Returns a single value, or a list of [group, value] pairs when `group_by` is given.
+    def aggregate(self, db_name, func, field=None, group_by=None, where=None):
+        result = self.request(db_name, "aggregate", func=func, field=field, group_by=group_by, where=where)
+        return result["groups"] if group_by is not None else result["value"]
+
+
+# Run from the shell, the client sends the requests read from standard input (one JSON object per line, as in the
+# protocol of `server.py`) and prints the responses, one per line.
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send line-delimited JSON requests to a Simple DBMS server.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket at PATH instead of TCP")
+    parser.add_argument("--database", help="database for requests that do not name one")
+    args = parser.parse_args(argv)
+
+    requests = []
+    for line in sys.stdin:
+        if line.strip():
+            request = json.loads(line)
+            request.setdefault("db", args.database)
+            requests.append(request)
+    with Client(args.host, args.port, args.unix) as client:
+        responses = client.pipeline(requests)
+    for response in responses:
+        response.pop("request_id", None)
+        print(json.dumps(response))
+    return 0 if all(response["ok"] for response in responses) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
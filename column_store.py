@@ -0,0 +1,331 @@
+# Importing necessary modules for the columnar data files.
+# The `json` module encodes the column directory stored at the end of the file.
+# The `math` module tells finite numbers from the words "nan" and "inf" in condition values.
+# The `os` and `struct` modules read and write the file header and replace files atomically.
+# The `numpy` module holds every column as one typed array and computes aggregates over whole columns at once. It is
+# an optional dependency: without it, columnar databases cannot be created or read, but every other storage format
+# works as before.
+import json
+import math
+import os
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# A columnar data file starts with a fixed-size header: a magic marker, the format version, the number of stored
+# records (tombstones included), and where the column directory starts and how long it is. The columns follow the
+# header back to back, each one a contiguous array with one value per stored record, and the directory comes last.
+MAGIC = b"SDBC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQQ")
+HEADER_SIZE = 64
+
+# Besides one column per field, every file has a column with the record IDs and one telling which records are
+# tombstones of deleted records.
+ID_COLUMN = "_id"
+DELETED_COLUMN = "_deleted"
+
+# The value stored for a tombstone in a typed column, which has no empty value.
+TOMBSTONE_VALUES = {"int": "0", "float": "0", "date": "NaT"}
+
+# The aggregates that can be computed over a column.
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+
+# Live records are turned back into dicts this many at a time when a columnar file is read record by record.
+READ_CHUNK = 10000
+
+
+# This function returns the path of the columnar data file for a database.
+def data_path(db_name):
+    return f"{db_name}_data.col"
+
+
+# This function checks whether a database uses a columnar data file.
+def store_exists(db_name):
+    return os.path.exists(data_path(db_name))
+
+
+# This function raises `ValueError` if NumPy, which the columnar files need, is not installed.
+def require_numpy():
+    if np is None:
+        raise ValueError("Columnar storage needs NumPy, which is not installed.")
+
+
+# This function returns the NumPy type of the column of a field: 64-bit integers and floats, dates counted in days,
+# and fixed-width text as long as the maximum length of the field.
+def column_dtype(field_type, max_length):
+    if field_type == "int":
+        return np.dtype("<i8")
+    if field_type == "float":
+        return np.dtype("<f8")
+    if field_type == "date":
+        return np.dtype("<M8[D]")
+    return np.dtype(f"<U{max_length}")
+
+
+# This function converts the values of a field, given as strings, into a column of its type.
+def to_column(field, values, field_type, max_length):
+    try:
+        return np.array(values, dtype=str).astype(column_dtype(field_type, max_length))
+    except ValueError as e:
+        raise ValueError(f"'{field}' holds a value that is not a valid {field_type}: {e}")
+
+
+# This function returns the strings that values of a typed field, given as strings, read back as once they are stored
+# in a column: "044" reads back as "44" from an int column and "2" as "2.0" from a float column. Values that are
+# already in this form read back unchanged. It raises `ValueError` for a value that is not valid for the type.
+def canonical_values(values, field_type):
+    require_numpy()
+    if field_type == "str":
+        return list(values)
+    return to_column("value", list(values), field_type, 1).astype(str).tolist()
+
+
+# This function turns a value read from a column into a plain Python value: a number, or a string for text and dates.
+def python_value(value):
+    if isinstance(value, np.datetime64):
+        return str(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# This function writes records to the columnar data file of a database, replacing any previous file atomically.
+# `fields` maps the field names to their maximum lengths and `types` maps them to their types (see
+# `file_manager.FIELD_TYPES`). Records must carry their `_id`. A value that does not fit the type of its field raises
+# `ValueError` and leaves the previous file in place. Typed values read back in canonical form (see
+# `canonical_values`), which is why columnar databases only accept typed values already written that way.
+def write_store(db_name, fields, types, records):
+    require_numpy()
+    records = list(records)
+    columns = {
+        ID_COLUMN: np.array([record["_id"] for record in records], dtype="<i8"),
+        DELETED_COLUMN: np.array([bool(record.get("_deleted")) for record in records], dtype="|b1"),
+    }
+    for field, max_length in fields.items():
+        field_type = types.get(field, "str")
+        filler = TOMBSTONE_VALUES.get(field_type, "")
+        values = [filler if record.get("_deleted") else str(record.get(field, "")) for record in records]
+        columns[field] = to_column(field, values, field_type, max_length)
+
+    directory = {"fields": dict(fields), "types": {field: types.get(field, "str") for field in fields}, "columns": {}}
+    temp_file = data_path(db_name) + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.seek(HEADER_SIZE)
+        for name, column in columns.items():
+            directory["columns"][name] = [f.tell(), column.dtype.str]
+            f.write(column.tobytes())
+        directory_bytes = json.dumps(directory, separators=(",", ":")).encode("utf-8")
+        directory_offset = f.tell()
+        f.write(directory_bytes)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(records), directory_offset, len(directory_bytes))
+                .ljust(HEADER_SIZE, b"\0"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, data_path(db_name))
+
+
+# The ColumnReader class reads the columns of a columnar data file. The header and column directory are read when
+# the file is opened; a column is only read when it is first asked for, so an aggregate over one field reads that
+# field (and the tombstone column) and nothing else. Columns of a file on disk are memory-mapped, so taking a few
+# values out of a column only reads the pages holding them. A reader can also be created over the contents of the
+# file already read into memory (`data`).
+class ColumnReader:
+    def __init__(self, db_name=None, data=None):
+        require_numpy()
+        self._data = data
+        self._file = open(data_path(db_name), 'rb') if data is None else None
+        try:
+            magic, version, _, self.count, directory_offset, directory_length = \
+                HEADER.unpack(self._read(0, HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"'{data_path(db_name)}' is not a valid columnar data file.")
+            directory = json.loads(self._read(directory_offset, directory_length))
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise ValueError(f"'{data_path(db_name)}' is not a valid columnar data file: {e}")
+        self.fields = directory["fields"]
+        self.types = directory["types"]
+        self._directory = directory["columns"]
+        self._columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._columns = {}
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read(self, offset, length):
+        if self._data is not None:
+            return self._data[offset:offset + length]
+        self._file.seek(offset)
+        return self._file.read(length)
+
+    # Returns the column with the given name as a NumPy array with one value per stored record.
+    def column(self, name):
+        if name not in self._columns:
+            offset, dtype = self._directory[name]
+            dtype = np.dtype(dtype)
+            if self.count == 0:
+                column = np.empty(0, dtype=dtype)
+            elif self._data is not None:
+                column = np.frombuffer(self._data, dtype=dtype, count=self.count, offset=offset)
+            else:
+                column = np.memmap(self._file, dtype=dtype, mode='r', offset=offset, shape=(self.count,))
+            self._columns[name] = column
+        return self._columns[name]
+
+    # A boolean array that is true for the stored records that have not been deleted.
+    def live_mask(self):
+        return ~self.column(DELETED_COLUMN)
+
+    # The number of live records, counted from the tombstone column alone.
+    @property
+    def live_count(self):
+        return int(np.count_nonzero(self.live_mask()))
+
+    # Returns the records at the given positions as dicts of strings, the way every other storage format holds them.
+    # Tombstones come back as `{"_id": ..., "_deleted": True}`.
+    def records_at(self, positions):
+        ids = self.column(ID_COLUMN)[positions].tolist()
+        deleted = self.column(DELETED_COLUMN)[positions].tolist()
+        values = {field: self.column(field)[positions].astype(str).tolist() for field in self.fields}
+        records = []
+        for i, record_id in enumerate(ids):
+            if deleted[i]:
+                records.append({"_id": record_id, "_deleted": True})
+                continue
+            record = {field: values[field][i] for field in self.fields}
+            record["_id"] = record_id
+            records.append(record)
+        return records
+
+    def read_all(self):
+        return self.records_at(np.arange(self.count))
+
+    # Yields the live records, skipping the first `start` of them, converting them to dicts a chunk at a time.
+    def iter_live(self, start=0):
+        positions = np.flatnonzero(self.live_mask())[start:]
+        for chunk_start in range(0, len(positions), READ_CHUNK):
+            yield from self.records_at(positions[chunk_start:chunk_start + READ_CHUNK])
+
+    # Returns the live records at the positions from `start` up to (not including) `stop`.
+    def live_records_between(self, start, stop):
+        return self.records_at(np.flatnonzero(self.live_mask()[start:stop]) + start)
+
+    # Returns the values of a field in the records selected by `mask` as numbers, for sums and averages. Text values
+    # are converted if every selected one is a number; dates cannot be added up. Only the selected values are
+    # converted, so text in records that are not aggregated (or in tombstones) does not get in the way.
+    def numeric_column(self, field, mask):
+        field_type = self.types[field]
+        if field_type == "date":
+            raise ValueError(f"'{field}' holds dates, which cannot be summed or averaged.")
+        column = self.column(field)[mask]
+        if field_type == "str":
+            try:
+                return column.astype("<f8")
+            except ValueError:
+                raise ValueError(f"'{field}' does not hold numbers.")
+        return column
+
+    # Returns a boolean array of the live records matching a list of (field, operator, value) conditions (see
+    # `database_operations.parse_condition`), or `None` if a condition cannot be evaluated over whole columns with the
+    # same meaning as `database_operations.build_predicate`. Typed columns are compared with the value converted to
+    # their type; text columns support "~" and, for values that are not numbers, "=" and "!=".
+    def condition_mask(self, conditions):
+        mask = self.live_mask()
+        for field, operator, value in conditions:
+            column = self.column(field)
+            field_type = self.types[field]
+            if operator == "~":
+                if field_type != "str":
+                    return None
+                mask &= np.char.find(column, value) >= 0
+                continue
+            try:
+                if field_type in ("int", "float"):
+                    target = float(value)
+                elif field_type == "date":
+                    target = np.datetime64(value, "D")
+                elif operator in ("=", "!=") and not is_number(value):
+                    target = value
+                else:
+                    return None  # Numbers in text columns compare numerically, which needs the record-by-record path
+            except ValueError:
+                return None
+            mask &= COLUMN_OPERATORS[operator](column, target)
+        return mask
+
+    # Computes an aggregate ("count", "sum", "avg", "min" or "max") over the live records selected by `mask` (all live
+    # records if it is `None`). Without `group_by` the result is a single value, `None` when there are no records to
+    # take an average, minimum or maximum of. With `group_by` it is a list of (group, value) pairs ordered by group.
+    def aggregate(self, func, field=None, group_by=None, mask=None):
+        selected = self.live_mask() if mask is None else mask
+        if func == "count":
+            values = None
+        elif func in ("sum", "avg"):
+            values = self.numeric_column(field, selected)
+        else:
+            values = self.column(field)[selected]
+
+        if group_by is None:
+            if func == "count":
+                return int(np.count_nonzero(selected))
+            if len(values) == 0:
+                return 0 if func == "sum" else None
+            if func == "sum":
+                return python_value(values.sum())
+            if func == "avg":
+                return float(values.mean())
+            if values.dtype.kind == "U":
+                values = np.sort(values)  # Text has no minimum/maximum loop in NumPy
+                return python_value(values[0] if func == "min" else values[-1])
+            return python_value(values.min() if func == "min" else values.max())
+
+        groups, inverse, counts = np.unique(self.column(group_by)[selected], return_inverse=True, return_counts=True)
+        if len(groups) == 0:
+            return []
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp)
+        if func == "count":
+            results = counts
+        elif func in ("sum", "avg"):
+            sums = np.add.reduceat(values[np.argsort(inverse, kind="stable")], starts)
+            results = sums if func == "sum" else sums / counts
+        else:
+            # Sorting by group and then by value puts the smallest value of each group first and the largest last.
+            ordered = values[np.lexsort((values, inverse))]
+            results = ordered[starts] if func == "min" else ordered[starts + counts - 1]
+        return [(python_value(group), python_value(result)) for group, result in zip(groups, results)]
+
+
+# This function checks whether a condition value is a number, in the same sense as `indexes.sort_key`: words such as
+# "nan" and "inf" are text.
+def is_number(value):
+    try:
+        return math.isfinite(float(value))
+    except ValueError:
+        return False
+
+
+# The comparison operators of query conditions, applied to a whole column at once.
+COLUMN_OPERATORS = {
+    "=": lambda column, target: column == target,
+    "!=": lambda column, target: column != target,
+    "<": lambda column, target: column < target,
+    "<=": lambda column, target: column <= target,
+    ">": lambda column, target: column > target,
+    ">=": lambda column, target: column >= target,
+}
@@ -0,0 +1,721 @@
+# Importing necessary modules for the persistent database handle.
+# The `contextlib` module is used to combine the thread and file locks taken for every change.
+# The `itertools` module is used to skip records when iterating from a given position.
+# The `os` module is used to check the modification time and size of the database files.
+# The `threading` module runs compaction in the background, keeps it from overlapping other operations, and lets
+# threads committing transactions at the same time share one write to the log.
+# The `file_manager` module loads and saves the system and data files.
+# The `indexes` module provides the secondary indexes used to look records up by field value.
+# The `record_store` and `write_ahead_log` modules are the two ways single-record changes reach the disk.
+# The `block_store` module reads single records of compressed databases without loading the whole data file.
+# The `column_store` module computes aggregates over the columns of columnar databases.
+# The `instrumentation` module times the operations and counts cache hits and misses when profiling is on.
+import contextlib
+import itertools
+import os
+import threading
+import block_store as bs
+import column_store as cs
+import file_manager as fm
+import indexes as ixs
+import instrumentation as instr
+import record_store as rs
+import write_ahead_log as wal
+
+# Deleted records are kept as tombstones until compaction reclaims their space. Compaction starts in the background
+# once at least this share of the stored records are tombstones (and there are at least COMPACTION_MIN_DEAD of them,
+# so small tables are not rewritten over a handful of deletes).
+COMPACTION_THRESHOLD = 0.25
+COMPACTION_MIN_DEAD = 1000
+
+
+# The Database class keeps the schema and records of one database in memory for a whole CLI session, so that
+# repeated view/edit/delete cycles do not reparse the files every time. Before each operation it compares the
+# modification time and size of the database files with what it last saw, and reloads them if another process has
+# changed them in the meantime.
+#
+# Records are addressed by their stable ID (the `_id` key), which never changes and is never reused, so deleting a
+# record does not affect how any other record is referred to. Deleting leaves a tombstone behind; `compact` (run on
+# demand, or in a background thread once tombstones pile up) removes them.
+#
+# Changes are made durable straight away: JSON databases append them to the write-ahead log, binary databases write
+# the affected slot of the record store. Folding the log back into the data file is deferred to `flush`/`close`.
+#
+# Several sessions, in different processes, can use the same database at once. Every change takes the exclusive
+# database lock (see `file_manager.database_lock`) and picks up changes made by other sessions before it is applied,
+# so new records never get an ID that another session has already handed out and no change overwrites another.
+# Reads need no lock, since the files are either appended to or replaced as a whole.
+#
+# Many changes can be grouped with `batch`, which holds the lock for the whole group and commits it at the end with a
+# single write to the log, instead of one synced write per change.
+#
+# Changes can also be made in a transaction (see `begin` and the `Transaction` class), which keeps them in memory
+# until it is committed and then applies all of them or none. Binary databases are the exception: their record store is
+# written in place and has no undo, so a transaction on one is only all-or-nothing against the errors found before its
+# changes are made (see `commit`). Transactions committed by several threads at once are
+# written together (group commit): while one thread writes and syncs the log, the others queue up, and the next
+# thread to go writes all of the queued transactions with one sync.
+class Database:
+    def __init__(self, db_name):
+        self.name = db_name
+        self._fields = None
+        self._types = None
+        self._records = None  # Stored JSON records in file order, including tombstones
+        self._positions = None  # Record ID -> position in `_records`
+        self._dead = 0
+        self._store = None
+        self._reader = None
+        self._columns = None
+        self._stamp = None
+        self._indexes = None
+        self._indexes_dirty = False
+        self._lock = threading.RLock()
+        self._compaction = None
+        self._pending = None  # Log entries of the current batch, or `None` outside a batch
+        self._batch_thread = None  # The thread running the current batch
+        self._commit_queue = []  # Transactions waiting to be committed
+        self._commit_ready = threading.Condition()
+        self._committing = False
+        self._stale = False  # The records in memory hold changes that will not be written; reload them after commit
+        self.dirty = False
+
+    # Returns (mtime, size) of every file that makes up the database. Missing files are recorded as `None`.
+    def _file_stamp(self):
+        stamp = []
+        for path in (f"{self.name}_system.json", f"{self.name}_data.json", wal.log_path(self.name),
+                     rs.data_path(self.name), bs.data_path(self.name), cs.data_path(self.name)):
+            try:
+                info = os.stat(path)
+                stamp.append((info.st_mtime_ns, info.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    # Drops the cached schema and records if the files changed since they were loaded.
+    def refresh(self):
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return
+            instr.count("cache invalidations")
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+            self._close_reader()
+            self._close_columns()
+            self._fields = None
+            self._types = None
+            self._records = None
+            self._positions = None
+            self._indexes = None
+            self._indexes_dirty = False
+            self._stamp = stamp
+
+    # Records the current state of the files after this handle changed them, so its own writes are not mistaken
+    # for outside changes. Writes through the memory-mapped record store do not reliably update the modification
+    # time of the `.dat` file, so it is updated explicitly for other sessions to notice the change.
+    def _touch(self, store_changed=False):
+        if store_changed:
+            os.utime(rs.data_path(self.name))
+        self._stamp = self._file_stamp()
+
+    # Takes the exclusive lock for a change and reloads anything other sessions changed in the meantime.
+    @contextlib.contextmanager
+    def _writing(self):
+        with self._lock, fm.database_lock(self.name, exclusive=True):
+            self.refresh()
+            yield
+
+    # Makes a change durable: outside a batch the log entries are appended to the log straight away, inside one they
+    # are kept until the batch is committed. It returns `False` if they could not be written.
+    def _log(self, entries):
+        if self._pending is not None:
+            self._pending.extend(entries)
+            return True
+        return fm.append_log_entries(self.name, entries)
+
+    # Writes the log entries of the current batch, if any, with a single append, and syncs the record store of a
+    # binary database. It returns `False` if they could not be written; the records held in memory then no longer
+    # match the files and are reloaded on next use.
+    def _commit_pending(self):
+        if self._pending is None:
+            return True
+        entries, self._pending = self._pending, []
+        if self._store is not None:
+            try:
+                self._store.sync()
+            except OSError as e:
+                print(f"Error syncing '{rs.data_path(self.name)}': {e}")
+                self._stamp = None
+                return False
+        elif entries and not fm.append_log_entries(self.name, entries):
+            self._stamp = None
+            return False
+        self._touch(self._store is not None)
+        if self._stale:
+            self._stamp, self._stale = None, False
+        return True
+
+    # Groups changes so they are committed together. The database stays locked for other sessions until the `with`
+    # block ends; then every change made in it is written with one append to the log (or one sync of the record
+    # store). Changes made before an error inside the block are still committed. Batches can be nested, in which case
+    # only the outermost one commits. If the changes cannot be written, the batch raises `ValueError` when it ends, so
+    # callers never report changes as made that did not reach the disk.
+    @contextlib.contextmanager
+    def batch(self):
+        with self._writing():
+            if self._pending is not None:
+                yield self
+                return
+            self._pending = []
+            self._batch_thread = threading.get_ident()
+            try:
+                yield self
+            finally:
+                written = self._commit_pending()
+                self._pending = None
+                self._batch_thread = None
+            if not written:
+                raise ValueError(f"the changes to '{self.name}' could not be written")
+            if self.dead_count >= COMPACTION_MIN_DEAD and self.dead_ratio() >= COMPACTION_THRESHOLD:
+                self.start_compaction()
+
+    # Starts a transaction. Its changes are kept in memory and only applied to the database by `commit`.
+    def begin(self):
+        return Transaction(self)
+
+    # Commits a transaction: its changes are applied to the database and written with a single append to the log (or
+    # a single sync of the record store). It returns the record IDs of the changes, the new IDs for added records, or
+    # raises `ValueError`. A transaction whose records no longer exist, or whose values do not fit a record store,
+    # fails as a whole and changes nothing (see `_check_transaction`). Other failures, such as an I/O error, change
+    # nothing on databases that write through the log; on a binary database the changes made to the record store
+    # before the error stay, and the error says so.
+    #
+    # Committers take turns: the first one to arrive writes every transaction that is waiting when it starts, and
+    # the others wait for it to finish, so transactions committed at the same time share one write and one sync.
+    # Inside a batch, the transaction is applied straight away and written together with the batch.
+    def commit(self, transaction):
+        if self._batch_thread == threading.get_ident():
+            self._commit_group([transaction])
+        else:
+            with self._commit_ready:
+                self._commit_queue.append(transaction)
+                while transaction.state == "committing" and self._committing:
+                    self._commit_ready.wait()
+                if transaction.state == "committing":
+                    self._committing = True
+                    group, self._commit_queue = self._commit_queue, []
+                else:
+                    group = None
+            if group is not None:
+                try:
+                    self._commit_group(group)
+                finally:
+                    with self._commit_ready:
+                        self._committing = False
+                        self._commit_ready.notify_all()
+        if transaction.error is not None:
+            raise ValueError(transaction.error)
+        return transaction.results
+
+    # Applies a group of transactions and writes them with one append to the log. Each transaction succeeds or fails
+    # on its own; if the log cannot be written, all of them fail. A transaction that fails while its changes are being
+    # applied leaves part of them in the records held in memory, so those are reloaded from the files once the
+    # changes of the others are written. A binary database has no log to drop: what reached its record store stays.
+    @instr.timed()
+    def _commit_group(self, group):
+        try:
+            with self._writing():
+                outer = self._pending
+                if outer is None:
+                    self._pending = []
+                applied = []
+                try:
+                    for transaction in group:
+                        try:
+                            self._check_transaction(transaction)
+                        except ValueError as e:
+                            transaction.error = f"{str(e).rstrip('.')}; no changes were made"
+                            continue
+                        try:
+                            transaction.results = self._apply_transaction(transaction)
+                            applied.append(transaction)
+                        except (IOError, ValueError) as e:
+                            # The log entries of the transaction are dropped, but a record store is written in place
+                            written = "some of its changes may already be stored" if self._store is not None \
+                                else "no changes were made"
+                            transaction.error, self._stale = f"{str(e).rstrip('.')}; {written}", True
+                finally:
+                    if outer is None:
+                        written = self._commit_pending()
+                        self._pending = None
+                        if not written:
+                            outcome = "some changes may already be stored" if self._store is not None \
+                                else "no changes were made"
+                            for transaction in applied:
+                                transaction.results = None
+                                transaction.error = f"changes could not be written; {outcome}"
+        finally:
+            for transaction in group:
+                if transaction.error is None and transaction.results is None:
+                    transaction.error = "transaction was not committed"
+                transaction.state = "failed" if transaction.error is not None else "committed"
+        instr.count("transactions committed", sum(transaction.state == "committed" for transaction in group))
+
+    # Checks a transaction before any of its changes are made, so that it fails as a whole: every record it edits or
+    # deletes must still exist (another session may have deleted it after it was read), and every record it adds or
+    # edits must fit the record store of a binary database, whose fields are limited in UTF-8 bytes rather than
+    # characters. It raises `ValueError` otherwise.
+    def _check_transaction(self, transaction):
+        deleted = set()
+        for op, record_id, record in transaction.changes:
+            if record is not None and self.store is not None:
+                self._store.check_record(record)
+            if op == "add":
+                continue
+            if record_id in deleted or self.get(record_id) is None:
+                raise ValueError(f"record {record_id} does not exist")
+            if op == "delete":
+                deleted.add(record_id)
+
+    # Applies the changes of a transaction inside a batch and returns their record IDs. The log entries of the changes
+    # are kept together as one "transaction" entry, so that they are written as a single line (see
+    # `write_ahead_log.append_entries`). If a change fails, none of the entries are written.
+    def _apply_transaction(self, transaction):
+        pending, self._pending = self._pending, []
+        try:
+            results = []
+            for op, record_id, record in transaction.changes:
+                if op == "add":
+                    results.append(self.add(record))
+                elif op == "edit":
+                    self.update(record_id, record)
+                    results.append(record_id)
+                else:
+                    self.delete(record_id)
+                    results.append(record_id)
+        except BaseException:
+            self._pending = pending
+            raise
+        entries, self._pending = self._pending, pending
+        if entries:
+            self._pending.append({"op": "transaction", "entries": entries})
+        return results
+
+    @property
+    def uses_store(self):
+        return rs.store_exists(self.name)
+
+    # Whether the database keeps its records in a columnar data file, whose typed fields only take values in canonical
+    # form (see `file_manager.columnar_form`).
+    @property
+    def uses_columns(self):
+        return cs.store_exists(self.name)
+
+    @property
+    def fields(self):
+        self.refresh()
+        if self._fields is None:
+            self._fields = fm.load_system_file(self.name)
+        return self._fields
+
+    # The type of every field (see `file_manager.FIELD_TYPES`).
+    @property
+    def types(self):
+        self.refresh()
+        if self._types is None:
+            self._types = fm.load_field_types(self.name) or {}
+        return self._types
+
+    # The open record store of a binary database, or `None` for JSON databases.
+    @property
+    def store(self):
+        self.refresh()
+        if self._store is None and self.uses_store and self.fields is not None:
+            self._store = rs.open_store(self.name, self._fields)
+        return self._store
+
+    # A reader over the compressed data file of a database that has not been loaded into memory, or `None`. Single
+    # records and the record count are then read from the file without loading it. A reader is only used while the
+    # write-ahead log is empty, since otherwise the data file alone is out of date.
+    @property
+    def reader(self):
+        self.refresh()
+        if self._records is not None or not bs.store_exists(self.name) or os.path.exists(wal.log_path(self.name)):
+            self._close_reader()
+            return None
+        if self._reader is None:
+            try:
+                self._reader = bs.BlockReader(self.name)
+            except ValueError as e:
+                print(f"Error: {e}")
+        return self._reader
+
+    # Whether the data files hold every change made to the database, so they can be read directly: true while the
+    # write-ahead log is empty and no batch is waiting to be committed.
+    @property
+    def files_current(self):
+        return not self._pending and not os.path.exists(wal.log_path(self.name))
+
+    # A reader over the columns of a columnar database, or `None`. The reader is only used while the columnar file
+    # holds every change (see `files_current`).
+    @property
+    def columns(self):
+        self.refresh()
+        if not cs.store_exists(self.name) or not self.files_current:
+            return None
+        if self._columns is None:
+            try:
+                self._columns = cs.ColumnReader(self.name)
+            except ValueError as e:
+                print(f"Error: {e}")
+        return self._columns
+
+    def _close_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _close_columns(self):
+        if self._columns is not None:
+            self._columns.close()
+            self._columns = None
+
+    # The stored records of a JSON database, tombstones included, loaded on first use.
+    def _stored(self):
+        if self._records is not None:
+            instr.count("record cache hits")
+        else:
+            instr.count("record cache misses")
+            self._records = fm.load_data_file(self.name)
+            self._positions = {record["_id"]: position for position, record in enumerate(self._records)}
+            self._dead = sum(1 for record in self._records if fm.is_deleted(record))
+        return self._records
+
+    # All live records of the database. For binary databases the records are read from the store on every access,
+    # since single records are cheaper to fetch with `get`.
+    @property
+    def records(self):
+        if self.store is not None:
+            return self._store.read_all()
+        return [record for record in self._stored() if not fm.is_deleted(record)]
+
+    # Yields the live records one at a time, skipping the first `start` of them. Binary databases are read slot by
+    # slot from the store. JSON databases that have not been loaded yet are streamed from the data file, as long as
+    # the write-ahead log holds no changes that would have to be replayed first.
+    def iter_records(self, start=0):
+        if self.store is not None:
+            return self._store.iter_from(start)
+        if self._records is None and not os.path.exists(wal.log_path(self.name)):
+            return fm.iter_records(self.name, start)
+        live = (record for record in self._stored() if not fm.is_deleted(record))
+        return itertools.islice(live, start, None)
+
+    def __len__(self):
+        if self.store is not None:
+            return len(self._store)
+        if self.reader is not None:
+            return self._reader.live_count
+        if self.columns is not None:
+            return self._columns.live_count
+        return len(self._stored()) - self._dead
+
+    # Returns the record with the given ID, or `None` if there is no such record (or it was deleted).
+    @instr.timed()
+    def get(self, record_id):
+        with self._lock:
+            if self.store is not None:
+                try:
+                    return self._store.read(record_id)
+                except KeyError:
+                    return None
+            if self.reader is not None:
+                record = self._reader.get(record_id)
+                return None if record is None or fm.is_deleted(record) else record
+            self._stored()
+            position = self._positions.get(record_id)
+            if position is None or fm.is_deleted(self._records[position]):
+                return None
+            return self._records[position]
+
+    # The secondary indexes of the database, keyed by field. They are loaded on first use and rebuilt if the data
+    # files changed since they were saved.
+    @property
+    def indexes(self):
+        self.refresh()
+        if self._indexes is None:
+            self._indexes, fresh = ixs.load_indexes(self.name, self._stamp, lambda: self.records)
+            instr.count("index cache hits" if fresh else "index rebuilds")
+            self._indexes_dirty = not fresh  # Save rebuilt indexes so the next session can use them as they are
+        return self._indexes
+
+    # Adds a record and returns the ID it was given, or `None` if it could not be written.
+    @instr.timed()
+    def add(self, record):
+        with self._writing():
+            indexes = self.indexes
+            record = {field: value for field, value in record.items() if field != "_id"}
+            if self.store is not None:
+                record["_id"] = self._store.append(record)
+                self.dirty = True
+            else:
+                records = self._stored()
+                record["_id"] = records[-1]["_id"] + 1 if records else 1
+                if not self._log([{"op": "add", "record": record}]):
+                    return None
+                self._positions[record["_id"]] = len(records)
+                records.append(record)
+                self.dirty = True
+            for index in indexes.values():
+                index.add(record["_id"], record)
+            if indexes:
+                self._indexes_dirty = True
+            self._touch(self._store is not None)
+            return record["_id"]
+
+    # Replaces the values of the record with the given ID. It returns `False` if there is no such record.
+    @instr.timed()
+    def update(self, record_id, record):
+        with self._writing():
+            indexes = self.indexes
+            old_record = self.get(record_id)
+            if old_record is None:
+                return False
+            record = dict(record, _id=record_id)
+            if self.store is not None:
+                self._store.write(record_id, record)
+                self.dirty = True
+            else:
+                self._stored()  # The old record may have been read through the compressed-file reader alone
+                if not self._log([{"op": "edit", "id": record_id, "record": record}]):
+                    return False
+                self._records[self._positions[record_id]] = record
+                self.dirty = True
+            for index in indexes.values():
+                index.remove(record_id, old_record)
+                index.add(record_id, record)
+            if indexes:
+                self._indexes_dirty = True
+            self._touch(self._store is not None)
+            return True
+
+    # Deletes the record with the given ID by leaving a tombstone in its place, so nothing else has to move.
+    # It returns `False` if there is no such record. Once enough tombstones have built up, a background compaction
+    # is started to reclaim their space.
+    @instr.timed()
+    def delete(self, record_id):
+        with self._writing():
+            indexes = self.indexes
+            old_record = self.get(record_id)
+            if old_record is None:
+                return False
+            if self.store is not None:
+                self._store.delete(record_id)
+                self.dirty = True
+            else:
+                self._stored()  # The old record may have been read through the compressed-file reader alone
+                if not self._log([{"op": "delete", "id": record_id}]):
+                    return False
+                self._records[self._positions[record_id]] = wal.tombstone(record_id)
+                self._dead += 1
+                self.dirty = True
+            for index in indexes.values():
+                index.remove(record_id, old_record)
+            if indexes:
+                self._indexes_dirty = True
+            self._touch(self._store is not None)
+            if (self._pending is None and self.dead_count >= COMPACTION_MIN_DEAD
+                    and self.dead_ratio() >= COMPACTION_THRESHOLD):
+                self.start_compaction()
+            return True
+
+    @property
+    def dead_count(self):
+        if self.store is not None:
+            return self._store.dead_count
+        self._stored()
+        return self._dead
+
+    # The share of stored records that are tombstones.
+    def dead_ratio(self):
+        if self.store is not None:
+            return self._store.dead_ratio()
+        stored = len(self._stored())
+        return self._dead / stored if stored else 0.0
+
+    # Removes the tombstones of deleted records. For JSON databases the data file is rewritten without them (which
+    # also folds in the write-ahead log); the tombstone of the highest ID is kept so that IDs are never handed out
+    # twice. Binary databases copy their live slots into a new, smaller file. Record IDs do not change.
+    @instr.timed()
+    def compact(self):
+        with self._writing():
+            if self.store is not None:
+                self._store.compact()
+                fm.update_catalog(self.name)
+            else:
+                records = self._stored()
+                kept = [record for record in records if not fm.is_deleted(record)]
+                if records and fm.is_deleted(records[-1]):
+                    kept.append(records[-1])
+                if not fm.write_data_file(self.name, kept):
+                    return
+                if self._pending:
+                    self._pending = []  # The rewritten data file already holds the changes of the current batch
+                self._records = kept
+                self._positions = {record["_id"]: position for position, record in enumerate(kept)}
+                self._dead = sum(1 for record in kept if fm.is_deleted(record))
+                self.dirty = False
+            self._touch()
+            if self._indexes:
+                self._indexes_dirty = True  # The indexes are still correct but were saved for the old files
+
+    # Starts compaction in a background thread, unless one is already running. Changes and lookups wait for it to
+    # finish; iterators over the records that are already running are not blocked and see the records as they were
+    # before compaction.
+    def start_compaction(self):
+        if self._compaction is not None and self._compaction.is_alive():
+            return self._compaction
+        self._compaction = threading.Thread(target=self.compact, name=f"compact-{self.name}")
+        self._compaction.start()
+        return self._compaction
+
+    # Creates (or replaces) an index of the given kind ("hash" or "sorted") on a field and builds it from the records.
+    def create_index(self, field, kind="hash"):
+        with self._lock:
+            index = ixs.new_index(field, kind)
+            index.build(self.records)
+            self.indexes[field] = index
+            self._indexes_dirty = True
+            return index
+
+    def drop_index(self, field):
+        with self._lock:
+            if self.indexes.pop(field, None) is not None:
+                self._indexes_dirty = True
+
+    # Returns the IDs of the records whose `field` equals `value`, using an index on the field if there is one
+    # and a scan of the records otherwise.
+    @instr.timed()
+    def find(self, field, value):
+        index = self.indexes.get(field)
+        if index is not None:
+            return index.lookup(value)
+        return [record["_id"] for record in self.iter_records() if str(record.get(field, "")) == str(value)]
+
+    # Returns the IDs of the records whose `field` lies between `low` and `high` (inclusive, either may be `None`),
+    # comparing numbers numerically. A sorted index on the field is used if there is one.
+    @instr.timed()
+    def find_range(self, field, low=None, high=None):
+        index = self.indexes.get(field)
+        if isinstance(index, ixs.SortedIndex):
+            return index.range(low, high)
+        low_key = None if low is None else ixs.sort_key(low)
+        high_key = None if high is None else ixs.sort_key(high)
+        record_ids = []
+        for record in self.iter_records():
+            key = ixs.sort_key(record.get(field, ""))
+            if (low_key is None or key >= low_key) and (high_key is None or key <= high_key):
+                record_ids.append(record["_id"])
+        return record_ids
+
+    # Folds the changes made through this handle into the data file. The records already held in memory are written
+    # out directly, so the data file and log are not read again.
+    @instr.timed()
+    def flush(self):
+        with self._writing():
+            self._commit_pending()
+            if self._store is not None:
+                self._store.flush()
+                if self.dirty:
+                    fm.update_catalog(self.name, rows=len(self._store))
+            elif self.dirty and self._records is not None:
+                fm.checkpoint_data_file(self.name, self._records)
+            self.dirty = False
+            self._touch()
+            if self._indexes_dirty and self._indexes is not None:
+                ixs.save_indexes(self.name, self._indexes, self._stamp)
+            self._indexes_dirty = False
+
+    def close(self):
+        if self._compaction is not None:
+            self._compaction.join()
+        self.flush()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        self._close_reader()
+        self._close_columns()
+
+
+# The Transaction class holds changes to a database until they are committed. `add`, `update` and `delete` only record
+# the change; `get` sees the edits and deletes made in the transaction so far. `commit` applies all of the changes at
+# once (see `Database.commit` for what a failed commit leaves behind) and `rollback` discards them. Records added in a
+# transaction get their IDs on commit.
+# Used as a context manager, a transaction is committed when the `with` block ends, or rolled back if it raises.
+class Transaction:
+    def __init__(self, database):
+        self.database = database
+        self.changes = []  # (op, record ID, record) tuples, in the order they were made
+        self.state = "open"
+        self.results = None
+        self.error = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if self.state != "open":
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def __len__(self):
+        return len(self.changes)
+
+    def _check_open(self):
+        if self.state != "open":
+            raise ValueError(f"the transaction is already {self.state}")
+
+    # Returns the record with the given ID as it stands in this transaction, or `None` if there is no such record.
+    def get(self, record_id):
+        for op, changed_id, record in reversed(self.changes):
+            if changed_id == record_id:
+                return record if op == "edit" else None
+        return self.database.get(record_id)
+
+    def add(self, record):
+        self._check_open()
+        self.changes.append(("add", None, {field: value for field, value in record.items() if field != "_id"}))
+        return True
+
+    # Records new values for the record with the given ID. It returns `False` if there is no such record.
+    def update(self, record_id, record):
+        self._check_open()
+        if self.get(record_id) is None:
+            return False
+        self.changes.append(("edit", record_id, dict(record, _id=record_id)))
+        return True
+
+    # Records the deletion of the record with the given ID. It returns `False` if there is no such record.
+    def delete(self, record_id):
+        self._check_open()
+        if self.get(record_id) is None:
+            return False
+        self.changes.append(("delete", record_id, None))
+        return True
+
+    def commit(self):
+        self._check_open()
+        self.state = "committing"
+        if not self.changes:
+            self.state, self.results = "committed", []
+            return self.results
+        return self.database.commit(self)
+
+    # Discards the changes of the transaction and returns how many there were.
+    def rollback(self):
+        self._check_open()
+        self.state = "rolled back"
+        return len(self.changes)
@@ -1,79 +1,70 @@
 # Importing necessary modules for database operations.
-# The `json` module is used to handle JSON files for reading and writing database data and system files.
-# The `os` module is used to manage file operations like checking file existence and deletion.
+# The `heapq` and `itertools` modules let queries keep only the top rows of a result instead of sorting everything.
+# The `datetime` module is used to show the dates found by aggregates over date fields.
+# The `functools` module binds the arguments of the functions that parallel scans run in worker processes.
+# The `re` module is used to parse query conditions such as `Age>=30`.
 # The `file_manager` module is used to assist in file-related tasks specific to this application.
-import json
-import os
+# The `Database` class keeps a database open in memory across operations within a CLI session.
+# The `indexes` module lists the kinds of secondary index that can be created on a field.
+# The `column_store` module computes aggregates over whole columns of columnar databases.
+# The `parallel_scan` module spreads full scans of large tables over several worker processes.
+# The `external_sort` module sorts tables larger than memory, for viewing and exporting them in order.
+# The `instrumentation` module times the operations and counts the records they scan when profiling is on.
+import datetime
+import functools
+import heapq
+import itertools
+import re
+import column_store as cs
+import external_sort as es
 import file_manager as fm  # Ensure to import the file manager for managing database files.
+import indexes as ixs
+import instrumentation as instr
+import parallel_scan as ps
+from database import Database
 
-# This function deletes an entire database by removing both its data and system files from the file system.
-# It first verifies the existence of the respective files and deletes them if they are found. 
-# If the files are not found, it notifies the user and ensures no unnecessary errors occur.
+# This function deletes an entire database by removing its system file, data files, write-ahead log, indexes and lock
+# file, and drops it from the database catalog. The work is done by `file_manager.delete_database`, under the
+# database's exclusive lock.
 def delete_database(db_name):
-    data_file = f"{db_name}_data.json"
-    system_file = f"{db_name}_system.json"
-
-    if os.path.exists(data_file):
-        os.remove(data_file)
-        print(f"Deleted data file: {data_file}")
-    else:
-        print(f"Data file '{data_file}' not found.")
-
-    if os.path.exists(system_file):
-        os.remove(system_file)
-        print(f"Deleted system file: {system_file}")
-    else:
-        print(f"System file '{system_file}' not found.")
-
-    print(f"Database '{db_name}' has been deleted successfully.")
+    fm.delete_database(db_name)
 
 # This function loads the system file of a specified database, which contains metadata about the database's structure,
 # such as field names and their maximum lengths. If the file doesn't exist or is corrupted, it handles the error 
 # gracefully and returns `None`.
 def load_system_file(db_name):
-    system_file = f"{db_name}_system.json"
-    if not os.path.exists(system_file):
-        print(f"System file for database '{db_name}' not found.")
-        return None
-    try:
-        with open(system_file, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"Error: System file for '{db_name}' is corrupted.")
-        return None
+    return fm.load_system_file(db_name)
 
 # This function loads the data file of a specified database, which contains all the records stored in the database.
 # If the file doesn't exist or is corrupted, it notifies the user and returns an empty list as a fallback.
+# Changes recorded in the write-ahead log are replayed on top of the data file (see `file_manager.load_data_file`).
 def load_data_file(db_name):
-    data_file = f"{db_name}_data.json"
-    if not os.path.exists(data_file):
-        print(f"Data file for database '{db_name}' not found.")
-        return []
-    try:
-        with open(data_file, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        print(f"Error: Data file for '{db_name}' is corrupted.")
-        return []
-
-# This function saves a list of records to the data file of a specified database. 
-# It writes the data in JSON format and handles any file I/O errors during the process, notifying the user if an issue occurs.
+    return fm.load_data_file(db_name)
+
+# This function saves a list of records to the data file of a specified database, in whichever storage format the
+# database uses (see `file_manager.save_data_file`).
 def save_data_file(db_name, records):
-    data_file = f"{db_name}_data.json"
-    try:
-        with open(data_file, 'w') as f:
-            json.dump(records, f, indent=4)
-    except IOError as e:
-        print(f"Error saving data to '{data_file}': {e}")
+    fm.save_data_file(db_name, records)
+
+# This function returns an open `Database` handle for the given database. The operations below accept either a database
+# name or a handle opened by the caller; passing the handle lets a CLI session reuse the schema and records already
+# held in memory instead of reading the files again.
+def get_database(db):
+    if isinstance(db, Database):
+        return db
+    return Database(db)
 
 # This function enables the user to add a new record to a database. It prompts the user for values for each field defined 
-# in the system file, validates the input lengths, and appends the new record to the data file. If any required file is missing, 
-# it gracefully handles the error.
-def add_record(db_name):
-    fields = load_system_file(db_name)
+# in the system file, validates the input lengths and types, and appends the new record to the write-ahead log of the data file. If any required file is missing,
+# it gracefully handles the error. If a transaction is given, the record is added to it and only stored when it is
+# committed.
+def add_record(db, transaction=None):
+    database = get_database(db)
+    fields = database.fields
     if not fields:
         return
 
+    types = database.types
     record = {}
     for field, max_length in fields.items():
         while True:
@@ -82,28 +73,125 @@ def add_record(db_name):
                 print(f"Error: '{field}' cannot be empty. Please enter a value.")
             elif len(value) > max_length:
                 print(f"Value for '{field}' exceeds maximum length of {max_length}.")
+            elif not fm.is_valid_value(value, types.get(field, "str")):
+                print(type_error(field, types[field]))
+            elif database.uses_columns and fm.columnar_form(value, types.get(field, "str")) is not None:
+                print(columnar_form_error(field, fm.columnar_form(value, types[field])))
             else:
                 record[field] = value
                 break
 
     if not record:  # If no valid record is added, show an appropriate message
         print("No valid data entered. Record not added.")
-    else:
-        records = load_data_file(db_name)
-        records.append(record)
-        save_data_file(db_name, records)
-        print("Record added successfully.")
-
-# This function displays all the records stored in a database in a tabular format. 
-# It calculates the column widths dynamically to ensure proper alignment of data. If no records are found, it notifies the user.
-def view_records(db_name):
-    records = load_data_file(db_name)
-    if not records:
-        print("No records found.")
         return
+    if transaction is not None:
+        transaction.add(record)
+        print("Record added to the transaction.")
+        return
+    try:
+        if database.add(record):
+            print("Record added successfully.")
+    except ValueError as e:
+        print(f"Error: {e} Record not added.")
+
+# The number of records shown on one page of `view_records`.
+PAGE_SIZE = 20
+
+# This function displays the records stored in a database in a tabular format, one page at a time.
+# Column widths come from the maximum lengths in the system file, so no pass over the records is needed before the
+# first page is shown. Records are streamed from the database, and the user can move to the next or previous page,
+# jump to a page, or quit. If no records are found, it notifies the user. With `order_by` (a field name or list of
+# field names), the records are shown sorted by those fields: they are sorted once with an external merge sort, which
+# keeps a bounded amount of them in memory, into a temporary file that the pages are then read from.
+@instr.timed()
+def view_records(db, page_size=PAGE_SIZE, order_by=None, descending=False):
+    database = get_database(db)
+    fields = database.fields
+    if not fields:
+        return
+
+    sorted_file = None
+    if order_by:
+        sorted_file = es.SortedFile(database.iter_records(), es.record_key(order_field_list(order_by)), descending)
+    try:
+        browse_pages(database, fields, page_size, sorted_file)
+    finally:
+        if sorted_file is not None:
+            sorted_file.close()
+
+# This function shows the pages of `view_records` and reads the user's commands to move between them. Records are read
+# from the database, or from `sorted_file` (an `external_sort.SortedFile`) when they are shown in sorted order.
+def browse_pages(database, fields, page_size, sorted_file=None):
+    read_from = database.iter_records if sorted_file is None else sorted_file.iter_from
+
+    headers = ["#"] + list(fields)
+    column_widths = dict({"#": 6}, **{field: max(len(field), max_length) for field, max_length in fields.items()})
+
+    page = 0
+    stream, buffered, buffered_start = None, [], 0
+    while True:
+        start = page * page_size
+        # Keep reading from the same stream when moving forward; going back to an earlier page restarts it.
+        if stream is None or start < buffered_start:
+            stream, buffered, buffered_start = read_from(start), [], start
+        skip = start - buffered_start
+        if skip > len(buffered):
+            for _ in itertools.islice(stream, skip - len(buffered)):
+                pass
+            buffered = []
+        else:
+            buffered = buffered[skip:]
+        buffered_start = start
+        # One record more than a page is read, to tell whether there is a next page.
+        buffered += itertools.islice(stream, page_size + 1 - len(buffered))
 
-    headers = list(records[0].keys())
-    column_widths = {header: max(len(header), max(len(str(record.get(header, ""))) for record in records)) for header in headers}
+        if not buffered:
+            if page == 0:
+                print("No records found.")
+                return
+            print("There is no such page.")
+            page = 0
+            continue
+
+        rows = buffered[:page_size]
+        has_next = len(buffered) > page_size
+        print_table([display_row(record) for record in rows], headers, column_widths)
+        print(f"Page {page + 1} (records {start + 1}-{start + len(rows)})")
+
+        command = input("[n]ext, [p]revious, [j]ump <page>, [q]uit: ").strip().lower()
+        if command in ("", "n"):
+            if has_next:
+                page += 1
+            else:
+                print("This is the last page.")
+        elif command == "p":
+            if page > 0:
+                page -= 1
+            else:
+                print("This is the first page.")
+        elif command.startswith("j"):
+            try:
+                page = max(int(command[1:].strip()) - 1, 0)
+            except ValueError:
+                print("Please enter a valid page number, for example 'j 5'.")
+        elif command == "q":
+            break
+        else:
+            print("Invalid choice. Please try again.")
+
+# This function prepares a record for display: its ID is shown in the "#" column, followed by its fields.
+def display_row(record):
+    row = {"#": record.get("_id", "")}
+    row.update((field, value) for field, value in record.items() if not field.startswith("_"))
+    return row
+
+# This function prints a list of records as a table. By default the keys of the first record are used as column
+# headers and each column is as wide as its longest value; callers that already know the layout can pass both in.
+def print_table(records, headers=None, column_widths=None):
+    if headers is None:
+        headers = list(records[0].keys())
+    if column_widths is None:
+        column_widths = {header: max(len(header), max(len(str(record.get(header, ""))) for record in records)) for header in headers}
 
     header_row = " | ".join(header.ljust(column_widths[header]) for header in headers)
     separator = "+-" + "-+-".join("-" * column_widths[header] for header in headers) + "-+"
@@ -116,49 +204,639 @@ def view_records(db_name):
         print(f"| {row} |")
     print(separator)
 
-# This function allows the user to delete a specific record from a database by its index. 
-# It confirms the deletion with the user and removes the record if the index is valid. If no records are found or the index 
-# is invalid, it handles the error gracefully.
-def delete_record(db_name, record_index):
-    records = load_data_file(db_name)
-    if not records:
+# This function allows the user to delete a specific record from a database by its ID. 
+# It confirms the deletion with the user and removes the record if the ID is valid. If no records are found or the ID 
+# is invalid, it handles the error gracefully. The IDs of the other records are not affected. If a transaction is
+# given, the deletion is made in it and only takes effect when it is committed.
+def delete_record(db, record_id, transaction=None):
+    database = get_database(db)
+    if len(database) == 0:
         print("No records found.")
         return
 
-    if 0 <= record_index < len(records):
-        confirm = input(f"Are you sure you want to delete record {record_index + 1}? (yes/no): ").strip().lower()
+    target = database if transaction is None else transaction
+    if target.get(record_id) is not None:
+        confirm = input(f"Are you sure you want to delete record {record_id}? (yes/no): ").strip().lower()
         if confirm == 'yes':
-            records.pop(record_index)
-            save_data_file(db_name, records)
-            print(f"Record {record_index + 1} deleted successfully.")
+            if target.delete(record_id):
+                print(f"Record {record_id} deleted {'successfully' if transaction is None else 'in the transaction'}.")
         else:
             print("Deletion canceled.")
     else:
-        print("Invalid record index.")
+        print("Invalid record ID.")
 
-# This function enables the user to edit an existing record in a database by specifying its index. 
+# This function enables the user to edit an existing record in a database by specifying its ID. 
 # The user can update values for each field while ensuring input lengths adhere to the defined constraints. 
-# If the record index is invalid or required files are missing, it handles the situation gracefully.
-def edit_record(db_name, record_index):
-    fields = load_system_file(db_name)
-    records = load_data_file(db_name)
-
-    if not fields or not records:
-        return
-
-    if 0 <= record_index < len(records):
-        record = records[record_index]
-        print(f"Editing record {record_index + 1}:")
-        for field, max_length in fields.items():
-            current_value = record.get(field, "")
-            while True:
-                new_value = input(f"{field} [{current_value}]: ").strip() or current_value
-                if len(new_value) > max_length:
-                    print(f"Value for '{field}' exceeds maximum length of {max_length}.")
-                else:
-                    record[field] = new_value
-                    break
-        save_data_file(db_name, records)
-        print("Record updated successfully.")
+# If the record ID is invalid or required files are missing, it handles the situation gracefully. If a transaction is
+# given, the edit is made in it and only takes effect when it is committed.
+def edit_record(db, record_id, transaction=None):
+    database = get_database(db)
+    fields = database.fields
+
+    if not fields or len(database) == 0:
+        return
+
+    target = database if transaction is None else transaction
+    record = target.get(record_id)
+    if record is not None:
+        record = dict(record)
+        print(f"Editing record {record_id}:")
+        prompt_record_values(fields, record, database.types, database.uses_columns)
+        try:
+            if target.update(record_id, record):
+                print("Record updated successfully." if transaction is None else "Record updated in the transaction.")
+        except ValueError as e:
+            print(f"Error: {e} Record not updated.")
     else:
-        print("Invalid record index.")
+        print("Invalid record ID.")
+
+# This function starts a transaction on a database. Records added, edited and deleted in it (see `add_record`,
+# `edit_record` and `delete_record`) are kept in memory until `commit` applies all of them at once, with a single
+# synced write, or `rollback` discards them.
+def begin(db):
+    return get_database(db).begin()
+
+# This function commits a transaction and reports the outcome: either every change of the transaction is applied,
+# or the error says what was not. It returns `True` if the transaction was committed.
+def commit(transaction):
+    try:
+        results = transaction.commit()
+    except ValueError as e:
+        print(f"Error: the transaction was not committed: {e}.")
+        return False
+    print(f"Transaction committed: {len(results)} change(s) applied.")
+    return True
+
+# This function discards the changes of a transaction.
+def rollback(transaction):
+    print(f"Transaction rolled back: {transaction.rollback()} change(s) discarded.")
+
+# This function removes the tombstones left behind by deleted records, reclaiming their space on disk.
+# Compaction also starts on its own in the background once enough records have been deleted.
+def compact_database(db):
+    database = get_database(db)
+    dead = database.dead_count
+    if dead == 0:
+        print("Nothing to compact.")
+        return
+    database.compact()
+    print(f"Compacted '{database.name}': removed {dead} deleted record(s).")
+
+# This function prompts the user for new values for every field of a record, keeping the current value when the
+# input is left empty. Each value is checked against the maximum length and type defined in the system file, and
+# for columnar databases (`columnar`) typed values must also be in canonical form.
+def prompt_record_values(fields, record, types=None, columnar=False):
+    types = types or {}
+    for field, max_length in fields.items():
+        current_value = record.get(field, "")
+        while True:
+            new_value = input(f"{field} [{current_value}]: ").strip() or current_value
+            if len(new_value) > max_length:
+                print(f"Value for '{field}' exceeds maximum length of {max_length}.")
+            elif not fm.is_valid_value(new_value, types.get(field, "str")):
+                print(type_error(field, types[field]))
+            elif columnar and fm.columnar_form(new_value, types.get(field, "str")) is not None:
+                print(columnar_form_error(field, fm.columnar_form(new_value, types[field])))
+            else:
+                record[field] = new_value
+                break
+
+# This function returns the message shown when a value entered for a typed field is not valid for its type.
+def type_error(field, field_type):
+    hint = " (YYYY-MM-DD)" if field_type == "date" else ""
+    return f"Value for '{field}' must be a valid {field_type}{hint}."
+
+# This function returns the message shown when a typed value for a columnar database is valid but not in canonical
+# form, with the form it has to be written in.
+def columnar_form_error(field, canonical):
+    return f"Value for '{field}' must be written as '{canonical}' in a columnar database."
+
+# This function lets the user create an index on a field of a database, so records can later be looked up by that
+# field without scanning the table. A hash index supports equality lookups; a sorted index also supports ranges.
+def create_index(db):
+    database = get_database(db)
+    fields = database.fields
+    if not fields:
+        return
+
+    field = input(f"Enter the field to index ({', '.join(fields)}): ").strip()
+    if field not in fields:
+        print(f"Field '{field}' does not exist.")
+        return
+    kind = input("Index type - 'hash' for equality or 'sorted' for ranges (default hash): ").strip().lower() or "hash"
+    if kind not in ixs.INDEX_KINDS:
+        print(f"Unknown index type '{kind}'.")
+        return
+
+    database.create_index(field, kind)
+    database.flush()
+    print(f"Created {kind} index on '{field}'.")
+
+# This function lets the user look records up by the value of a field. A single value finds exact matches, while
+# "low..high" (either side may be left empty) finds a range of values. Matching records are shown with their ID.
+def find_records(db):
+    database = get_database(db)
+    fields = database.fields
+    if not fields:
+        return
+
+    field = input(f"Enter the field to search ({', '.join(fields)}): ").strip()
+    if field not in fields:
+        print(f"Field '{field}' does not exist.")
+        return
+    value = input("Enter a value, or a range as low..high: ").strip()
+
+    if ".." in value:
+        low, high = (part.strip() or None for part in value.split("..", 1))
+        record_ids = database.find_range(field, low, high)
+    else:
+        record_ids = database.find(field, value)
+
+    if not record_ids:
+        print("No matching records found.")
+        return
+    print_table([display_row(database.get(record_id)) for record_id in record_ids])
+
+# The comparison operators that can be used in query conditions. Values are compared with `indexes.sort_key`, so
+# numbers compare numerically; "~" matches records whose value contains the given text.
+QUERY_OPERATORS = {
+    "=": lambda key, target: key == target,
+    "!=": lambda key, target: key != target,
+    "<": lambda key, target: key < target,
+    "<=": lambda key, target: key <= target,
+    ">": lambda key, target: key > target,
+    ">=": lambda key, target: key >= target,
+}
+CONDITION_PATTERN = re.compile(r"^\s*(.+?)\s*(<=|>=|!=|=|<|>|~)\s*(.*?)\s*$")
+
+# This function parses a condition written as `<field><operator><value>`, for example `Age>=30` or `address~abad`,
+# into a (field, operator, value) tuple. It returns `None` if the text is not a valid condition.
+def parse_condition(text):
+    match = CONDITION_PATTERN.match(text)
+    if not match:
+        return None
+    return match.group(1), match.group(2), match.group(3)
+
+# This function builds a predicate that checks a record against a list of (field, operator, value) conditions.
+# All conditions must hold for a record to match.
+def build_predicate(conditions):
+    checks = []
+    for field, operator, value in conditions:
+        if operator == "~":
+            checks.append(lambda record, field=field, value=value: value in str(record.get(field, "")))
+        else:
+            compare = QUERY_OPERATORS[operator]
+            target = ixs.sort_key(value)
+            checks.append(lambda record, field=field, compare=compare, target=target:
+                          compare(ixs.sort_key(record.get(field, "")), target))
+    return lambda record: all(check(record) for check in checks)
+
+# This function picks the IDs of candidate records for a query from the indexes of the database. It uses the
+# first condition that an index can answer and returns `None` when no index applies, meaning every record is scanned.
+# A hash index matches values as exact strings, while conditions compare numbers numerically ("30" equals "30.0"), so
+# it is only used to look up values that are not numbers.
+def index_candidates(database, conditions):
+    indexes = database.indexes
+    for field, operator, value in conditions:
+        index = indexes.get(field)
+        if index is None:
+            continue
+        if operator == "=" and (isinstance(index, ixs.SortedIndex) or ixs.sort_key(value)[0] != 0):
+            return index.lookup(value)
+        if isinstance(index, ixs.SortedIndex) and operator in ("<", "<=", ">", ">="):
+            # Ranges are inclusive; strict comparisons are finished off by the predicate
+            return index.range(None, value) if operator in ("<", "<=") else index.range(value, None)
+    return None
+
+# This function runs a query against a database and returns the matching records as a list of dicts.
+#   where     - a list of (field, operator, value) conditions (see `parse_condition`) or a function taking a record
+#   fields    - the fields to include in the results (all fields if omitted)
+#   order_by  - a field name or list of field names to sort the results by, compared like `indexes.sort_key`
+#   limit     - the maximum number of records to return
+# Records are filtered as they are streamed from the database, and only the requested fields are kept. When both
+# `order_by` and `limit` are given, a heap keeps the top `limit` records instead of sorting the whole result.
+# Full scans of large tables are split into segments that worker processes filter in parallel (see `parallel_scan`);
+# each worker also keeps only its own top `limit` records, and the partial results are merged here. A `limit` without
+# `order_by` is answered by a scan in this process instead, which stops as soon as enough records matched.
+@instr.timed()
+def select(db, where=None, fields=None, order_by=None, limit=None, descending=False):
+    database = get_database(db)
+    order_fields = order_field_list(order_by)
+
+    if callable(where):
+        predicate, candidates = where, None
+    else:
+        conditions = where or []
+        predicate = build_predicate(conditions)
+        candidates = index_candidates(database, conditions)
+
+    partials = None
+    if candidates is None and not callable(where) and (order_fields or limit is None) and database.files_current:
+        partials = ps.map_segments(database.name,
+                                   functools.partial(filter_segment, conditions, order_fields, limit, descending))
+    if partials is not None:
+        matches = itertools.chain.from_iterable(partials)
+        instr.count("select parallel scans")
+    else:
+        if candidates is None:
+            records = database.iter_records()
+            instr.count("select full scans")
+        else:
+            records = filter(None, (database.get(record_id) for record_id in candidates))
+            instr.count("select index lookups")
+        matches = (record for record in instr.counted("records scanned", records) if predicate(record))
+    matches = order_and_limit(matches, order_fields, limit, descending)
+
+    if fields:
+        return [{field: record.get(field, "") for field in fields} for record in matches]
+    return list(matches)
+
+# This function sorts matching records by a list of fields and keeps the first `limit` of them. When both are given,
+# a heap keeps the top `limit` records instead of sorting them all.
+def order_and_limit(matches, order_fields=None, limit=None, descending=False):
+    if order_fields:
+        sort_by = es.record_key(order_fields)
+        if limit is not None:
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            return pick(limit, matches, key=sort_by)
+        return sorted(matches, key=sort_by, reverse=descending)
+    if limit is not None:
+        return itertools.islice(matches, limit)
+    return matches
+
+# This function turns the `order_by` argument of a query, a field name or list of field names, into a list of field
+# names, or `None` if it is empty.
+def order_field_list(order_by):
+    if not order_by:
+        return None
+    return [order_by] if isinstance(order_by, str) else list(order_by)
+
+# This function runs in a worker process during a parallel `select`: it filters the records of one segment and keeps
+# the ones that could make it into the result, in the order `select` needs them.
+def filter_segment(conditions, order_fields, limit, descending, records):
+    predicate = build_predicate(conditions)
+    return list(order_and_limit((record for record in records if predicate(record)), order_fields, limit, descending))
+
+# This function lets the user query a database from the CLI. The user can enter conditions separated by commas
+# (for example `Age>30, gender=M`), choose the fields to show, the fields to sort by (prefixed with '-' for descending
+# order) and a maximum number of rows.
+def query_records(db):
+    database = get_database(db)
+    schema = database.fields
+    if not schema:
+        return
+
+    conditions = prompt_conditions(schema)
+    if conditions is None:
+        return
+
+    fields = [field.strip() for field in input("Fields to show (comma-separated; blank for all): ").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in schema]
+    if unknown:
+        print(f"Unknown fields: {', '.join(unknown)}")
+        return
+
+    order_by, descending = prompt_order(schema)
+    if order_by is None:
+        return
+
+    limit = input("Maximum number of rows (blank for no limit): ").strip()
+    try:
+        limit = int(limit) if limit else None
+    except ValueError:
+        print("Please enter a valid integer for the limit.")
+        return
+
+    results = select(database, conditions, fields or None, order_by or None, limit, descending)
+    if not results:
+        print("No matching records found.")
+        return
+    print_table([display_row(record) for record in results])
+    print(f"{len(results)} record(s) found.")
+
+# This function asks the user for query conditions separated by commas (for example `Age>30, gender=M`) and returns
+# them as a list of (field, operator, value) tuples, or `None` if one of them is invalid.
+def prompt_conditions(schema):
+    conditions = []
+    for text in filter(None, (part.strip() for part in input("Conditions (e.g. Age>30, gender=M; blank for all): ").split(","))):
+        condition = parse_condition(text)
+        if condition is None or condition[0] not in schema:
+            print(f"Invalid condition '{text}'.")
+            return None
+        conditions.append(condition)
+    return conditions
+
+# This function asks the user for the fields to sort records by, separated by commas, and returns them as a
+# (fields, descending) pair. A leading '-' (for example `-Age, Name`) sorts in descending order. The fields are an
+# empty list if the user leaves the answer blank, and `None` if one of them does not exist.
+def prompt_order(schema, prompt="Sort by fields (comma-separated, prefix with '-' for descending; blank for none): "):
+    text = input(prompt).strip()
+    descending = text.startswith("-")
+    order_fields = [field.strip() for field in text.lstrip("-").split(",") if field.strip()]
+    unknown = [field for field in order_fields if field not in schema]
+    if unknown:
+        print(f"Unknown fields: {', '.join(unknown)}")
+        return None, descending
+    return order_fields, descending
+
+# This function computes an aggregate over the records of a database that match a list of (field, operator, value)
+# conditions: the "count" of the records, or the "sum", "avg", "min" or "max" of a field. Values are converted to the
+# type of their field first, so numbers add up and compare as numbers; text fields can be summed and averaged when
+# all of their values are numbers. Without `group_by` the result is a single value (`None` for the average, minimum
+# or maximum of no records); with it, a list of (group, value) pairs ordered by group. Columnar databases compute it
+# over whole columns with NumPy and read only the columns involved; other databases scan their records, in parallel
+# worker processes for large tables, and merge what was collected for each segment.
+@instr.timed()
+def aggregate(db, func, field=None, group_by=None, where=None):
+    database = get_database(db)
+    if func not in cs.AGGREGATES:
+        raise ValueError(f"unknown aggregate {func!r}; expected one of {', '.join(cs.AGGREGATES)}")
+    if func != "count" and field is None:
+        raise ValueError(f"'{func}' needs a field")
+    for name in (field, group_by):
+        if name is not None and name not in database.fields:
+            raise ValueError(f"field {name!r} does not exist")
+    conditions = where or []
+
+    columns = database.columns
+    if columns is not None:
+        mask = columns.condition_mask(conditions)
+        if mask is not None:
+            instr.count("aggregate column scans")
+            return columns.aggregate(func, field, group_by, mask)
+
+    collect = functools.partial(aggregate_segment, func, field, group_by, database.types, conditions)
+    partials = ps.map_segments(database.name, collect) if database.files_current else None
+    if partials is not None:
+        instr.count("aggregate parallel scans")
+    else:
+        instr.count("aggregate full scans")
+        partials = [collect(instr.counted("records scanned", database.iter_records()))]
+
+    groups = {}
+    for partial in partials:
+        for key, state in partial.items():
+            merge_state(groups.setdefault(key, [0, 0, None, None]), state)
+
+    if group_by is None:
+        return aggregate_result(func, groups.get(None, [0, 0, None, None]))
+    return [(plain_value(key), aggregate_result(func, state)) for key, state in sorted(groups.items())]
+
+# This function collects what an aggregate needs from a list of records: for every group, the [count, sum, minimum,
+# maximum] of the matching records. It runs in a worker process for every segment of a parallel scan.
+def aggregate_segment(func, field, group_by, types, conditions, records):
+    predicate = build_predicate(conditions)
+    groups = {}
+    for record in records:
+        if not predicate(record):
+            continue
+        key = None if group_by is None else fm.parse_value(record.get(group_by, ""), types.get(group_by, "str"))
+        state = groups.setdefault(key, [0, 0, None, None])
+        state[0] += 1
+        if func == "count":
+            continue
+        value = aggregate_value(record, field, types.get(field, "str"), func)
+        if func in ("sum", "avg"):
+            state[1] += value
+        else:
+            merge_state(state, [0, 0, value, value])
+    return groups
+
+# This function adds the [count, sum, minimum, maximum] collected for a group to another one.
+def merge_state(state, other):
+    state[0] += other[0]
+    state[1] += other[1]
+    if other[2] is not None and (state[2] is None or other[2] < state[2]):
+        state[2] = other[2]
+    if other[3] is not None and (state[3] is None or other[3] > state[3]):
+        state[3] = other[3]
+
+# This function converts the value of a field to what an aggregate works on: a number for sums and averages, and a
+# value of the type of the field for minimums and maximums.
+def aggregate_value(record, field, field_type, func):
+    value = record.get(field, "")
+    if func in ("sum", "avg"):
+        if field_type == "date":
+            raise ValueError(f"'{field}' holds dates, which cannot be summed or averaged.")
+        if field_type == "str":
+            try:
+                return float(value)
+            except ValueError:
+                raise ValueError(f"'{field}' does not hold numbers.")
+    return fm.parse_value(value, field_type)
+
+# This function finishes an aggregate from the [count, sum, minimum, maximum] collected for a group.
+def aggregate_result(func, state):
+    count, total, minimum, maximum = state
+    if func == "count":
+        return count
+    if func == "sum":
+        return total
+    if func == "avg":
+        return total / count if count else None
+    return plain_value(minimum if func == "min" else maximum)
+
+# This function shows dates as YYYY-MM-DD, the way they are stored, and leaves other values as they are.
+def plain_value(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+# This function lets the user compute an aggregate from the CLI: a count of the records, or the sum, average,
+# minimum or maximum of a field, optionally over the records matching some conditions and grouped by a field.
+def aggregate_records(db):
+    database = get_database(db)
+    schema = database.fields
+    if not schema:
+        return
+
+    func = input(f"Aggregate ({', '.join(cs.AGGREGATES)}): ").strip().lower()
+    if func not in cs.AGGREGATES:
+        print(f"Unknown aggregate '{func}'.")
+        return
+    field = None
+    if func != "count":
+        field = input(f"Field to aggregate ({', '.join(schema)}): ").strip()
+        if field not in schema:
+            print(f"Field '{field}' does not exist.")
+            return
+    conditions = prompt_conditions(schema)
+    if conditions is None:
+        return
+    group_by = input("Group by field (blank for none): ").strip() or None
+    if group_by is not None and group_by not in schema:
+        print(f"Field '{group_by}' does not exist.")
+        return
+
+    try:
+        result = aggregate(database, func, field, group_by, conditions)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+    label = f"{func}({field or '*'})"
+    if group_by is None:
+        print(f"{label} = {result}")
+    elif not result:
+        print("No matching records found.")
+    else:
+        print_table([{group_by: group, label: value} for group, value in result])
+
+# Commands let programs run database operations without the interactive prompts; they are used by the script mode of
+# the CLI and by the database server. A command is a dict with an "op" and its arguments:
+#   {"op": "add", "record": {...}}                      -> {"id": ...}
+#   {"op": "edit", "id": 3, "record": {...}}            (only the given fields change)
+#   {"op": "delete", "id": 3}
+#   {"op": "get", "id": 3}                              -> {"record": ...}
+#   {"op": "view", "start": 0, "limit": 20, "order_by": "Age", "descending": false}
+#                                                       -> {"records": [...], "total": ...}
+#   {"op": "query", "where": "Age>30, gender=M", "fields": [...], "order_by": "Age", "descending": false, "limit": 10}
+#                                                       -> {"records": [...]}
+#   {"op": "aggregate", "func": "avg", "field": "Age", "group_by": "gender", "where": "Age>30"}
+#                                                       -> {"value": ...}, or {"groups": [[group, value], ...]}
+#   {"op": "import", "path": "rows.csv", "format": "csv"} -> {"imported": ..., "rejected": ...}
+#   {"op": "export", "path": "rows.jsonl", "order_by": ["Age", "Name"], "descending": false}
+#   {"op": "compact"}
+#   {"op": "transaction", "commands": [{"op": "add", ...}, {"op": "edit", ...}, {"op": "delete", ...}]}
+#                                                       -> {"ids": [...]}, with all of the changes made or none
+COMMAND_OPERATIONS = ("add", "edit", "delete", "get", "view", "query", "aggregate", "import", "export", "compact",
+                      "transaction")
+
+# The commands that change records. The server groups these into batches.
+WRITE_OPERATIONS = ("add", "edit", "delete", "transaction")
+
+# This function checks the values of a record given to a command against the schema, the same way imported
+# rows are checked. It returns the record limited to the schema fields, or raises `ValueError`.
+def validate_command_record(database, record):
+    valid, rejected = fm.validate_batch(database.fields, [(0, record)], database.uses_store, database.types,
+                                        database.uses_columns)
+    if rejected:
+        raise ValueError(rejected[0][2])
+    return valid[0]
+
+# This function parses the "where" of a command, given as a list of conditions or a comma-separated string of them,
+# into (field, operator, value) tuples. It raises `ValueError` for an invalid condition.
+def command_conditions(database, command):
+    where = command.get("where") or []
+    if isinstance(where, str):
+        where = [part.strip() for part in where.split(",") if part.strip()]
+    conditions = []
+    for text in where:
+        condition = parse_condition(text)
+        if condition is None or condition[0] not in database.fields:
+            raise ValueError(f"invalid condition {text!r}")
+        conditions.append(condition)
+    return conditions
+
+# This function returns the fields a command sorts by, from its "order_by" (a field name or list of field names), or
+# `None` if it does not sort. It raises `ValueError` for a field that does not exist.
+def command_order(database, command):
+    order_fields = order_field_list(command.get("order_by"))
+    for field in order_fields or []:
+        if field not in database.fields:
+            raise ValueError(f"field {field!r} does not exist")
+    return order_fields
+
+# This function returns the record ID a command refers to, or raises `ValueError`.
+def command_record_id(command):
+    try:
+        return int(command["id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("'id' must be an integer record ID")
+
+# This function adds the change of an "add", "edit" or "delete" command to a transaction, checking it the same way
+# `execute_command` does. It raises `ValueError` for an invalid command.
+def stage_command(transaction, command):
+    database = transaction.database
+    op = command.get("op") if isinstance(command, dict) else None
+    if op == "add":
+        transaction.add(validate_command_record(database, command.get("record")))
+    elif op == "edit":
+        record_id = command_record_id(command)
+        record = transaction.get(record_id)
+        if record is None:
+            raise ValueError(f"record {record_id} does not exist")
+        if not isinstance(command.get("record"), dict):
+            raise ValueError("'record' must be an object")
+        transaction.update(record_id, validate_command_record(database, dict(record, **command["record"])))
+    elif op == "delete":
+        record_id = command_record_id(command)
+        if not transaction.delete(record_id):
+            raise ValueError(f"record {record_id} does not exist")
+    else:
+        raise ValueError(f"a transaction can only hold add, edit and delete commands, not {op!r}")
+
+# This function runs one command against a database (a name or an open `Database`) and returns its result as a dict.
+# Invalid commands and failed operations raise `ValueError`.
+def execute_command(db, command):
+    database = get_database(db)
+    op = command.get("op") if isinstance(command, dict) else None
+    if op not in COMMAND_OPERATIONS:
+        raise ValueError(f"unknown op {op!r}; expected one of {', '.join(COMMAND_OPERATIONS)}")
+
+    if op == "add":
+        record_id = database.add(validate_command_record(database, command.get("record")))
+        if record_id is None:
+            raise ValueError("record could not be written")
+        return {"id": record_id}
+    if op == "edit":
+        record_id = command_record_id(command)
+        record = database.get(record_id)
+        if record is None:
+            raise ValueError(f"record {record_id} does not exist")
+        if not isinstance(command.get("record"), dict):
+            raise ValueError("'record' must be an object")
+        if not database.update(record_id, validate_command_record(database, dict(record, **command["record"]))):
+            raise ValueError("record could not be written")
+        return {"id": record_id}
+    if op == "delete":
+        record_id = command_record_id(command)
+        if not database.delete(record_id):
+            raise ValueError(f"record {record_id} does not exist")
+        return {"id": record_id}
+    if op == "get":
+        record = database.get(command_record_id(command))
+        if record is None:
+            raise ValueError(f"record {command['id']} does not exist")
+        return {"record": record}
+    if op == "view":
+        start, limit = int(command.get("start", 0)), int(command.get("limit", PAGE_SIZE))
+        order_fields = command_order(database, command)
+        if order_fields:
+            records = es.sort_records(database.iter_records(), es.record_key(order_fields),
+                                      bool(command.get("descending")))
+            records = itertools.islice(records, start, start + limit)
+        else:
+            records = itertools.islice(database.iter_records(start), limit)
+        return {"records": list(records), "total": len(database)}
+    if op == "query":
+        records = select(database, command_conditions(database, command), command.get("fields"),
+                         command.get("order_by"), command.get("limit"), bool(command.get("descending")))
+        return {"records": records}
+    if op == "aggregate":
+        result = aggregate(database, command.get("func"), command.get("field"), command.get("group_by"),
+                           command_conditions(database, command))
+        if command.get("group_by") is None:
+            return {"value": result}
+        return {"groups": [list(group) for group in result]}
+    if op == "import":
+        database.flush()  # The import rewrites the data file, so the changes so far are written out first
+        result = fm.import_records(database.name, command.get("path", ""), command.get("format"))
+        if result is None:
+            raise ValueError(f"could not import {command.get('path', '')!r}")
+        return {"imported": result[0], "rejected": result[1]}
+    if op == "export":
+        database.flush()
+        if fm.export_records(database.name, command.get("path", ""), command.get("format"),
+                             command_order(database, command), bool(command.get("descending"))) is None:
+            raise ValueError(f"could not export to {command.get('path', '')!r}")
+        return {"path": command.get("path", "")}
+    if op == "transaction":
+        if not isinstance(command.get("commands"), list):
+            raise ValueError("'commands' must be a list")
+        transaction = database.begin()
+        for number, change in enumerate(command["commands"], start=1):
+            try:
+                stage_command(transaction, change)
+            except ValueError as e:
+                raise ValueError(f"command {number}: {e}")
+        return {"ids": transaction.commit()}
+    database.compact()
+    return {}
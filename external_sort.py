@@ -0,0 +1,134 @@
+# Importing necessary modules for sorting tables larger than memory.
+# The `heapq` module merges the sorted runs into one ordered stream.
+# The `json` module writes the records of a sorted run to its temporary file, one per line.
+# The `sys` module estimates how much memory the records of a run take up.
+# The `tempfile` module creates the files that sorted runs are spilled to; they are removed when closed.
+# The `indexes` module provides the key that orders field values, so numbers sort numerically.
+import heapq
+import json
+import sys
+import tempfile
+import indexes as ixs
+
+# The amount of memory, in bytes, that the records being sorted may take up at once. Records are collected until
+# they reach this size, sorted, and written out as a run; the runs are then merged.
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+# The largest number of runs merged at once. If a sort produces more runs than this, they are merged in several
+# passes, so the number of open files stays bounded as well.
+MERGE_FAN_IN = 128
+
+# Sorted output kept by `SortedFile` remembers where every this many records start, so that reading from any
+# position only needs to skip a few lines.
+STRIDE = 1000
+
+
+# This function returns the key that orders records by a list of fields, in the same way as queries do.
+def record_key(order_fields):
+    return lambda record: [ixs.sort_key(record.get(field, "")) for field in order_fields]
+
+
+# This function estimates the memory taken up by a record: the dict itself and its values.
+def record_size(record):
+    return sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+
+
+# This function yields records ordered by `key`, holding at most about `memory_budget` bytes of records in memory.
+# Records are read in runs that fit the budget; each run is sorted and written to a temporary file, and the runs are
+# merged with a k-way merge. If all the records fit in a single run, nothing is written to disk. The sort is stable:
+# records with equal keys keep the order they came in, also when sorting in descending order.
+def sort_records(records, key, descending=False, memory_budget=MEMORY_BUDGET):
+    runs = []
+    try:
+        run, used = [], 0
+        for record in records:
+            run.append(record)
+            used += record_size(record)
+            if used >= memory_budget:
+                runs.append(spill_run(run, key, descending))
+                run, used = [], 0
+        if not runs:
+            run.sort(key=key, reverse=descending)
+            yield from run
+            return
+        if run:
+            runs.append(spill_run(run, key, descending))
+        del run
+
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for first in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[first:first + MERGE_FAN_IN]
+                merged.append(write_run(merge_runs(group, key, descending)))
+                for f in group:
+                    f.close()
+            runs = merged
+        yield from merge_runs(runs, key, descending)
+    finally:
+        for f in runs:
+            f.close()
+
+
+# This function sorts a run of records and writes it to a temporary file. It returns the file, positioned at its start.
+def spill_run(run, key, descending):
+    run.sort(key=key, reverse=descending)
+    return write_run(run)
+
+
+# This function writes records to a temporary file as JSON Lines and returns the file, positioned at its start.
+def write_run(records):
+    f = tempfile.TemporaryFile('w+', encoding='utf-8')
+    for record in records:
+        f.write(json.dumps(record) + "\n")
+    f.seek(0)
+    return f
+
+
+# This function merges sorted runs into one ordered stream. Records with equal keys are taken from earlier runs
+# first, which keeps the sort stable.
+def merge_runs(runs, key, descending):
+    streams = [(json.loads(line) for line in f) for f in runs]
+    return heapq.merge(*streams, key=key, reverse=descending)
+
+
+# The SortedFile class keeps the sorted records of a table in a temporary file, so that they can be read from any
+# position as often as needed without sorting again, while only a small part of them is in memory at a time. It is
+# used to page through a table in sorted order. The position of every `STRIDE`-th record is remembered, so reading
+# from a position seeks close to it and skips the few records in between.
+class SortedFile:
+    def __init__(self, records, key, descending=False, memory_budget=MEMORY_BUDGET):
+        self._file = tempfile.TemporaryFile('w+b')
+        self._offsets = []
+        self.count = 0
+        for record in sort_records(records, key, descending, memory_budget):
+            if self.count % STRIDE == 0:
+                self._offsets.append(self._file.tell())
+            self._file.write(json.dumps(record).encode("utf-8") + b"\n")
+            self.count += 1
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    # Yields the records from the 0-based position `start` onwards, in sorted order. Several of these can be read at
+    # once; each one returns to its own place in the shared file before reading on.
+    def iter_from(self, start=0):
+        if start >= self.count:
+            return
+        self._file.seek(self._offsets[start // STRIDE])
+        for _ in range(start % STRIDE):
+            self._file.readline()
+        for _ in range(self.count - start):
+            position = self._file.tell()
+            line = self._file.readline()
+            yield json.loads(line)
+            self._file.seek(position + len(line))
+
+    def close(self):
+        self._file.close()
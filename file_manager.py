@@ -1,8 +1,93 @@
 # Importing necessary modules for managing database files.
+# The `contextlib` module is used to build the lock context manager.
+# The `csv` module is used to import and export records as CSV files.
+# The `fcntl` module provides the advisory file locks that let several sessions share a database safely. It is not
+# available on every platform; without it, databases are used without locking.
+# The `threading` module keeps threads of the same process from taking the file lock over each other.
 # The `json` module is used to read and write data in JSON format, enabling structured storage and retrieval.
 # The `os` module is used for file system operations such as checking for file existence and deleting files.
+# The `write_ahead_log` module records single-record changes without rewriting the JSON data file.
+# The `indexes` module names the index file that is removed together with a database.
+# The `record_store` module provides the optional fixed-width binary storage engine.
+# The `block_store` module provides the optional compressed, block-structured data files.
+# The `column_store` module provides the optional columnar data files, which store every field as a typed array.
+# The `datetime` module parses the values of date fields.
+# The `external_sort` module sorts the records of an export that is written in order.
+# The `instrumentation` module times the file operations and counts the bytes they read and write when profiling is on.
+import contextlib
+import csv
+import datetime
 import json
 import os
+import threading
+import block_store as bs
+import column_store as cs
+import external_sort as es
+import indexes as ixs
+import instrumentation as instr
+import record_store as rs
+import write_ahead_log as wal
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Locks currently held by this process, keyed by database name. Each entry holds the open lock file, whether the lock
+# is exclusive, how many nested `database_lock` blocks are using it, and the thread lock that keeps other threads out.
+_held_locks = {}
+_held_locks_guard = threading.Lock()
+
+
+# This function returns the path of the lock file of a database.
+def lock_path(db_name):
+    return f"{db_name}.lock"
+
+
+# This context manager locks a database for the duration of a `with` block. Shared locks are for reading and can be
+# held by many processes at once; an exclusive lock is for writing and waits until no other process holds any lock on
+# the database. The locks are advisory `flock` locks on `<db>.lock`, so every session that goes through this module
+# takes part. Locks can be nested; asking for an exclusive lock inside a shared one upgrades it until the outermost
+# block ends. Within one process, threads take turns on the database.
+@contextlib.contextmanager
+def database_lock(db_name, exclusive=False):
+    with _held_locks_guard:
+        held = _held_locks.setdefault(db_name, {"file": None, "exclusive": False, "depth": 0,
+                                                "thread_lock": threading.RLock()})
+    with held["thread_lock"]:
+        if held["depth"] == 0 and fcntl is not None:
+            held["file"] = open(lock_path(db_name), 'a')
+            fcntl.flock(held["file"].fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            held["exclusive"] = exclusive
+        elif exclusive and not held["exclusive"] and held["file"] is not None:
+            fcntl.flock(held["file"].fileno(), fcntl.LOCK_EX)
+            held["exclusive"] = True
+        held["depth"] += 1
+        try:
+            yield
+        finally:
+            held["depth"] -= 1
+            if held["depth"] == 0 and held["file"] is not None:
+                fcntl.flock(held["file"].fileno(), fcntl.LOCK_UN)
+                held["file"].close()
+                held["file"] = None
+
+
+# This function writes a file atomically: the contents go to a temporary file next to it, which is flushed to disk
+# and then renamed over the original. Readers therefore see either the old or the new file, never a half-written one.
+# `write` is called with the open temporary file.
+def atomic_write(path, write, mode='w'):
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
 
 
 # This function deletes a database by removing its associated data and system files.
@@ -13,17 +98,30 @@ def delete_database(db_name):
     system_file = f"{db_name}_system.json"
 
     try:
-        if os.path.exists(data_file):
-            os.remove(data_file)
-            print(f"Deleted data file: {data_file}")
-        else:
-            print(f"Data file '{data_file}' not found.")
+        with database_lock(db_name, exclusive=True):
+            if os.path.exists(data_file):
+                os.remove(data_file)
+                print(f"Deleted data file: {data_file}")
+            elif not (rs.store_exists(db_name) or bs.store_exists(db_name) or cs.store_exists(db_name)):
+                print(f"Data file '{data_file}' not found.")
 
-        if os.path.exists(system_file):
-            os.remove(system_file)
-            print(f"Deleted system file: {system_file}")
-        else:
-            print(f"System file '{system_file}' not found.")
+            if os.path.exists(system_file):
+                os.remove(system_file)
+                print(f"Deleted system file: {system_file}")
+            else:
+                print(f"System file '{system_file}' not found.")
+
+            for store_path in (rs.data_path(db_name), bs.data_path(db_name), cs.data_path(db_name)):
+                if os.path.exists(store_path):
+                    os.remove(store_path)
+                    print(f"Deleted data file: {store_path}")
+
+            wal.clear_log(db_name)
+            if os.path.exists(ixs.index_path(db_name)):
+                os.remove(ixs.index_path(db_name))
+        if os.path.exists(lock_path(db_name)):
+            os.remove(lock_path(db_name))
+        remove_from_catalog(db_name)
 
         print(f"Database '{db_name}' has been deleted successfully.")
     except Exception as e:
@@ -33,25 +131,65 @@ def delete_database(db_name):
 # This function creates the necessary files for a new database.
 # The system file stores metadata about the database (e.g., field names and maximum lengths), while the data file is
 # initialized as an empty list to store records. If file creation fails, it returns a failure indication.
-def create_database_files(db_name, fields):
+# With `storage="binary"` the records are kept in a fixed-width `.dat` file instead (see the `record_store` module),
+# with `storage="zlib"` or `"lzma"` in a compressed, block-structured `.zdb` file (see the `block_store` module), and
+# with `storage="columnar"` in a `.col` file holding one typed array per field (see the `column_store` module).
+# `types` optionally maps fields to one of `FIELD_TYPES`; fields without a type hold text. It refuses to create a
+# database whose files are already on disk, even if the catalog does not list it, so existing records are never
+# overwritten.
+def create_database_files(db_name, fields, storage="json", types=None):
     data_file = f"{db_name}_data.json"
     system_file = f"{db_name}_system.json"
 
+    existing = [path for path in database_file_paths(db_name) if os.path.exists(path)]
+    if existing:
+        print(f"Error: database '{db_name}' already has files on disk ({', '.join(existing)}); not overwriting them.")
+        return False
     try:
-        with open(system_file, 'w') as f:
-            json.dump(fields, f, indent=4)  # Save metadata (fields)
-        with open(data_file, 'w') as f:
-            json.dump([], f, indent=4)  # Initialize with an empty list of records
+        schema = system_file_entries(fields, types)
+        atomic_write(system_file, lambda f: json.dump(schema, f, indent=4))  # Save metadata (fields)
+        if storage == "binary":
+            rs.create_store(db_name, fields)  # Initialize an empty fixed-width record store
+        elif storage in bs.CODECS:
+            bs.write_store(db_name, fields, [], storage)  # Initialize an empty compressed data file
+        elif storage == "columnar":
+            cs.write_store(db_name, fields, types or {}, [])  # Initialize an empty columnar data file
+        else:
+            with open(data_file, 'w') as f:
+                json.dump([], f, indent=4)  # Initialize with an empty list of records
+        update_catalog(db_name, fields, storage, 0)
         print(f"Database '{db_name}' created successfully.")
         return True  # Indicate success
-    except (IOError, json.JSONDecodeError) as e:
+    except (IOError, ValueError) as e:  # `ValueError` also covers corrupted JSON and a missing NumPy
         print(f"Error creating database files: {e}")
         return False  # Indicate failure
 
 
+# This function returns the paths of the files that hold the schema and records of a database, in every storage
+# format.
+def database_file_paths(db_name):
+    return (f"{db_name}_system.json", f"{db_name}_data.json", rs.data_path(db_name), bs.data_path(db_name),
+            cs.data_path(db_name), wal.log_path(db_name))
+
+
 # This function loads the system file of a database, which contains its metadata (e.g., field definitions and constraints).
 # If the file does not exist or is corrupted, it handles the situation gracefully by returning `None` and notifying the user.
+# It returns the maximum length of every field; `load_field_types` returns their types.
+@instr.timed()
 def load_system_file(db_name):
+    schema = read_system_file(db_name)
+    return None if schema is None else parse_schema(schema)[0]
+
+
+# This function returns the type of every field of a database (see `FIELD_TYPES`), or `None` if the system file
+# cannot be read.
+def load_field_types(db_name):
+    schema = read_system_file(db_name)
+    return None if schema is None else parse_schema(schema)[1]
+
+
+# This function reads the system file of a database as it is stored, or returns `None` if it is missing or corrupted.
+def read_system_file(db_name):
     system_file = f"{db_name}_system.json"
     if not os.path.exists(system_file):
         print(f"System file for database '{db_name}' not found.")
@@ -65,43 +203,644 @@ def load_system_file(db_name):
         return None
 
 
+# The types a field can have. Values are always held as strings; the type decides which strings are valid (see
+# `parse_value`) and how the field is stored in a columnar data file.
+FIELD_TYPES = ("str", "int", "float", "date")
+
+
+# The system file maps every field to its maximum length. A typed field maps to an object instead, for example
+# `"Age": {"length": 3, "type": "int"}`; fields given as a plain length hold text. This function splits a system
+# file into the maximum lengths and the types of its fields.
+def parse_schema(schema):
+    fields, types = {}, {}
+    for field, entry in schema.items():
+        if isinstance(entry, dict):
+            fields[field], types[field] = entry["length"], entry.get("type", "str")
+        else:
+            fields[field], types[field] = entry, "str"
+    return fields, types
+
+
+# This function builds the contents of a system file from the maximum lengths and types of the fields. Text fields
+# are written as a plain length, so databases without types keep the system file format they always had.
+def system_file_entries(fields, types=None):
+    types = types or {}
+    return {field: max_length if types.get(field, "str") == "str" else {"length": max_length, "type": types[field]}
+            for field, max_length in fields.items()}
+
+
+# This function converts a value to the type of its field, raising `ValueError` if it is not valid for the type.
+# Dates are written as YYYY-MM-DD.
+def parse_value(value, field_type="str"):
+    if field_type == "int":
+        return int(value)
+    if field_type == "float":
+        return float(value)
+    if field_type == "date":
+        return datetime.date.fromisoformat(str(value))
+    return str(value)
+
+
+# This function checks whether a value is valid for the type of its field.
+def is_valid_value(value, field_type="str"):
+    try:
+        parse_value(value, field_type)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+# Columnar databases store typed values as numbers and dates, which only read back as the text they were written as
+# if that text is in canonical form: "044" would come back from an int field as "44", and "2" from a float field as
+# "2.0". So that a record always reads back exactly as it was written, columnar databases reject typed values that
+# are not in canonical form. This function returns the canonical form of a valid value (see
+# `column_store.canonical_values`), or `None` if the value is already written that way or the field holds text.
+def columnar_form(value, field_type="str"):
+    if field_type == "str":
+        return None
+    try:
+        canonical = cs.canonical_values([str(value)], field_type)[0]
+    except ValueError:
+        return None  # Left to the type check
+    return None if canonical == str(value) else canonical
+
+
 # This function loads the data file of a database, which stores the records in JSON format.
 # If the file does not exist, it returns an empty list. It also handles file corruption by notifying the user
-# and returning an empty list as a fallback.
+# and returning an empty list as a fallback. Changes recorded in the write-ahead log since the last checkpoint are
+# replayed on top of the data file. Databases using the binary record store are read from their `.dat` file, and
+# compressed and columnar databases from their `.zdb` or `.col` file (which, like a JSON data file, is brought up to
+# date by the log).
+# The list includes the tombstones of deleted records that have not been compacted away yet (see `is_deleted`).
+@instr.timed()
 def load_data_file(db_name):
-    data_file = f"{db_name}_data.json"
+    if rs.store_exists(db_name):
+        return load_store_records(db_name)
+
+    data_file = data_file_path(db_name)
     if not os.path.exists(data_file):
         print(f"Data file for database '{db_name}' not found.")
         return []
 
     try:
-        with open(data_file, 'r') as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        with database_lock(db_name):
+            with open(data_file, 'rb') as f:
+                base_bytes = f.read()
+            instr.count("bytes read", len(base_bytes))
+            return wal.replay(db_name, base_bytes, decode_data_file(db_name, base_bytes))
+    except ValueError:  # Raised for corrupted JSON and compressed files alike
         print(f"Error: Data file for '{db_name}' is corrupted.")
         return []
 
 
+# This function returns the path of the file holding the records of a database that is not using the binary record
+# store: its compressed `.zdb` or columnar `.col` file if it has one, and its JSON data file otherwise. The
+# write-ahead log applies to this file.
+def data_file_path(db_name):
+    if bs.store_exists(db_name):
+        return bs.data_path(db_name)
+    if cs.store_exists(db_name):
+        return cs.data_path(db_name)
+    return f"{db_name}_data.json"
+
+
+# This function returns the storage format of a database as recorded in the catalog: "json", "binary", "columnar",
+# or the codec of a compressed data file.
+def database_storage(db_name):
+    if rs.store_exists(db_name):
+        return "binary"
+    if bs.store_exists(db_name):
+        return bs.store_codec(db_name)
+    if cs.store_exists(db_name):
+        return "columnar"
+    return "json"
+
+
+# This function decodes the contents of the data file of a database (see `data_file_path`) into a list of records.
+def decode_data_file(db_name, base_bytes):
+    if bs.store_exists(db_name):
+        return bs.BlockReader(db_name, base_bytes).read_all()
+    if cs.store_exists(db_name):
+        return cs.ColumnReader(db_name, base_bytes).read_all()
+    return assign_ids(json.loads(base_bytes))
+
+
+# Every record carries a stable ID in its `_id` key, which stays the same when other records are deleted. IDs
+# increase through the data file; records from files written before IDs existed get the ID of the record before
+# them plus one, which numbers an old file 1, 2, 3, ... in order.
+def assign_ids(records):
+    previous_id = 0
+    for record in records:
+        if "_id" not in record:
+            record["_id"] = previous_id + 1
+        previous_id = record["_id"]
+    return records
+
+
+# This function checks whether a stored record is the tombstone of a deleted record.
+def is_deleted(record):
+    return record.get("_deleted", False)
+
+
+# This function yields the records of a JSON data file one at a time, starting at the 0-based position `start`.
+# The file is read in chunks and decoded record by record, so only the records being consumed are held in memory.
+# It reads the data file as it is on disk; changes still waiting in the write-ahead log are not included. No lock is
+# needed: the data file is only ever replaced by renaming, so the open file stays the version it started with.
+def iter_data_file(db_name, start=0, chunk_size=64 * 1024):
+    decoder = json.JSONDecoder()
+    with open(f"{db_name}_data.json", 'r') as f:
+        buffer = f.read(chunk_size)
+        instr.count("bytes read", len(buffer))
+        buffer = buffer.lstrip()
+        if not buffer.startswith("["):
+            raise json.JSONDecodeError("Expected a list of records", buffer, 0)
+        offset = 1
+        position = 0
+        eof = False
+        while True:
+            while offset < len(buffer) and buffer[offset] in " \t\r\n,":
+                offset += 1
+            if buffer.startswith("]", offset):
+                return
+            try:
+                record, offset = decoder.raw_decode(buffer, offset)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                instr.count("bytes read", len(chunk))
+                eof = not chunk
+                buffer = buffer[offset:] + chunk
+                offset = 0
+                continue
+            if position >= start:
+                yield record
+            position += 1
+
+
 # This function saves a list of records to the data file of a database.
 # It ensures data is written in a structured JSON format, and any I/O errors during the save process
 # are caught and reported to the user.
+@instr.timed()
 def save_data_file(db_name, records):
-    data_file = f"{db_name}_data.json"
+    if rs.store_exists(db_name):
+        save_store_records(db_name, records)
+        return
 
-    try:
-        with open(data_file, 'w') as f:
-            json.dump(records, f, indent=4)
+    if write_data_file(db_name, records):
         print(f"Records saved successfully to '{db_name}'.")
-    except IOError as e:
-        print(f"Error saving records to '{db_name}_data.json': {e}")
 
 
-# This function checks whether the necessary files for a database (data and system files) exist.
-# It returns `True` if both files are found, indicating that the database is intact; otherwise, it returns `False`.
+# This function writes a list of records to the JSON (or compressed, or columnar) data file of a database and
+# discards the write-ahead log, since the data file now contains every logged change. It returns `True` on success.
+# The new file replaces the old one atomically, under an exclusive lock, so other sessions never read a half-written
+# data file.
+@instr.timed()
+def write_data_file(db_name, records):
+    data_file = data_file_path(db_name)
+    try:
+        with database_lock(db_name, exclusive=True):
+            if bs.store_exists(db_name):
+                bs.write_store(db_name, load_system_file(db_name) or {}, records, bs.store_codec(db_name))
+            elif cs.store_exists(db_name):
+                cs.write_store(db_name, load_system_file(db_name) or {}, load_field_types(db_name) or {}, records)
+            else:
+                atomic_write(data_file, lambda f: json.dump(records, f, indent=4))
+            wal.clear_log(db_name)
+            update_catalog(db_name, rows=sum(1 for record in records if not is_deleted(record)))
+        instr.count("bytes written", os.path.getsize(data_file) if instr.ENABLED else 0)
+        return True
+    except (IOError, ValueError) as e:  # `ValueError` is raised for values that do not fit a typed column
+        print(f"Error saving records to '{data_file}': {e}")
+        return False
+
+
+# This function records changes to a JSON database by appending them to its write-ahead log, so that a single
+# insert, edit or delete costs one small write instead of a rewrite of the data file. When the log grows past
+# `write_ahead_log.CHECKPOINT_BYTES` it is folded back into the data file.
+@instr.timed()
+def append_log_entries(db_name, entries):
+    with database_lock(db_name, exclusive=True):
+        try:
+            wal.append_entries(db_name, entries, data_file_path(db_name))
+        except IOError as e:
+            print(f"Error writing to '{wal.log_path(db_name)}': {e}")
+            return False
+        if wal.needs_checkpoint(db_name):
+            checkpoint_data_file(db_name)
+    return True
+
+
+# This function checkpoints the write-ahead log of a database: it rewrites the data file with every logged change
+# applied and then discards the log. Callers that already hold the up-to-date records can pass them in to skip
+# reading the data file and log again.
+@instr.timed()
+def checkpoint_data_file(db_name, records=None):
+    with database_lock(db_name, exclusive=True):
+        if not os.path.exists(wal.log_path(db_name)):
+            return
+        if records is None:
+            records = load_data_file(db_name)
+        write_data_file(db_name, records)
+
+
+# This function checks whether a database exists, by looking it up in the database catalog.
+# It returns `True` if the database is listed; otherwise, it returns `False`.
 def database_exists(db_name):
-    system_file = f"{db_name}_system.json"
-    data_file = f"{db_name}_data.json"
-    return os.path.exists(system_file) and os.path.exists(data_file)
+    return db_name in load_catalog()
+
+
+# The catalog lists every database in the directory with its schema, storage format, row count, size on disk and
+# last modification time, so databases can be listed and looked up without scanning the directory. It is kept up to
+# date when databases are created or deleted and whenever their data files are rewritten; `rebuild_catalog` recreates
+# it from the files on disk if it ever drifts (for example after database files were copied in by hand).
+CATALOG_NAME = "_catalog"
+CATALOG_VERSION = 1
+
+# The catalog most recently read by this process, with the (mtime, size) of the file it was read from.
+_catalog_cache = {"stamp": None, "databases": None}
+
+
+# This function returns the path of the catalog file.
+def catalog_path():
+    return f"{CATALOG_NAME}.json"
+
+
+# This function returns the catalog as a dict of database name -> entry. The file is only parsed again when it has
+# changed since it was last read. A missing or corrupted catalog is rebuilt from the files on disk.
+def load_catalog():
+    databases = read_catalog_file()
+    return rebuild_catalog() if databases is None else databases
+
+
+# This function reads the catalog file, or returns the cached copy if the file has not changed since. It returns
+# `None` if the file is missing, corrupted or of another version.
+def read_catalog_file():
+    try:
+        info = os.stat(catalog_path())
+        stamp = (info.st_mtime_ns, info.st_size)
+    except OSError:
+        return None
+    if stamp == _catalog_cache["stamp"]:
+        return _catalog_cache["databases"]
+
+    try:
+        with open(catalog_path(), 'r') as f:
+            catalog = json.load(f)
+    except (IOError, json.JSONDecodeError):
+        print("Warning: the database catalog is corrupted and will be rebuilt.")
+        return None
+    if catalog.get("version") != CATALOG_VERSION:
+        return None
+    _catalog_cache.update(stamp=stamp, databases=catalog["databases"])
+    return catalog["databases"]
+
+
+# This function writes the catalog atomically and remembers it as the cached copy.
+def save_catalog(databases):
+    atomic_write(catalog_path(), lambda f: json.dump({"version": CATALOG_VERSION, "databases": databases}, f,
+                                                     indent=4))
+    info = os.stat(catalog_path())
+    _catalog_cache.update(stamp=(info.st_mtime_ns, info.st_size), databases=databases)
+
+
+# This function returns the total size in bytes and the latest modification time of the files of a database.
+def database_file_stats(db_name):
+    size, modified = 0, 0.0
+    for path in database_file_paths(db_name):
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        size += info.st_size
+        modified = max(modified, info.st_mtime)
+    return size, modified
+
+
+# This function adds or updates the catalog entry of a database. The schema, storage format and row count are only
+# changed when given; the size and modification time are always read from the files.
+#
+# Callers may hold the lock of the database, so the catalog lock is always taken last: a missing catalog is rebuilt
+# (which locks every database in turn) before the catalog lock is taken, never while it is held.
+def update_catalog(db_name, fields=None, storage=None, rows=None):
+    databases = load_catalog()
+    with database_lock(CATALOG_NAME, exclusive=True):
+        databases = dict(read_catalog_file() or databases)
+        entry = dict(databases.get(db_name, {"fields": {}, "storage": "json", "rows": 0}))
+        if fields is not None:
+            entry["fields"] = fields
+        if storage is not None:
+            entry["storage"] = storage
+        if rows is not None:
+            entry["rows"] = rows
+        entry["size"], entry["modified"] = database_file_stats(db_name)
+        databases[db_name] = entry
+        save_catalog(databases)
+
+
+# This function removes a database from the catalog.
+def remove_from_catalog(db_name):
+    databases = load_catalog()
+    with database_lock(CATALOG_NAME, exclusive=True):
+        databases = dict(read_catalog_file() or databases)
+        if databases.pop(db_name, None) is not None:
+            save_catalog(databases)
+
+
+# This function recreates the catalog by scanning the directory for system files and reading every database found.
+# Row counts come from the record store header for binary databases and from a streaming pass over the data file for
+# JSON databases. It returns the new catalog. The databases are read (each under its own lock) before the catalog lock
+# is taken, so the catalog lock is never held while waiting for a database; see `update_catalog`.
+def rebuild_catalog():
+    databases = {}
+    for file in sorted(os.listdir()):
+        if not file.endswith("_system.json"):
+            continue
+        db_name = file[:-len("_system.json")]
+        if not (os.path.exists(f"{db_name}_data.json") or rs.store_exists(db_name) or bs.store_exists(db_name)
+                or cs.store_exists(db_name)):
+            continue
+        try:
+            with open(file, 'r') as f:
+                fields = parse_schema(json.load(f))[0]
+        except (IOError, ValueError, KeyError, AttributeError):
+            print(f"Warning: skipping '{db_name}', its system file is corrupted.")
+            continue
+        rows = sum(1 for _ in iter_records(db_name))
+        size, modified = database_file_stats(db_name)
+        databases[db_name] = {"fields": fields, "storage": database_storage(db_name), "rows": rows, "size": size,
+                              "modified": modified}
+    with database_lock(CATALOG_NAME, exclusive=True):
+        save_catalog(databases)
+    return databases
+
+
+# This function returns the names of all databases in the catalog, in alphabetical order.
+def list_databases():
+    return sorted(load_catalog())
+
+
+# This function reads every record of a database that uses the binary record store.
+# If the store cannot be opened (for example because the system file is missing), it returns an empty list.
+@instr.timed()
+def load_store_records(db_name):
+    fields = load_system_file(db_name)
+    if fields is None:
+        return []
+    store = rs.open_store(db_name, fields)
+    if store is None:
+        return []
+    try:
+        return store.read_all()
+    finally:
+        store.close()
+
+
+# This function replaces every record of a database that uses the binary record store.
+# Single-record changes should go through `record_store.RecordStore` instead, which avoids rewriting the file.
+@instr.timed()
+def save_store_records(db_name, records):
+    fields = load_system_file(db_name)
+    if fields is None:
+        return
+    try:
+        live = [record for record in records if not is_deleted(record)]
+        with database_lock(db_name, exclusive=True):
+            rs.create_store(db_name, fields, live)
+            update_catalog(db_name, rows=len(live))
+        print(f"Records saved successfully to '{db_name}'.")
+    except (IOError, ValueError) as e:
+        print(f"Error saving records to '{rs.data_path(db_name)}': {e}")
+
+
+# This function yields the live records of a database, skipping the first `start` of them, without loading the whole
+# table when it can be avoided: binary databases are read slot by slot and JSON data files are decoded incrementally.
+# Compressed and columnar data files are read from a reader opened on the current file. If the write-ahead log holds
+# changes, the records are loaded with the log replayed instead, so the result always reflects the latest state.
+def iter_records(db_name, start=0):
+    if rs.store_exists(db_name):
+        fields = load_system_file(db_name)
+        store = rs.open_store(db_name, fields) if fields is not None else None
+        if store is None:
+            return
+        try:
+            yield from store.iter_from(start)
+        finally:
+            store.close()
+        return
+
+    if (bs.store_exists(db_name) or cs.store_exists(db_name)) and not os.path.exists(wal.log_path(db_name)):
+        # The file is opened under the lock, so it is complete. It is only ever replaced by a rename, so the open
+        # reader keeps reading the same snapshot after the lock is released, and the lock is not held while the
+        # caller works through the records (which may mean waiting for the user).
+        try:
+            with database_lock(db_name):
+                reader = bs.BlockReader(db_name) if bs.store_exists(db_name) else cs.ColumnReader(db_name)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        with reader:
+            yield from reader.iter_live(start)
+        return
+
+    if os.path.exists(wal.log_path(db_name)):
+        records = iter(load_data_file(db_name))
+    elif os.path.exists(f"{db_name}_data.json"):
+        records = iter_data_file(db_name)
+    else:
+        return
+    previous_id = 0
+    for record in records:
+        record.setdefault("_id", previous_id + 1)  # Same numbering as `assign_ids`
+        previous_id = record["_id"]
+        if is_deleted(record):
+            continue
+        if start > 0:
+            start -= 1
+            continue
+        yield record
+
+
+# The file formats supported by `import_records` and `export_records`, keyed by file extension.
+BULK_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# The number of rows read and validated together during an import.
+IMPORT_BATCH_SIZE = 10000
+
+
+# This function works out the bulk file format from the extension of a path, unless a format is given explicitly.
+def bulk_format(path, file_format=None):
+    file_format = file_format or BULK_FORMATS.get(os.path.splitext(path)[1].lower())
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Cannot tell the format of '{path}'. Use a .csv or .jsonl file.")
+    return file_format
+
+
+# This function reads the rows of a CSV or JSON Lines file one at a time as (line number, row) pairs.
+# Lines of a JSON Lines file that are not valid JSON are yielded as the raw text of the line.
+def read_bulk_rows(f, file_format):
+    if file_format == "csv":
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_number, line.rstrip("\n")
+
+
+# This function validates a batch of rows against the field lengths and types of a database. The checks run field by
+# field over the whole batch rather than row by row. It returns the valid records (holding exactly the schema fields,
+# as strings) and a list of (line number, row, reason) tuples for the rows that were rejected. For binary databases
+# values are also checked in UTF-8 bytes, since that is how they are stored, and for columnar databases typed values
+# must be in canonical form (see `columnar_form`).
+def validate_batch(fields, batch, binary=False, types=None, columnar=False):
+    types = types or {}
+    reasons = [None] * len(batch)
+    for i, (_, row) in enumerate(batch):
+        if isinstance(row, str):
+            reasons[i] = "invalid JSON"
+        elif not isinstance(row, dict):
+            reasons[i] = "row is not an object"
+
+    for field, max_length in fields.items():
+        column = ["" if reason is not None or row.get(field) is None else str(row[field])
+                  for (_, row), reason in zip(batch, reasons)]
+        lengths = [len(value.encode("utf-8")) if binary else len(value) for value in column]
+        for i, (value, length) in enumerate(zip(column, lengths)):
+            if reasons[i] is not None:
+                continue
+            if not value:
+                reasons[i] = f"'{field}' is empty"
+            elif length > max_length:
+                reasons[i] = f"'{field}' exceeds maximum length of {max_length}"
+            elif not is_valid_value(value, types.get(field, "str")):
+                reasons[i] = f"'{field}' is not a valid {types[field]}"
+        if columnar and types.get(field, "str") != "str":
+            checked = [i for i, reason in enumerate(reasons) if reason is None]
+            try:
+                canonical = cs.canonical_values([column[i] for i in checked], types[field])
+            except ValueError as e:  # A value Python accepts but the column does not, or NumPy is missing
+                for i in checked:
+                    reasons[i] = f"'{field}' cannot be stored: {e}"
+            else:
+                for i, text in zip(checked, canonical):
+                    if text != column[i]:
+                        reasons[i] = f"'{field}' must be written as '{text}' in a columnar database"
+
+    valid, rejected = [], []
+    for (line_number, row), reason in zip(batch, reasons):
+        if reason is None:
+            valid.append({field: str(row[field]) for field in fields})
+        else:
+            rejected.append((line_number, row, reason))
+    return valid, rejected
+
+
+# This function imports records from a CSV or JSON Lines file into a database. Rows are validated in batches against
+# the maximum lengths and types in the system file; rows that fail are written to a reject file (JSON Lines with the line number,
+# the row and the reason) instead of aborting the load. All valid rows are committed together with a single write at
+# the end, so importing N rows costs one rewrite rather than N. It returns the number of imported and rejected rows,
+# or `None` if the import failed (the file could not be read, or the records could not be saved).
+@instr.timed()
+def import_records(db_name, path, file_format=None, reject_path=None, batch_size=IMPORT_BATCH_SIZE):
+    fields = load_system_file(db_name)
+    if fields is None:
+        return None
+    types = load_field_types(db_name)
+    try:
+        file_format = bulk_format(path, file_format)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+    reject_path = reject_path or f"{path}.rejects.jsonl"
+    binary = rs.store_exists(db_name)
+    columnar = cs.store_exists(db_name)
+
+    valid, rejected_count = [], 0
+    try:
+        with open(path, 'r', newline='', encoding='utf-8') as f, open(reject_path, 'w') as rejects:
+            rows = read_bulk_rows(f, file_format)
+            while True:
+                batch = []
+                for item in rows:
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        break
+                if not batch:
+                    break
+                batch_valid, batch_rejected = validate_batch(fields, batch, binary, types, columnar)
+                valid.extend(batch_valid)
+                rejected_count += len(batch_rejected)
+                for line_number, row, reason in batch_rejected:
+                    rejects.write(json.dumps({"line": line_number, "reason": reason, "row": row}) + "\n")
+    except (IOError, UnicodeDecodeError, csv.Error) as e:
+        print(f"Error reading '{path}': {e}")
+        return None
+
+    if rejected_count == 0:
+        os.remove(reject_path)
+
+    if valid:
+        with database_lock(db_name, exclusive=True):
+            if binary:
+                store = rs.open_store(db_name, fields)
+                if store is None:
+                    return None
+                try:
+                    store.extend(valid)
+                    update_catalog(db_name, rows=len(store))
+                finally:
+                    store.close()
+            elif not write_data_file(db_name, assign_ids(load_data_file(db_name) + valid)):
+                return None
+    print(f"Imported {len(valid)} record(s) into '{db_name}'; {rejected_count} rejected.")
+    if rejected_count:
+        print(f"Rejected rows were written to '{reject_path}'.")
+    return len(valid), rejected_count
+
+
+# This function exports the records of a database to a CSV or JSON Lines file. Records are streamed from the database
+# to the file, so the table is not held in memory as a whole. With `order_by` (a field name or list of field names),
+# records are written sorted by those fields, using an external merge sort that spills sorted runs to temporary files
+# instead of holding the table in memory. It returns the number of exported records, or `None` if the export failed.
+@instr.timed()
+def export_records(db_name, path, file_format=None, order_by=None, descending=False):
+    fields = load_system_file(db_name)
+    if fields is None:
+        return None
+    try:
+        file_format = bulk_format(path, file_format)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return None
+
+    records = iter_records(db_name)
+    if order_by:
+        records = es.sort_records(records, es.record_key([order_by] if isinstance(order_by, str) else order_by),
+                                  descending)
+    count = 0
+    try:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if file_format == "csv":
+                writer = csv.DictWriter(f, fieldnames=list(fields), extrasaction='ignore')
+                writer.writeheader()
+                for record in records:
+                    writer.writerow(record)
+                    count += 1
+            else:
+                for record in records:
+                    f.write(json.dumps({field: record.get(field, "") for field in fields}) + "\n")
+                    count += 1
+    except IOError as e:
+        print(f"Error writing '{path}': {e}")
+        return None
+    print(f"Exported {count} record(s) from '{db_name}' to '{path}'.")
+    return count
 
 
 # This function loads both the system file (metadata) and data file (records) for a specified database.
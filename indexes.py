@@ -0,0 +1,163 @@
+# Importing necessary modules for secondary indexes.
+# The `bisect` module keeps sorted indexes ordered and answers range lookups with binary search.
+# The `json` module is used to persist index definitions and contents next to the data file.
+# The `math` module tells finite numbers from the infinities and NaN that `float` also accepts.
+# The `os` module is used to check for and remove the index file.
+# The `instrumentation` module times loading and saving the indexes when profiling is on.
+import bisect
+import json
+import math
+import os
+import instrumentation as instr
+
+# The two kinds of index that can be created on a field: a hash index answers equality lookups, a sorted index
+# answers both equality and range lookups.
+INDEX_KINDS = ("hash", "sorted")
+
+
+# This function returns the path of the file that stores the indexes of a database.
+def index_path(db_name):
+    return f"{db_name}_indexes.json"
+
+
+# This function turns a field value into a key that can be ordered. All values are stored as strings, so numeric
+# values are compared as numbers (making "9" < "10") and sorted before non-numeric values, which compare as text.
+# Only finite numbers count as numeric: `float` also reads words such as "nan" and "inf", which are text here.
+def sort_key(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+    if not math.isfinite(number):
+        return (1, 0.0, str(value))
+    return (0, number, "")
+
+
+# The HashIndex class maps each distinct value of a field to the IDs of the records holding it.
+class HashIndex:
+    kind = "hash"
+
+    def __init__(self, field, entries=None):
+        self.field = field
+        self.entries = {value: set(record_ids) for value, record_ids in (entries or {}).items()}
+
+    def build(self, records):
+        self.entries = {}
+        for record in records:
+            self.add(record["_id"], record)
+
+    def add(self, record_id, record):
+        self.entries.setdefault(str(record.get(self.field, "")), set()).add(record_id)
+
+    def remove(self, record_id, record):
+        value = str(record.get(self.field, ""))
+        record_ids = self.entries.get(value)
+        if record_ids is not None:
+            record_ids.discard(record_id)
+            if not record_ids:
+                del self.entries[value]
+
+    def lookup(self, value):
+        return sorted(self.entries.get(str(value), ()))
+
+    def to_json(self):
+        return {"kind": self.kind, "entries": {value: sorted(record_ids) for value, record_ids in self.entries.items()}}
+
+
+# The SortedIndex class keeps (key, record ID) pairs of a field ordered by `sort_key`, so equality and range lookups
+# are a binary search followed by a slice.
+class SortedIndex:
+    kind = "sorted"
+
+    def __init__(self, field, entries=None):
+        self.field = field
+        self.entries = entries or []  # [[value, record_id], ...] ordered by sort_key(value) then record_id
+        self._keys = [(sort_key(value), record_id) for value, record_id in self.entries]
+
+    def build(self, records):
+        pairs = sorted(((sort_key(record.get(self.field, "")), record["_id"], str(record.get(self.field, "")))
+                        for record in records))
+        self._keys = [(key, record_id) for key, record_id, _ in pairs]
+        self.entries = [[value, record_id] for _, record_id, value in pairs]
+
+    def add(self, record_id, record):
+        value = str(record.get(self.field, ""))
+        item = (sort_key(value), record_id)
+        at = bisect.bisect_left(self._keys, item)
+        self._keys.insert(at, item)
+        self.entries.insert(at, [value, record_id])
+
+    def remove(self, record_id, record):
+        item = (sort_key(record.get(self.field, "")), record_id)
+        at = bisect.bisect_left(self._keys, item)
+        if at < len(self._keys) and self._keys[at] == item:
+            del self._keys[at]
+            del self.entries[at]
+
+    def lookup(self, value):
+        return self.range(value, value)
+
+    # Returns the IDs of records whose value lies between `low` and `high` (both inclusive).
+    # Either bound may be `None` to leave that side of the range open.
+    def range(self, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(self._keys, (sort_key(low), -1))
+        end = len(self._keys) if high is None else bisect.bisect_right(self._keys, (sort_key(high), float("inf")))
+        return sorted(record_id for _, record_id in self._keys[start:end])
+
+    def to_json(self):
+        return {"kind": self.kind, "entries": self.entries}
+
+
+# This function creates an empty index of the given kind for a field.
+def new_index(field, kind):
+    if kind == "sorted":
+        return SortedIndex(field)
+    return HashIndex(field)
+
+
+# This function loads the indexes of a database. Indexes are only trusted if they were saved for the same version of
+# the data files (`stamp`); otherwise their definitions are kept and their contents rebuilt from `records`, which is
+# a function returning the current records so that the table is only read when a rebuild is needed.
+# It returns the indexes and whether they could be used as saved.
+@instr.timed()
+def load_indexes(db_name, stamp, records):
+    if not os.path.exists(index_path(db_name)):
+        return {}, True
+    try:
+        with open(index_path(db_name), 'r') as f:
+            saved = json.load(f)
+    except json.JSONDecodeError:
+        print(f"Warning: index file for '{db_name}' is corrupted and will be rebuilt.")
+        saved = {"stamp": None, "indexes": {}}
+
+    indexes = {}
+    fresh = saved.get("stamp") == json.loads(json.dumps(stamp))
+    rows = None
+    for field, data in saved.get("indexes", {}).items():
+        if fresh:
+            index = (SortedIndex if data["kind"] == "sorted" else HashIndex)(field, data["entries"])
+        else:
+            if rows is None:
+                rows = records()
+            index = new_index(field, data["kind"])
+            index.build(rows)
+        indexes[field] = index
+    return indexes, fresh
+
+
+# This function saves the indexes of a database together with the stamp of the data files they describe.
+# The file is removed once the last index is dropped. It is written to a temporary file first and renamed into place,
+# so another session loading the indexes at the same time never sees a partial file.
+@instr.timed()
+def save_indexes(db_name, indexes, stamp):
+    if not indexes:
+        if os.path.exists(index_path(db_name)):
+            os.remove(index_path(db_name))
+        return
+    temp_file = index_path(db_name) + ".tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            json.dump({"stamp": stamp, "indexes": {field: index.to_json() for field, index in indexes.items()}}, f)
+        os.replace(temp_file, index_path(db_name))
+    except IOError as e:
+        print(f"Error saving indexes for '{db_name}': {e}")
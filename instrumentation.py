@@ -0,0 +1,140 @@
+# Importing necessary modules for the instrumentation layer.
+# The `atexit` module prints the summary (and writes the profile) when the program ends.
+# The `collections` module provides the counters and timer tables.
+# The `cProfile` module records a full profile that can be read with `pstats` or any tool that understands its format.
+# The `functools` module keeps the name and docstring of instrumented functions.
+# The `os` and `sys` modules read the environment variable that switches instrumentation on and print the summary.
+# The `time` module measures how long instrumented functions take.
+import atexit
+import collections
+import cProfile
+import functools
+import os
+import sys
+import time
+
+# Setting this environment variable switches instrumentation on for any program using the database modules. Its value
+# is either "1" (print a summary on exit) or the path of a file to write a cProfile profile to as well.
+ENV_VAR = "SIMPLE_DBMS_PROFILE"
+
+# Instrumentation is off unless enabled; every hook then returns after a single check of this flag.
+ENABLED = False
+
+# Per-function timers: name -> [calls, total seconds, slowest call in seconds].
+timers = collections.defaultdict(lambda: [0, 0.0, 0.0])
+# Named counters, such as bytes read and written, records scanned, and cache hits and misses.
+counters = collections.Counter()
+
+_profiler = None
+_profile_path = None
+
+
+# This function switches instrumentation on. With a `profile_path`, a cProfile profile of everything that runs from
+# now on is written to that file on exit. A summary of the timers and counters is printed on exit either way.
+def enable(profile_path=None):
+    global ENABLED, _profiler, _profile_path
+    if ENABLED:
+        return
+    ENABLED = True
+    if profile_path:
+        _profile_path = profile_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(finish)
+
+
+# This function switches instrumentation off again: the profiler is stopped without writing its profile, and no
+# summary is printed on exit. The worker processes of parallel scans call it, since they inherit the environment
+# variable of the process that started them; what they scan is counted by that process instead.
+def disable():
+    global ENABLED, _profiler, _profile_path
+    if not ENABLED:
+        return
+    ENABLED = False
+    if _profiler is not None:
+        _profiler.disable()
+    _profiler = _profile_path = None
+    atexit.unregister(finish)
+
+
+# This decorator times every call of a function while instrumentation is on. Timers are named after the module and
+# function unless a name is given.
+def timed(name=None):
+    def decorate(func):
+        timer_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                timer = timers[timer_name]
+                timer[0] += 1
+                timer[1] += elapsed
+                if elapsed > timer[2]:
+                    timer[2] = elapsed
+        return wrapper
+    return decorate
+
+
+# This function adds to a named counter while instrumentation is on.
+def count(name, amount=1):
+    if ENABLED:
+        counters[name] += amount
+
+
+# This function counts the items of an iterable under a counter as they are consumed. When instrumentation is off the
+# iterable is returned as it is, so loops over it pay nothing.
+def counted(name, iterable):
+    if not ENABLED:
+        return iterable
+    return _counting(name, iterable)
+
+
+def _counting(name, iterable):
+    for item in iterable:
+        counters[name] += 1
+        yield item
+
+
+# This function returns the collected timers and counters as a dict that can be serialized to JSON.
+def summary():
+    return {
+        "timers": {name: {"calls": calls, "total_ms": round(total * 1000, 3),
+                          "mean_ms": round(total / calls * 1000, 3) if calls else 0.0,
+                          "max_ms": round(slowest * 1000, 3)}
+                   for name, (calls, total, slowest) in timers.items()},
+        "counters": dict(counters),
+    }
+
+
+# This function prints the timers, slowest total first, followed by the counters.
+def print_summary(file=None):
+    file = file or sys.stderr
+    data = summary()
+    print("\nProfile summary", file=file)
+    if data["timers"]:
+        width = max(len(name) for name in data["timers"])
+        print(f"{'Function'.ljust(width)}  {'Calls':>8}  {'Total ms':>12}  {'Mean ms':>10}  {'Max ms':>10}", file=file)
+        for name, timer in sorted(data["timers"].items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"{name.ljust(width)}  {timer['calls']:>8}  {timer['total_ms']:>12.3f}  {timer['mean_ms']:>10.3f}  "
+                  f"{timer['max_ms']:>10.3f}", file=file)
+    for name, value in sorted(data["counters"].items()):
+        print(f"{name}: {value}", file=file)
+
+
+# This function runs on exit: it stops the profiler and writes its profile, then prints the summary.
+def finish():
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
+        print(f"Profile written to '{_profile_path}' (open it with `python -m pstats`).", file=sys.stderr)
+    print_summary()
+
+
+if os.environ.get(ENV_VAR):
+    enable(None if os.environ[ENV_VAR] == "1" else os.environ[ENV_VAR])
@@ -0,0 +1,205 @@
+# Importing necessary modules for parallel full-table scans.
+# The `concurrent.futures` and `multiprocessing` modules run the segments of a scan in a pool of worker processes.
+# The `itertools` module passes the same function to every segment.
+# The `json` module decodes the records of a segment of a JSON data file.
+# The `os` module tells how many CPUs there are and checks which files a database has.
+# The `file_manager`, `record_store`, `block_store` and `column_store` modules read the records of every storage
+# format.
+# The `write_ahead_log` module tells whether the data files are missing changes that only the log holds.
+# The `instrumentation` module is switched off in the worker processes, and counts the records they scanned in the
+# process that started them.
+import concurrent.futures
+import itertools
+import json
+import multiprocessing
+import os
+import block_store as bs
+import column_store as cs
+import file_manager as fm
+import instrumentation as instr
+import record_store as rs
+import write_ahead_log as wal
+
+# A full scan is split into segments of about this many stored records, and each segment is read and processed by a
+# worker process. A table needs at least two segments to be scanned in parallel; smaller tables are scanned in the
+# calling process, since starting work in other processes would cost more than it saves.
+SEGMENT_ROWS = 50000
+
+# The number of worker processes: one per CPU this process may run on. With a single CPU, scans are not split.
+MAX_WORKERS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+# JSON data files are written with `indent=4`, so every record starts on a new line indented by four spaces. A JSON
+# string cannot hold a raw line break, so this marker only ever appears at the start of a record, which lets a data
+# file be cut into segments without parsing it. Files laid out differently are scanned in one piece.
+JSON_RECORD_START = b"\n    {"
+
+# The number of bytes read from the start of a JSON data file to estimate how many records it holds.
+JSON_SAMPLE_BYTES = 64 * 1024
+
+# The pool of worker processes, started on first use and shared by every scan of this process.
+_executor = None
+
+
+# This function returns the pool of worker processes. Workers are started with "spawn", so they do not inherit the
+# locks and threads (compaction, the server's event loop) of the process that starts them. Instrumentation is switched
+# off in them, so that they neither print their own summaries nor overwrite the profile of this process.
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ProcessPoolExecutor(MAX_WORKERS, multiprocessing.get_context("spawn"),
+                                                           initializer=instr.disable)
+    return _executor
+
+
+# This function shuts the pool of worker processes down, if it was started.
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+# This function splits the data file of a database into segments. A segment is a (format, source, fields, start,
+# stop) tuple that a worker process can read on its own: a range of slots of a binary record store, a range of
+# positions in a compressed (aligned with its blocks) or columnar data file, or a range of bytes of a JSON data file
+# (aligned with its records). It returns `None` if the data file cannot be split, including when the write-ahead log
+# holds changes that the data file alone is missing. Sources are absolute paths, since the worker processes keep the
+# working directory they were started in.
+def plan_segments(db_name, segment_rows=SEGMENT_ROWS):
+    if os.path.exists(wal.log_path(db_name)):
+        return None
+    source = os.path.abspath(db_name)
+    try:
+        if rs.store_exists(db_name):
+            fields = fm.load_system_file(db_name)
+            store = rs.open_store(db_name, fields) if fields is not None else None
+            if store is None:
+                return None
+            try:
+                count = store.slot_count
+            finally:
+                store.close()
+            return [("binary", source, fields, start, min(start + segment_rows, count))
+                    for start in range(0, count, segment_rows)]
+        if bs.store_exists(db_name):
+            with bs.BlockReader(db_name) as reader:
+                segments, start, position = [], 0, 0
+                for block in reader.blocks:
+                    position += block[2]
+                    if position - start >= segment_rows:
+                        segments.append(("zdb", source, None, start, position))
+                        start = position
+                if position > start:
+                    segments.append(("zdb", source, None, start, position))
+                return segments
+        if cs.store_exists(db_name):
+            with cs.ColumnReader(db_name) as reader:
+                return [("columnar", source, None, start, min(start + segment_rows, reader.count))
+                        for start in range(0, reader.count, segment_rows)]
+        return json_segments(source, segment_rows)
+    except (IOError, ValueError):
+        return None
+
+
+# This function splits a JSON data file into byte ranges of about `segment_rows` records each. The number of records
+# is estimated from the start of the file, and each cut is moved forward to the start of the next record.
+def json_segments(db_name, segment_rows=SEGMENT_ROWS):
+    path = f"{db_name}_data.json"
+    if not os.path.exists(path):
+        return None
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        sample = f.read(JSON_SAMPLE_BYTES)
+        if not sample.startswith(b"[" + JSON_RECORD_START) or b'"_id"' not in sample:
+            return None  # Laid out differently, or written before records had IDs
+        estimated_rows = size * sample.count(JSON_RECORD_START) // len(sample)
+        parts = max(1, -(-estimated_rows // segment_rows))
+        cuts = [1]  # Just after the opening bracket
+        for part in range(1, parts):
+            cut = next_record_start(f, size * part // parts)
+            if cut is None:
+                break
+            if cut > cuts[-1]:
+                cuts.append(cut)
+    cuts.append(size)
+    return [("json", path, None, start, stop) for start, stop in zip(cuts, cuts[1:])]
+
+
+# This function returns the offset of the first record that starts at or after `offset` in a JSON data file, or
+# `None` if there is none.
+def next_record_start(f, offset):
+    f.seek(offset)
+    carry = b""
+    while True:
+        chunk = f.read(JSON_SAMPLE_BYTES)
+        if not chunk:
+            return None
+        data = carry + chunk
+        found = data.find(JSON_RECORD_START)
+        if found >= 0:
+            return offset - len(carry) + found
+        carry = data[-(len(JSON_RECORD_START) - 1):]
+        offset += len(chunk)
+
+
+# This function reads the live records of a segment (see `plan_segments`). Records of a JSON data file must carry
+# their `_id`; files written before IDs existed number their records by position, which a segment cannot know, so
+# they raise `ValueError` and are scanned in one piece instead.
+def read_segment(segment):
+    kind, source, fields, start, stop = segment
+    if kind == "binary":
+        store = rs.RecordStore(source, fields)
+        try:
+            return list(store.iter_slots(start, stop))
+        finally:
+            store.close()
+    if kind == "zdb":
+        with bs.BlockReader(source) as reader:
+            return [record for record in reader.iter_from(start, stop) if not fm.is_deleted(record)]
+    if kind == "columnar":
+        with cs.ColumnReader(source) as reader:
+            return reader.live_records_between(start, stop)
+
+    with open(source, 'rb') as f:
+        f.seek(start)
+        text = f.read(stop - start).decode("utf-8").strip()
+    records = json.loads("[" + text.lstrip("[").rstrip("]").strip().rstrip(",") + "]")
+    if any("_id" not in record for record in records):
+        raise ValueError(f"'{source}' has records without IDs.")
+    return [record for record in records if not fm.is_deleted(record)]
+
+
+# This function runs in a worker process: it reads one segment and returns the number of live records it holds and
+# what `function` makes of them.
+def run_segment(segment, function):
+    records = read_segment(segment)
+    return len(records), function(records)
+
+
+# This function scans a database in parallel. The data file is split into segments, each worker process reads one
+# segment at a time and calls `function` with the list of its live records, and the results are returned in the order
+# of the segments, ready to be merged by the caller. The records the workers read are counted here as "records
+# scanned", like those of a scan in this process. `function` must be picklable, so it has to be a module-level
+# function (or a `functools.partial` of one). The database is locked for reading throughout, so no writer replaces
+# the data file while the workers read it.
+#
+# It returns `None` when the database should be scanned in the calling process instead: when there is only one CPU,
+# when the table is too small to be worth splitting, when the write-ahead log holds changes, or when the data file
+# cannot be read in segments.
+def map_segments(db_name, function, segment_rows=SEGMENT_ROWS):
+    if MAX_WORKERS < 2:
+        return None
+    with fm.database_lock(db_name):
+        segments = plan_segments(db_name, segment_rows)
+        if segments is None or len(segments) < 2:
+            return None
+        try:
+            outcomes = list(get_executor().map(run_segment, segments, itertools.repeat(function)))
+            instr.count("records scanned", sum(scanned for scanned, _ in outcomes))
+            return [result for _, result in outcomes]
+        except concurrent.futures.process.BrokenProcessPool as e:
+            shutdown()  # A worker died; the next scan starts a new pool
+            print(f"Warning: parallel scan of '{db_name}' failed ({e}); scanning it in one piece.")
+        except (IOError, ValueError) as e:
+            print(f"Warning: parallel scan of '{db_name}' failed ({e}); scanning it in one piece.")
+        return None
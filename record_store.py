@@ -0,0 +1,324 @@
+# Importing necessary modules for the fixed-width binary record store.
+# The `mmap` module maps the `.dat` file into memory so that a single record can be read or written by seeking directly
+# to its slot, without parsing or rewriting the rest of the table.
+# The `struct` module packs the small file header that describes the layout of the slots.
+# The `os` module is used for file system operations such as checking for file existence and resizing files.
+import mmap
+import os
+import struct
+
+# Every `.dat` file starts with a fixed-size header: a magic marker, the format version, the size of one record slot,
+# the number of slots in use, how many of those hold deleted records, and the ID the next record will get.
+# Record slots follow the header back to back.
+MAGIC = b"SDBF"
+VERSION = 2
+HEADER = struct.Struct("<4sHHIQQQ")
+HEADER_SIZE = 64
+
+# The first byte of every slot tells whether the slot holds a record, followed by the stable ID of the record. The
+# remaining bytes are the fields of the record laid out in the order of the system file, each padded with zero bytes
+# up to its maximum length. Deleted records keep their slot (and ID) as a tombstone until the store is compacted.
+SLOT_EMPTY = 0
+SLOT_LIVE = 1
+SLOT_DEAD = 2
+SLOT_ID = struct.Struct("<Q")
+SLOT_PREFIX = 1 + SLOT_ID.size
+
+# The number of slots added to the file whenever it runs out of room. Growing in chunks keeps appends from resizing
+# and remapping the file on every single insert.
+GROW_SLOTS = 1024
+
+
+# This function returns the path of the binary data file for a database.
+def data_path(db_name):
+    return f"{db_name}_data.dat"
+
+
+# This function checks whether a database uses the binary record store, which is the case when its `.dat` file exists.
+def store_exists(db_name):
+    return os.path.exists(data_path(db_name))
+
+
+# This function computes the slot layout for a set of fields. It returns a list of (field, offset, width) entries and
+# the total size of one slot in bytes. Field widths come straight from the maximum lengths in the system file.
+def slot_layout(fields):
+    layout = []
+    offset = SLOT_PREFIX  # Skip the status byte and record ID at the start of the slot
+    for field, max_length in fields.items():
+        layout.append((field, offset, max_length))
+        offset += max_length
+    return layout, offset
+
+
+# This function creates a new binary data file for a database and optionally fills it with existing records.
+# Records that already carry an `_id` keep it. Any previous `.dat` file for the database is replaced atomically: the
+# new file is built next to it and renamed over it, so sessions that have the old file mapped are not cut short.
+def create_store(db_name, fields, records=()):
+    _, slot_size = slot_layout(fields)
+    temp_file = data_path(db_name) + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, slot_size, 0, 0, 1).ljust(HEADER_SIZE, b"\0"))
+    store = RecordStore(db_name, fields, temp_file)
+    try:
+        store.extend(records)
+        store.sync()
+    finally:
+        store.close()
+    os.replace(temp_file, data_path(db_name))
+
+
+# The RecordStore class gives O(1) access to the records of a binary data file. The file is memory-mapped, so reading,
+# editing or deleting a record only touches the bytes of its slot. Records are addressed by their stable ID, which is
+# stored in the slot; IDs only ever grow, so the slots are ordered by ID and a record is found by binary search.
+# Deleting a record marks its slot as a tombstone; `compact` later reclaims the space of deleted records.
+#
+# Several processes may map the same file. The file is only ever grown in place, never shrunk (compaction writes a new
+# file and renames it over the old one), so a mapping never points past the end of its file; a handle notices that
+# another process grew the file when the record count in the header outgrows its mapping, and remaps it.
+#
+# Iterators read from the mapping that was current when they started. A mapping replaced by a remap or by compaction
+# is therefore never closed explicitly; it is released once the last iterator using it is done, so a scan that is
+# running while the store is compacted finishes over the records as they were before.
+class RecordStore:
+    def __init__(self, db_name, fields, path=None):
+        self.db_name = db_name
+        self.path = path or data_path(db_name)
+        self.layout, self.slot_size = slot_layout(fields)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+        magic, version, _, slot_size, _, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"'{self.path}' is not a valid record store.")
+        if slot_size != self.slot_size:
+            self.close()
+            raise ValueError(f"'{self.path}' does not match the field lengths in the system file.")
+
+    # The number of live records. The counters are always read from the header rather than cached, so records
+    # changed through another handle on the same file are seen straight away.
+    def __len__(self):
+        _, _, _, _, count, dead, _ = HEADER.unpack_from(self._map, 0)
+        return count - dead
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    # The number of used slots. If another process appended records beyond the end of this mapping, the file is
+    # remapped first so that every used slot can be read.
+    @property
+    def _count(self):
+        count = HEADER.unpack_from(self._map, 0)[4]
+        if count > self._capacity():
+            self._remap()
+        return count
+
+    @property
+    def dead_count(self):
+        return HEADER.unpack_from(self._map, 0)[5]
+
+    def _set_counters(self, count=None, dead=None, next_id=None):
+        magic, version, reserved, slot_size, old_count, old_dead, old_next_id = HEADER.unpack_from(self._map, 0)
+        HEADER.pack_into(self._map, 0, magic, version, reserved, slot_size,
+                         old_count if count is None else count,
+                         old_dead if dead is None else dead,
+                         old_next_id if next_id is None else next_id)
+
+    # Returns the byte offset of a slot inside the file.
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * self.slot_size
+
+    # Number of slots the file currently has room for, used or not.
+    def _capacity(self):
+        return (len(self._map) - HEADER_SIZE) // self.slot_size
+
+    def _slot_id(self, slot):
+        return SLOT_ID.unpack_from(self._map, self._offset(slot) + 1)[0]
+
+    def _slot_status(self, slot):
+        return self._map[self._offset(slot)]
+
+    # Maps the file again at its current size.
+    def _remap(self):
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    # Grows the file so that it has room for at least `needed` slots and remaps it. The current size is taken from
+    # the file itself, since another process may have grown it already.
+    def _grow(self, needed):
+        self._remap()
+        if needed <= self._capacity():
+            return
+        new_capacity = max(needed, self._capacity() + GROW_SLOTS)
+        self._file.truncate(HEADER_SIZE + new_capacity * self.slot_size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    # Finds the slot of a live record by binary search over the IDs stored in the slots.
+    def _find(self, record_id):
+        count = self._count
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._slot_id(middle) < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count and self._slot_id(low) == record_id and self._slot_status(low) == SLOT_LIVE:
+            return low
+        raise KeyError(f"Record {record_id} does not exist.")
+
+    # Checks that every value of a record fits in its field once encoded, raising `ValueError` if one does not. Values
+    # are stored as UTF-8, so a value with non-ASCII characters may need more bytes than characters.
+    def check_record(self, record):
+        for field, _, width in self.layout:
+            if len(str(record.get(field, "")).encode("utf-8")) > width:
+                raise ValueError(f"Value for '{field}' exceeds maximum length of {width} bytes.")
+
+    # Encodes a record into the bytes of one slot. Values that do not fit in the field width are rejected (see
+    # `check_record`).
+    def _encode(self, record, record_id):
+        self.check_record(record)
+        slot = bytearray(self.slot_size)
+        slot[0] = SLOT_LIVE
+        SLOT_ID.pack_into(slot, 1, record_id)
+        for field, offset, width in self.layout:
+            value = str(record.get(field, "")).encode("utf-8")
+            slot[offset:offset + len(value)] = value
+        return slot
+
+    def _decode(self, slot):
+        record = {"_id": SLOT_ID.unpack_from(slot, 1)[0]}
+        for field, offset, width in self.layout:
+            record[field] = bytes(slot[offset:offset + width]).rstrip(b"\0").decode("utf-8")
+        return record
+
+    def __contains__(self, record_id):
+        try:
+            self._find(record_id)
+            return True
+        except KeyError:
+            return False
+
+    def read(self, record_id):
+        start = self._offset(self._find(record_id))
+        return self._decode(self._map[start:start + self.slot_size])
+
+    def write(self, record_id, record):
+        start = self._offset(self._find(record_id))
+        self._map[start:start + self.slot_size] = self._encode(record, record_id)
+
+    # Appends a record and returns the ID it was given.
+    def append(self, record):
+        return self.extend([record])[0]
+
+    # Appends many records at once and returns their IDs. The file is grown a single time and the header is updated
+    # once at the end, which makes bulk loads much cheaper than calling `append` for every record. A record that
+    # already carries an `_id` keeps it as long as IDs stay increasing.
+    def extend(self, records):
+        next_id = HEADER.unpack_from(self._map, 0)[6]
+        slots, record_ids = [], []
+        for record in records:
+            record_id = record.get("_id") or next_id
+            if record_id < next_id:
+                raise ValueError(f"Record ID {record_id} is lower than the next free ID {next_id}.")
+            slots.append(self._encode(record, record_id))
+            record_ids.append(record_id)
+            next_id = record_id + 1
+
+        count = self._count
+        if count + len(slots) > self._capacity():
+            self._grow(count + len(slots))
+        start = self._offset(count)
+        self._map[start:start + len(slots) * self.slot_size] = b"".join(slots)
+        self._set_counters(count=count + len(slots), next_id=next_id)
+        return record_ids
+
+    # Deletes a record by turning its slot into a tombstone. Nothing else in the file moves, so the cost is a binary
+    # search and a one-byte write, and the IDs of all other records stay valid.
+    def delete(self, record_id):
+        slot = self._find(record_id)
+        self._map[self._offset(slot)] = SLOT_DEAD
+        self._set_counters(dead=self.dead_count + 1)
+
+    # The number of used slots, tombstones included.
+    @property
+    def slot_count(self):
+        return self._count
+
+    # Yields the live records, skipping the first `start` of them, decoding the slots straight from the mapping.
+    def iter_from(self, start):
+        count = self._count
+        mapping = self._map
+        for slot in range(count):
+            offset = self._offset(slot)
+            if mapping[offset] != SLOT_LIVE:
+                continue
+            if start > 0:
+                start -= 1
+                continue
+            yield self._decode(mapping[offset:offset + self.slot_size])
+
+    # Yields the live records held in the slots from `start` up to (not including) `stop`.
+    def iter_slots(self, start, stop):
+        count = self._count
+        mapping = self._map
+        for slot in range(start, min(stop, count)):
+            offset = self._offset(slot)
+            if mapping[offset] == SLOT_LIVE:
+                yield self._decode(mapping[offset:offset + self.slot_size])
+
+    def read_all(self):
+        return list(self)
+
+    # The share of used slots that hold deleted records.
+    def dead_ratio(self):
+        count = self._count
+        return self.dead_count / count if count else 0.0
+
+    # Reclaims the space of deleted records by copying the live slots, in order, into a new file that replaces the
+    # old one. Record IDs are stored in the slots, so they are unaffected. Other processes, and iterators that are
+    # already running, keep reading the old file until they reopen the store or finish.
+    def compact(self):
+        temp_file = self.path + ".tmp"
+        magic, version, reserved, slot_size, _, _, next_id = HEADER.unpack_from(self._map, 0)
+        live = 0
+        with open(temp_file, 'wb') as f:
+            f.seek(HEADER_SIZE)
+            for slot in range(self._count):
+                if self._slot_status(slot) == SLOT_LIVE:
+                    offset = self._offset(slot)
+                    f.write(self._map[offset:offset + self.slot_size])
+                    live += 1
+            f.seek(0)
+            f.write(HEADER.pack(magic, version, reserved, slot_size, live, 0, next_id).ljust(HEADER_SIZE, b"\0"))
+            f.flush()
+            os.fsync(f.fileno())
+        self._map.flush()
+        self._file.close()
+        os.replace(temp_file, self.path)
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def flush(self):
+        self._map.flush()
+
+    # Flushes the mapping and makes sure the file has reached the disk.
+    def sync(self):
+        self._map.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._map is not None and not self._map.closed:
+            self._map.flush()
+            self._map.close()
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+
+# This function opens the binary record store of a database using the field definitions from its system file.
+# It returns `None` and notifies the user if the store cannot be opened.
+def open_store(db_name, fields):
+    try:
+        return RecordStore(db_name, fields)
+    except (IOError, ValueError) as e:
+        print(f"Error opening record store for '{db_name}': {e}")
+        return None
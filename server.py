@@ -0,0 +1,211 @@
+# Importing necessary modules for the database server.
+# The `asyncio` module serves many client connections from a single thread.
+# The `argparse` module reads the address to listen on from the command line.
+# The `concurrent.futures` module provides the worker thread that runs the database operations, so that the event loop
+# keeps serving clients while records are read and written.
+# The `contextlib`, `json`, `signal` and `sys` modules handle the protocol, shutdown and logging.
+# The `database_operations` module runs the commands sent by clients, and `file_manager` lists the databases.
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import signal
+import sys
+import database_operations as db_ops
+import file_manager as fm
+from database import Database
+
+# The address the server listens on unless told otherwise.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# The most write commands committed together in one batch.
+MAX_BATCH = 1000
+
+# The longest request line accepted from a client, in bytes.
+MAX_LINE = 16 * 1024 * 1024
+
+
+# The DatabaseServer class keeps databases open in memory and serves them to many clients over a line-delimited JSON
+# protocol. Each request is one JSON object on one line, with the database it applies to, an "op" and the arguments of
+# the operation (see `database_operations.execute_command`), plus an optional "request_id" that is echoed in the
+# response:
+#   {"request_id": 1, "db": "students", "op": "add", "record": {"fname": "Ali", ...}}
+# Responses are one JSON object per line as well, with "ok" and either the "result" of the operation or an "error":
+#   {"request_id": 1, "ok": true, "result": {"id": 42}}
+# A client may send several requests without waiting; responses can then arrive out of order and are matched by
+# "request_id".
+# The "list" op (without a database) returns the database catalog.
+#
+# All database work runs on one worker thread, so every client shares the same warm records and indexes. Writes are
+# coalesced: while one batch of writes is being committed, writes arriving from any client queue up and are then
+# committed together, with one sync for the whole group (see `Database.batch`). Transactions ("transaction" requests)
+# are queued with the other writes, so the transactions of many clients are made durable with one sync as well.
+class DatabaseServer:
+    def __init__(self, max_batch=MAX_BATCH):
+        self.max_batch = max_batch
+        self.databases = {}
+        self._worker = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self._write_queues = {}  # Database name -> [(command, future), ...] waiting to be committed
+        self._writers = {}  # Database name -> task committing its queue
+
+    # Returns the open database of the given name, opening it on first use. Runs on the worker thread.
+    def _open(self, db_name):
+        database = self.databases.get(db_name)
+        if database is None:
+            if not fm.database_exists(db_name):
+                raise ValueError(f"database {db_name!r} does not exist")
+            database = self.databases[db_name] = Database(db_name)
+        return database
+
+    # Runs one command and returns its result. Runs on the worker thread.
+    def _execute(self, db_name, command):
+        if command.get("op") == "list":
+            return {"databases": fm.load_catalog()}
+        return db_ops.execute_command(self._open(db_name), command)
+
+    # Runs a group of write commands inside one batch and returns an (ok, result or error) pair for each of them. If
+    # the batch cannot be committed, every command that succeeded is reported as failed. Runs on the worker thread.
+    def _execute_batch(self, db_name, commands):
+        try:
+            database = self._open(db_name)
+        except ValueError as e:
+            return [(False, str(e))] * len(commands)
+        outcomes = []
+        try:
+            with database.batch():
+                for command in commands:
+                    try:
+                        outcomes.append((True, db_ops.execute_command(database, command)))
+                    except Exception as e:  # A failed command must not take the rest of the batch down with it
+                        outcomes.append((False, str(e)))
+        except ValueError as e:  # The batch could not be committed, so none of its changes were made
+            error = f"the batch could not be committed: {e}"
+            outcomes = [(False, error) if ok else (ok, result) for ok, result in outcomes]
+        return outcomes
+
+    # Runs a request from a client and returns the response.
+    async def handle_request(self, request):
+        loop = asyncio.get_running_loop()
+        db_name = request.get("db")
+        if request.get("op") in db_ops.WRITE_OPERATIONS:
+            future = loop.create_future()
+            self._write_queues.setdefault(db_name, []).append((request, future))
+            if db_name not in self._writers:
+                self._writers[db_name] = asyncio.ensure_future(self._commit_writes(db_name))
+            ok, result = await future
+        else:
+            try:
+                ok, result = True, await loop.run_in_executor(self._worker, self._execute, db_name, request)
+            except Exception as e:  # Every request gets a response, whatever went wrong
+                ok, result = False, str(e)
+        return {"request_id": request.get("request_id"), "ok": ok, "result" if ok else "error": result}
+
+    # Commits the queued writes of a database, a batch at a time, until the queue is empty.
+    async def _commit_writes(self, db_name):
+        loop = asyncio.get_running_loop()
+        queue = self._write_queues[db_name]
+        try:
+            while queue:
+                group = queue[:self.max_batch]
+                del queue[:self.max_batch]
+                try:
+                    outcomes = await loop.run_in_executor(self._worker, self._execute_batch, db_name,
+                                                          [command for command, _ in group])
+                except Exception as e:
+                    outcomes = [(False, f"batch failed: {e}")] * len(group)
+                for (_, future), outcome in zip(group, outcomes):
+                    if not future.done():
+                        future.set_result(outcome)
+        finally:
+            del self._writers[db_name]
+
+    # Serves one client connection until it closes.
+    async def handle_client(self, reader, writer):
+        pending = set()
+
+        async def respond(request):
+            response = await self.handle_request(request)
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    writer.write(b'{"request_id": null, "ok": false, "error": "request line too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    response = {"request_id": None, "ok": False, "error": str(e)}
+                    writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                    continue
+                task = asyncio.ensure_future(respond(request))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # Flushes and closes every open database. Runs on the worker thread.
+    def _close_all(self):
+        for database in self.databases.values():
+            database.close()
+        self.databases.clear()
+
+    async def close(self):
+        for task in list(self._writers.values()):
+            await task
+        await asyncio.get_running_loop().run_in_executor(self._worker, self._close_all)
+        self._worker.shutdown()
+
+
+# This function runs the server until it is interrupted. It listens on a Unix socket if `unix_path` is given and on
+# TCP otherwise.
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None, max_batch=MAX_BATCH):
+    database_server = DatabaseServer(max_batch)
+    if unix_path:
+        server = await asyncio.start_unix_server(database_server.handle_client, unix_path, limit=MAX_LINE)
+        address = unix_path
+    else:
+        server = await asyncio.start_server(database_server.handle_client, host, port, limit=MAX_LINE)
+        address = f"{host}:{server.sockets[0].getsockname()[1]}"
+    print(f"Serving databases on {address}.", file=sys.stderr)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):  # Signal handlers are not available on every platform
+            loop.add_signal_handler(signal_number, stop.set)
+    async with server:
+        await stop.wait()
+    await database_server.close()
+    print("Server stopped.", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Simple DBMS databases over line-delimited JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket at PATH instead of TCP")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most writes committed together")
+    args = parser.parse_args(argv)
+    # Messages printed by the database operations go to the server log rather than to any client.
+    with contextlib.redirect_stdout(sys.stderr):
+        asyncio.run(serve(args.host, args.port, args.unix, args.max_batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# Shared fixtures for the tests. The database modules live at the top of the repository and keep their files in the
+# current directory, so every test runs in a fresh temporary directory with the repository on the import path.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import file_manager as fm  # noqa: E402
+
+
+# This fixture runs a test in an empty temporary directory, with the catalog cache of the previous test dropped.
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fm._catalog_cache.update(stamp=None, databases=None)
+    return tmp_path
+
+
+# This fixture returns a function that creates a database with a single text field "name" in the given storage format.
+@pytest.fixture
+def make_database():
+    def make(db_name="people", storage="json", fields=None):
+        assert fm.create_database_files(db_name, fields or {"name": 10}, storage)
+        return db_name
+    return make
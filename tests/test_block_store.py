@@ -0,0 +1,81 @@
+# Tests of compressed, block-structured data files: records are read back by position and by ID without
+# decompressing the whole file, with either codec, and compressed databases keep their changes across sessions.
+import pytest
+
+import block_store as bs
+import file_manager as fm
+from database import Database
+
+FIELDS = ["name", "city"]
+
+
+def stored_records(count, deleted=()):
+    return [{"_id": record_id, "_deleted": True} if record_id in deleted
+            else {"name": f"n{record_id}", "city": "x" * (record_id % 7), "_id": record_id}
+            for record_id in range(1, count + 1)]
+
+
+@pytest.fixture(params=list(bs.CODECS))
+def codec(request):
+    return request.param
+
+
+def test_records_round_trip(workdir, codec):
+    records = stored_records(250, deleted={3, 100, 250})
+    bs.write_store("people", FIELDS, records, codec, block_records=16)
+    assert bs.store_codec("people") == codec
+
+    with bs.BlockReader("people") as reader:
+        assert reader.read_all() == records
+        assert len(reader) == 250 and reader.live_count == 247
+        assert len(reader.blocks) == 16
+
+
+def test_records_are_read_by_position_and_id(workdir, codec):
+    records = stored_records(100, deleted={20})
+    bs.write_store("people", FIELDS, records, codec, block_records=8)
+
+    with bs.BlockReader("people") as reader:
+        assert reader.read(0) == records[0] and reader.read(99) == records[99]
+        assert reader.read_range(14, 30) == records[14:30]
+        assert reader.get(20) == {"_id": 20, "_deleted": True}
+        assert reader.get(57) == records[56]
+        assert reader.get(101) is None
+        assert [record["_id"] for record in reader.iter_live(17)] == [i for i in range(18, 101) if i != 20]
+        with pytest.raises(IndexError):
+            reader.read(100)
+
+
+def test_reader_over_data_in_memory(workdir, codec):
+    records = stored_records(30)
+    bs.write_store("people", FIELDS, records, codec, block_records=8)
+    with open(bs.data_path("people"), 'rb') as f:
+        data = f.read()
+    assert bs.BlockReader(data=data).read_all() == records
+
+
+def test_damaged_file_is_rejected(workdir, codec):
+    bs.write_store("people", FIELDS, stored_records(30), codec)
+    with open(bs.data_path("people"), 'r+b') as f:
+        f.seek(bs.HEADER_SIZE + 4)
+        f.write(b"\0" * 64)
+        f.truncate(bs.HEADER_SIZE + 100)
+    with pytest.raises(ValueError, match="not a valid compressed data file"):
+        bs.BlockReader("people")
+
+
+def test_compressed_database_keeps_its_changes(make_database, codec):
+    db_name = make_database(storage=codec)
+    database = Database(db_name)
+    for name in ("ada", "bob", "cy"):
+        database.add({"name": name})
+    database.update(2, {"name": "bobby"})
+    database.delete(1)
+    assert database.get(2)["name"] == "bobby"
+    database.close()  # Folds the log into the compressed file
+
+    assert fm.database_storage(db_name) == codec
+    database = Database(db_name)
+    assert database.reader is not None
+    assert database.get(2)["name"] == "bobby" and database.get(1) is None
+    assert [record["name"] for record in database.iter_records()] == ["bobby", "cy"]
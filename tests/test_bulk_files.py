@@ -0,0 +1,96 @@
+# Tests of bulk import and export: valid rows are loaded together and invalid ones written to a reject file, exports
+# round-trip through an import, and files that cannot be read or written fail the whole operation.
+import json
+
+import pytest
+
+import file_manager as fm
+from database import Database
+
+STORAGES = ["json", "binary", "zlib"]
+
+
+def rows(database):
+    return [record["name"] for record in Database(database).iter_records()]
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_csv_import_rejects_invalid_rows(make_database, workdir, storage):
+    db_name = make_database(storage=storage, fields={"name": 6})
+    (workdir / "rows.csv").write_text("name,extra\nada,1\n,2\nmuch too long,3\nbob,4\n")
+
+    assert fm.import_records(db_name, "rows.csv") == (2, 2)
+    assert rows(db_name) == ["ada", "bob"]
+    rejects = [json.loads(line) for line in (workdir / "rows.csv.rejects.jsonl").read_text().splitlines()]
+    assert [(reject["line"], reject["reason"]) for reject in rejects] == [
+        (3, "'name' is empty"), (4, "'name' exceeds maximum length of 6")]
+
+
+def test_jsonl_import_rejects_lines_that_are_not_objects(make_database, workdir):
+    db_name = make_database()
+    (workdir / "rows.jsonl").write_text('{"name": "ada"}\n\nnot json\n[1, 2]\n{"name": "bob"}\n')
+
+    assert fm.import_records(db_name, "rows.jsonl") == (2, 2)
+    assert rows(db_name) == ["ada", "bob"]
+    reasons = [json.loads(line)["reason"] for line in (workdir / "rows.jsonl.rejects.jsonl").read_text().splitlines()]
+    assert reasons == ["invalid JSON", "row is not an object"]
+
+
+def test_import_without_rejects_leaves_no_reject_file(make_database, workdir):
+    db_name = make_database()
+    (workdir / "rows.csv").write_text("name\nada\n")
+    assert fm.import_records(db_name, "rows.csv", batch_size=1) == (1, 0)
+    assert not (workdir / "rows.csv.rejects.jsonl").exists()
+
+
+def test_import_appends_to_existing_records(make_database, workdir):
+    db_name = make_database()
+    database = Database(db_name)
+    database.add({"name": "ada"})
+    database.close()
+    (workdir / "rows.csv").write_text("name\nbob\ncy\n")
+
+    assert fm.import_records(db_name, "rows.csv") == (2, 0)
+    assert [(record["_id"], record["name"]) for record in Database(db_name).iter_records()] == [
+        (1, "ada"), (2, "bob"), (3, "cy")]
+
+
+@pytest.mark.parametrize("path", ["missing.csv", "rows.txt"])
+def test_import_of_an_unreadable_file_fails(make_database, workdir, path):
+    db_name = make_database()
+    (workdir / "rows.txt").write_text("name\nada\n")
+    assert fm.import_records(db_name, path) is None
+    assert rows(db_name) == []
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+@pytest.mark.parametrize("extension", [".csv", ".jsonl"])
+def test_export_round_trips_through_an_import(make_database, storage, extension):
+    source = make_database("source", storage=storage)
+    database = Database(source)
+    for name in ("cy", "ada", "bob"):
+        database.add({"name": name})
+    database.delete(1)
+    database.close()
+
+    assert fm.export_records(source, "out" + extension) == 2
+    target = make_database("target", storage=storage)
+    assert fm.import_records(target, "out" + extension) == (2, 0)
+    assert rows(target) == ["ada", "bob"]
+
+
+def test_export_in_order(make_database):
+    db_name = make_database()
+    database = Database(db_name)
+    for name in ("cy", "ada", "bob"):
+        database.add({"name": name})
+    database.close()
+
+    assert fm.export_records(db_name, "out.jsonl", order_by="name", descending=True) == 3
+    with open("out.jsonl") as f:
+        assert [json.loads(line)["name"] for line in f] == ["cy", "bob", "ada"]
+
+
+@pytest.mark.parametrize("path", ["missing/out.csv", "out.txt"])
+def test_export_to_an_unwritable_file_fails(make_database, path):
+    assert fm.export_records(make_database(), path) is None
@@ -0,0 +1,81 @@
+# Tests of the database catalog: it follows creation, changes and deletion of databases, is rebuilt from the files on
+# disk when it is missing or corrupted, and never deadlocks with the lock of a database.
+import os
+import threading
+
+import pytest
+
+import file_manager as fm
+from database import Database
+
+
+def test_catalog_follows_creation_changes_and_deletion(make_database):
+    make_database("people")
+    make_database("cities", storage="binary", fields={"city": 12})
+    assert fm.list_databases() == ["cities", "people"]
+    assert fm.load_catalog()["cities"]["storage"] == "binary"
+    assert fm.load_catalog()["people"]["fields"] == {"name": 10}
+
+    database = Database("people")
+    database.add({"name": "ada"})
+    database.add({"name": "bob"})
+    database.close()
+    entry = fm.load_catalog()["people"]
+    assert entry["rows"] == 2
+    assert entry["size"] == fm.database_file_stats("people")[0]
+
+    fm.delete_database("cities")
+    assert fm.list_databases() == ["people"]
+    assert not fm.database_exists("cities")
+
+
+@pytest.mark.parametrize("damage", ["missing", "corrupted"])
+def test_catalog_is_rebuilt_from_the_files(make_database, damage):
+    database = Database(make_database("people", storage="binary"))
+    database.add({"name": "ada"})
+    database.close()
+    make_database("empty")
+    expected = fm.load_catalog()
+    if damage == "missing":
+        os.remove(fm.catalog_path())
+    else:
+        with open(fm.catalog_path(), 'w') as f:
+            f.write("{not json")
+    fm._catalog_cache.update(stamp=None, databases=None)
+
+    assert fm.load_catalog() == expected
+    assert os.path.exists(fm.catalog_path())
+
+
+def test_creating_a_database_with_the_catalog_missing_keeps_the_others(make_database):
+    make_database("people")
+    os.remove(fm.catalog_path())
+    fm._catalog_cache.update(stamp=None, databases=None)
+    make_database("cities")
+    assert fm.list_databases() == ["cities", "people"]
+
+
+def test_writing_a_database_while_the_catalog_is_rebuilt_does_not_deadlock(make_database):
+    db_name = make_database(storage="zlib")  # Compressed databases are read under their lock
+    os.remove(fm.catalog_path())
+    fm._catalog_cache.update(stamp=None, databases=None)
+    locked, release = threading.Event(), threading.Event()
+
+    def write():  # Holds the lock of the database, then updates the catalog, like `write_data_file`
+        with fm.database_lock(db_name, exclusive=True):
+            locked.set()
+            release.wait(5)
+            fm.update_catalog(db_name, rows=0)
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    locked.wait(5)
+    rebuilder = threading.Thread(target=fm.rebuild_catalog, daemon=True)  # Waits for the lock of the database
+    rebuilder.start()
+    rebuilder.join(0.2)
+    release.set()
+    writer.join(5)
+    rebuilder.join(5)
+
+    assert not writer.is_alive() and not rebuilder.is_alive()
+    assert fm.list_databases() == [db_name]
@@ -0,0 +1,110 @@
+# Tests of columnar databases: records read back exactly as they were written, through the log and after a
+# checkpoint, typed values that would not are rejected, and aggregates over the columns match a scan of the records.
+import pytest
+
+pytest.importorskip("numpy")
+
+import column_store as cs  # noqa: E402
+import database_operations as db_ops  # noqa: E402
+import file_manager as fm  # noqa: E402
+from database import Database  # noqa: E402
+
+FIELDS = {"name": 10, "age": 3, "score": 12, "born": 10}
+TYPES = {"age": "int", "score": "float", "born": "date"}
+RECORDS = [
+    {"name": "ada", "age": "36", "score": "9.5", "born": "1815-12-10"},
+    {"name": "bob", "age": "-4", "score": "1e+20", "born": "2000-02-29"},
+    {"name": "", "age": "0", "score": "-0.25", "born": "1970-01-01"},
+]
+
+
+@pytest.fixture
+def columnar(workdir):
+    assert fm.create_database_files("people", FIELDS, "columnar", TYPES)
+    return "people"
+
+
+def stored(records):
+    return [{field: record[field] for field in FIELDS} for record in records]
+
+
+def test_records_round_trip(columnar):
+    cs.write_store(columnar, FIELDS, TYPES, [dict(record, _id=i) for i, record in enumerate(RECORDS, start=1)])
+    with cs.ColumnReader(columnar) as reader:
+        assert stored(reader.read_all()) == RECORDS
+        assert [record["_id"] for record in reader.iter_live(1)] == [2, 3]
+
+
+def test_records_round_trip_through_the_log_and_a_checkpoint(columnar):
+    database = Database(columnar)
+    for record in RECORDS[:2]:
+        database.add(record)
+    database.delete(1)
+    database.add(RECORDS[2])
+    assert stored(database.iter_records()) == RECORDS[1:]
+    database.close()  # Folds the log into the columnar file
+
+    assert cs.ColumnReader(columnar).live_count == 2
+    assert stored(Database(columnar).iter_records()) == RECORDS[1:]
+
+
+@pytest.mark.parametrize("field, value", [("age", "044"), ("age", "+7"), ("score", "2"), ("score", "1e3"),
+                                          ("score", "NaN")])
+def test_typed_values_not_in_canonical_form_are_rejected(columnar, field, value):
+    database = Database(columnar)
+    canonical = cs.canonical_values([value], TYPES[field])[0]
+    assert fm.columnar_form(value, TYPES[field]) == canonical
+
+    with pytest.raises(ValueError, match=f"must be written as '{canonical}'"):
+        db_ops.execute_command(database, {"op": "add", "record": dict(RECORDS[0], **{field: value})})
+    record = dict(RECORDS[0], **{field: canonical})
+    record_id = db_ops.execute_command(database, {"op": "add", "record": record})["id"]
+    database.close()
+    assert stored([Database(columnar).get(record_id)]) == [record]
+
+
+def test_json_databases_keep_typed_values_as_written(workdir):
+    assert fm.create_database_files("people", FIELDS, "json", TYPES)
+    database = Database("people")
+    record = dict(RECORDS[0], age="044", score="2")
+    record_id = db_ops.execute_command(database, {"op": "add", "record": record})["id"]
+    database.close()
+    assert stored([Database("people").get(record_id)]) == [record]
+
+
+def test_import_rejects_values_not_in_canonical_form(columnar, workdir):
+    (workdir / "rows.csv").write_text("name,age,score,born\nada,36,9.5,1815-12-10\nbob,044,2.0,2000-02-29\n")
+    assert fm.import_records(columnar, "rows.csv") == (1, 1)
+    assert "must be written as '44'" in (workdir / "rows.csv.rejects.jsonl").read_text()
+
+
+@pytest.mark.parametrize("func, field, group_by", [("count", None, None), ("sum", "age", None),
+                                                   ("avg", "score", None), ("min", "born", None),
+                                                   ("max", "name", None), ("sum", "age", "name")])
+def test_column_aggregates_match_a_scan(columnar, func, field, group_by):
+    database = Database(columnar)
+    with database.batch():
+        for record in RECORDS * 3:
+            database.add(record)
+    database.flush()
+    assert database.columns is not None
+    by_columns = db_ops.aggregate(database, func, field, group_by)
+
+    database.add(RECORDS[0])  # The log now holds a change, so the records are scanned
+    database.delete(len(RECORDS) * 3 + 1)
+    assert database.columns is None
+    assert db_ops.aggregate(database, func, field, group_by) == by_columns
+
+
+def test_sums_over_text_columns_only_convert_the_aggregated_values(workdir):
+    assert fm.create_database_files("sizes", {"name": 5, "size": 5}, "columnar")
+    database = Database("sizes")
+    for name, size in (("a", "1.5"), ("b", "big"), ("c", "2"), ("d", "4")):
+        database.add({"name": name, "size": size})
+    database.delete(4)  # Leaves an empty value in the text column
+    database.flush()
+    assert database.columns is not None
+
+    assert db_ops.aggregate(database, "sum", "size", where=[("name", "!=", "b")]) == 3.5
+    with pytest.raises(ValueError, match="does not hold numbers"):
+        db_ops.aggregate(database, "sum", "size")
@@ -0,0 +1,78 @@
+# Tests of tombstone deletes and compaction: record IDs never change and are never handed out twice.
+import pytest
+
+import file_manager as fm
+from database import Database
+
+
+@pytest.mark.parametrize("storage", ["json", "binary"])
+def test_compaction_removes_tombstones_and_keeps_ids(make_database, storage):
+    database = Database(make_database(storage=storage))
+    for name in ("ada", "bob", "cy", "dan"):
+        database.add({"name": name})
+    database.delete(2)
+    assert database.dead_count == 1
+
+    database.compact()
+
+    assert database.dead_count == 0
+    assert [(record["_id"], record["name"]) for record in database.iter_records()] == [(1, "ada"), (3, "cy"),
+                                                                                       (4, "dan")]
+    assert database.get(3)["name"] == "cy"
+
+
+def test_tombstone_of_the_highest_id_is_kept(make_database):
+    db_name = make_database()
+    database = Database(db_name)
+    for name in ("ada", "bob", "cy"):
+        database.add({"name": name})
+    database.delete(2)
+    database.delete(3)
+
+    database.compact()
+
+    assert fm.load_data_file(db_name) == [{"name": "ada", "_id": 1}, {"_id": 3, "_deleted": True}]
+    assert database.add({"name": "eve"}) == 4  # ID 3 is not handed out again
+
+
+@pytest.mark.parametrize("storage", ["json", "binary"])
+def test_ids_are_not_reused_after_reopening(make_database, storage):
+    db_name = make_database(storage=storage)
+    database = Database(db_name)
+    database.add({"name": "ada"})
+    database.add({"name": "bob"})
+    database.delete(2)
+    database.compact()
+    database.close()
+
+    assert Database(db_name).add({"name": "cy"}) == 3
+
+
+@pytest.mark.parametrize("storage", ["json", "binary"])
+def test_running_iterators_survive_background_compaction(make_database, storage):
+    database = Database(make_database(storage=storage))
+    with database.batch():
+        for number in range(1, 3001):
+            database.add({"name": f"n{number}"})
+    with database.batch():
+        for record_id in range(1, 1800, 2):  # Too few tombstones to start compaction on their own
+            database.delete(record_id)
+    expected = [record["_id"] for record in database.iter_records()]
+    records = database.iter_records()
+    first = next(records)
+
+    database.start_compaction().join()
+
+    assert [first["_id"]] + [record["_id"] for record in records] == expected
+    assert database.dead_count == 0
+    assert [record["_id"] for record in database.iter_records()] == expected
+
+
+def test_running_iterators_survive_the_store_growing(make_database):
+    database = Database(make_database(storage="binary"))
+    database.add({"name": "ada"})
+    records = database.iter_records()
+    assert next(records)["name"] == "ada"
+    for number in range(3000):
+        database.add({"name": f"n{number}"})
+    assert list(records) == []
@@ -0,0 +1,92 @@
+# Tests of the external merge sort: with a memory budget far smaller than the records, the sort spills sorted runs
+# to disk and still returns what an in-memory stable sort returns, numbers ordered numerically and everything else
+# (including "nan" and "inf") as text.
+import pytest
+
+import external_sort as es
+
+VALUES = ["30", "9", "30.0", "nan", "-5", "abc", "inf", "100", "7.5", "Inf", "", "-inf", "1e3"]
+
+
+def make_records(count):
+    return [{"_id": number, "age": VALUES[number * 7 % len(VALUES)], "name": f"n{number % 11}"}
+            for number in range(count)]
+
+
+# This fixture counts the runs spilled to disk and keeps their files, so tests can check they were closed.
+@pytest.fixture
+def runs(monkeypatch):
+    files = []
+    write_run = es.write_run
+
+    def counting_write_run(records):
+        f = write_run(records)
+        files.append(f)
+        return f
+
+    monkeypatch.setattr(es, "write_run", counting_write_run)
+    return files
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("order_fields", [["age"], ["name", "age"]])
+def test_external_sort_matches_an_in_memory_sort(runs, order_fields, descending):
+    records = make_records(2000)
+    key = es.record_key(order_fields)
+
+    result = list(es.sort_records(iter(records), key, descending, memory_budget=20000))
+
+    assert len(runs) > 10
+    assert result == sorted(records, key=key, reverse=descending)  # Stable, so equal keys keep their order
+    assert all(f.closed for f in runs)
+
+
+def test_numbers_sort_before_text():
+    records = [{"age": value} for value in VALUES]
+    ordered = [record["age"] for record in es.sort_records(records, es.record_key(["age"]), memory_budget=200)]
+    assert ordered == ["-5", "7.5", "9", "30", "30.0", "100", "1e3", "", "-inf", "Inf", "abc", "inf", "nan"]
+
+
+def test_many_runs_are_merged_in_several_passes(runs, monkeypatch):
+    monkeypatch.setattr(es, "MERGE_FAN_IN", 3)
+    spilled = []
+    spill_run = es.spill_run
+    monkeypatch.setattr(es, "spill_run", lambda *args: spilled.append(1) or spill_run(*args))
+    records = make_records(500)
+    key = es.record_key(["age"])
+
+    assert list(es.sort_records(records, key, memory_budget=3000)) == sorted(records, key=key)
+    assert len(spilled) > 9  # Too many runs to merge in one pass of three
+    assert len(runs) > len(spilled)  # The intermediate passes wrote merged runs as well
+    assert all(f.closed for f in runs)
+
+
+def test_small_inputs_are_not_written_to_disk(runs):
+    records = make_records(50)
+    key = es.record_key(["age"])
+    assert list(es.sort_records(records, key)) == sorted(records, key=key)
+    assert runs == []
+
+
+def test_abandoned_sort_closes_its_runs(runs):
+    sorted_records = es.sort_records(make_records(1000), es.record_key(["age"]), memory_budget=10000)
+    next(sorted_records)
+    assert runs and not any(f.closed for f in runs)
+    sorted_records.close()
+    assert all(f.closed for f in runs)
+
+
+def test_sorted_file_reads_from_any_position(monkeypatch):
+    monkeypatch.setattr(es, "STRIDE", 7)
+    records = make_records(100)
+    key = es.record_key(["age", "name"])
+    expected = sorted(records, key=key, reverse=True)
+
+    with es.SortedFile(records, key, descending=True, memory_budget=5000) as sorted_file:
+        assert len(sorted_file) == 100
+        assert list(sorted_file.iter_from()) == expected
+        first, second = sorted_file.iter_from(3), sorted_file.iter_from(50)
+        assert [next(first), next(second), next(first), next(second)] == [expected[3], expected[50], expected[4],
+                                                                         expected[51]]
+        assert list(sorted_file.iter_from(99)) == expected[99:]
+        assert list(sorted_file.iter_from(100)) == []
@@ -0,0 +1,63 @@
+# Tests of the secondary indexes: lookups through a hash or sorted index match a scan, numbers compare numerically,
+# and words that `float` happens to read ("nan", "inf") are treated as text.
+import pytest
+
+import indexes as ixs
+from database import Database
+
+NAMES = ["Amy", "Nan", "Inf", "infinity", "10", "9", "30", "30.0"]
+
+
+@pytest.fixture
+def database(make_database):
+    database = Database(make_database())
+    for name in NAMES:
+        database.add({"name": name})
+    return database
+
+
+def found(database, value):
+    return sorted(database.get(record_id)["name"] for record_id in database.find("name", value))
+
+
+def test_sort_key_treats_nan_and_infinity_as_text():
+    for word in ("nan", "NaN", "inf", "-Inf", "infinity", "Infinity"):
+        assert ixs.sort_key(word) == (1, 0.0, word)
+    assert ixs.sort_key("9") < ixs.sort_key("10") < ixs.sort_key("Amy")
+    assert ixs.sort_key("30") == ixs.sort_key("30.0")
+
+
+@pytest.mark.parametrize("kind", [None, "hash", "sorted"])
+def test_text_lookups_match_exactly(database, kind):
+    if kind:
+        database.create_index("name", kind)
+    assert found(database, "Nan") == ["Nan"]
+    assert found(database, "Inf") == ["Inf"]
+    assert found(database, "Amy") == ["Amy"]
+
+
+def test_sorted_index_compares_numbers_numerically(database):
+    index = database.create_index("name", "sorted")
+    assert sorted(database.get(record_id)["name"] for record_id in index.lookup("30")) == ["30", "30.0"]
+    assert sorted(database.get(record_id)["name"] for record_id in index.range("9", "30")) == ["10", "30", "30.0",
+                                                                                              "9"]
+    assert [database.get(record_id)["name"] for record_id in database.find_range("name", "A", "J")] == ["Amy", "Inf"]
+
+
+def test_sorted_index_orders_numbers_before_text(database):
+    index = database.create_index("name", "sorted")
+    ordered = [value for value, _ in index.entries]
+    assert ordered[:4] == ["9", "10", "30", "30.0"]
+    assert ordered[4:] == sorted(ordered[4:])
+
+
+def test_indexes_follow_changes_and_survive_reopening(database):
+    database.create_index("name", "hash")
+    database.update(1, {"name": "Bea"})
+    database.delete(2)
+    assert found(database, "Amy") == [] and found(database, "Bea") == ["Bea"] and found(database, "Nan") == []
+    database.close()
+
+    reopened = Database(database.name)
+    assert reopened.indexes["name"].kind == "hash"
+    assert found(reopened, "Bea") == ["Bea"]
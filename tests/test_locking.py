@@ -0,0 +1,106 @@
+# Tests of file locking and atomic writes: an exclusive lock keeps other processes out, shared locks do not exclude
+# each other, threads take turns, a failed write leaves the old file in place, and sessions in several processes
+# writing to one database at once lose no changes.
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import file_manager as fm
+from database import Database
+
+STORAGES = ["json", "binary"]
+
+
+# This function tries to take a lock on a database from another process without waiting, and reports whether it got
+# it. The lock is taken directly with `flock`, as another session would.
+def try_lock(db_name, exclusive):
+    with open(fm.lock_path(db_name), 'a') as f:
+        try:
+            fcntl.flock(f.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+
+def in_other_process(function, *args):
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def test_exclusive_lock_keeps_other_processes_out():
+    with fm.database_lock("people", exclusive=True):
+        assert in_other_process(try_lock, "people", False) is False
+    assert in_other_process(try_lock, "people", True) is True
+
+
+def test_shared_locks_do_not_exclude_each_other():
+    with fm.database_lock("people"):
+        assert in_other_process(try_lock, "people", False) is True
+        assert in_other_process(try_lock, "people", True) is False
+
+
+def test_shared_lock_is_upgraded_inside_an_exclusive_block():
+    with fm.database_lock("people"):
+        with fm.database_lock("people", exclusive=True):
+            assert in_other_process(try_lock, "people", False) is False
+        assert in_other_process(try_lock, "people", False) is False  # Held until the outermost block ends
+    assert in_other_process(try_lock, "people", True) is True
+
+
+def test_threads_take_turns():
+    inside, overlaps = [], []
+
+    def work():
+        for _ in range(50):
+            with fm.database_lock("people", exclusive=True):
+                inside.append(1)
+                overlaps.append(len(inside))
+                inside.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(overlaps) == 1
+
+
+def test_failed_atomic_write_keeps_the_old_file(workdir):
+    (workdir / "file.json").write_text('["old"]')
+
+    def write(f):
+        f.write('["new"')
+        raise IOError("disk full")
+
+    with pytest.raises(IOError):
+        fm.atomic_write("file.json", write)
+    assert json.loads((workdir / "file.json").read_text()) == ["old"]
+    assert os.listdir(workdir) == ["file.json"]
+
+
+def add_records(db_name, prefix, count):
+    database = Database(db_name)
+    for number in range(count):
+        database.add({"name": f"{prefix}{number}"})
+    database.close()
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_processes_writing_at_once_lose_no_changes(make_database, storage):
+    db_name = make_database(storage=storage)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=add_records, args=(db_name, prefix, 40)) for prefix in "abc"]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    records = list(Database(db_name).iter_records())
+    assert sorted(record["name"] for record in records) == sorted(f"{prefix}{number}" for prefix in "abc"
+                                                                  for number in range(40))
+    assert sorted(record["_id"] for record in records) == list(range(1, 121))
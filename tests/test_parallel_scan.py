@@ -0,0 +1,109 @@
+# Tests of parallel full-table scans: the segments of a data file cover every live record exactly once, and queries
+# and aggregates scanned in worker processes return the same results as a scan in the calling process.
+import collections
+
+import pytest
+
+import block_store as bs
+import database_operations as db_ops
+import instrumentation as instr
+import parallel_scan as ps
+from database import Database
+
+STORAGES = ["json", "binary", "zlib", "columnar"]
+AGES = ["30", "9", "30.0", "nan", "-5", "abc", "100", "7.5"]
+
+
+# This fixture lets scans run in two worker processes with small segments, even on a machine with a single CPU.
+# Compressed files get small blocks, since their segments are made of whole blocks.
+@pytest.fixture(autouse=True)
+def two_workers(monkeypatch):
+    monkeypatch.setattr(ps, "MAX_WORKERS", 2)
+    monkeypatch.setattr(ps.map_segments, "__defaults__", (150,))
+    monkeypatch.setattr(ps.plan_segments, "__defaults__", (150,))
+    monkeypatch.setattr(bs.write_store, "__defaults__", (bs.DEFAULT_CODEC, 50))
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stop_workers():
+    yield
+    ps.shutdown()
+
+
+@pytest.fixture(params=STORAGES)
+def database(request, make_database):
+    if request.param == "columnar":
+        pytest.importorskip("numpy")
+    database = Database(make_database(storage=request.param, fields={"name": 6, "age": 5, "group": 1}))
+    with database.batch():
+        for number in range(1000):
+            database.add({"name": f"n{number}", "age": AGES[number % len(AGES)], "group": "abc"[number % 3]})
+        for record_id in range(1, 1001, 7):
+            database.delete(record_id)
+    database.flush()  # Folds the log into the data file, which can then be split
+    return database
+
+
+# This function runs `function` with scans split across worker processes and again with scans in this process, and
+# returns both results and the counters of the first run, which tell how its records were scanned.
+def parallel_and_serial(monkeypatch, function):
+    with monkeypatch.context() as patch:
+        patch.setattr(instr, "ENABLED", True)
+        patch.setattr(instr, "counters", collections.Counter())
+        parallel = function()
+        counters = instr.counters
+    with monkeypatch.context() as patch:
+        patch.setattr(ps, "MAX_WORKERS", 1)
+        serial = function()
+    return parallel, serial, counters
+
+
+def test_segments_cover_every_live_record_once(database):
+    segments = ps.plan_segments(database.name)
+    assert len(segments) > 2
+    records = [record for segment in segments for record in ps.read_segment(segment)]
+    assert records == list(database.iter_records())
+    assert sum(ps.map_segments(database.name, len)) == len(database)
+
+
+@pytest.mark.parametrize("query", [
+    {},
+    {"where": [("age", ">", "9")]},
+    {"where": [("age", "=", "nan")], "fields": ["name"]},
+    {"where": [("group", "=", "b")], "order_by": ["age", "name"]},
+    {"order_by": "age", "limit": 25},
+    {"order_by": ["age", "name"], "limit": 40, "descending": True},
+])
+def test_parallel_select_matches_a_serial_scan(database, monkeypatch, query):
+    parallel, serial, counters = parallel_and_serial(monkeypatch, lambda: db_ops.select(database, **query))
+    assert counters["select parallel scans"] == 1
+    if query.get("order_by"):
+        assert parallel == serial
+    else:
+        assert sorted(parallel, key=lambda record: record.get("_id", record.get("name"))) == \
+            sorted(serial, key=lambda record: record.get("_id", record.get("name")))
+    assert parallel
+
+
+@pytest.mark.parametrize("func, field, group_by, where", [
+    ("count", None, None, None),
+    ("count", None, "group", [("age", "<", "50")]),
+    ("sum", "age", None, [("age", "!=", "abc"), ("age", "!=", "nan")]),
+    ("avg", "age", "group", [("age", "~", "0")]),
+    ("min", "age", "group", None),
+    ("max", "name", None, [("name", "~", "9")]),
+])
+def test_parallel_aggregate_matches_a_serial_scan(database, monkeypatch, func, field, group_by, where):
+    parallel, serial, counters = parallel_and_serial(monkeypatch, lambda: db_ops.aggregate(database, func, field,
+                                                                                            group_by, where))
+    assert counters["aggregate parallel scans"] + counters["aggregate column scans"] == 1
+    assert parallel == pytest.approx(serial) if isinstance(serial, float) else parallel == serial
+
+
+def test_changes_only_in_the_log_are_not_scanned_in_segments(database):
+    database.add({"name": "late", "age": "1", "group": "a"})
+    if database.uses_store:  # Binary databases write their changes in place, so they have no log to wait for
+        assert sum(ps.map_segments(database.name, len)) == len(database)
+    else:
+        assert ps.map_segments(database.name, len) is None
+    assert db_ops.select(database, [("name", "=", "late")])[0]["age"] == "1"
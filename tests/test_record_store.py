@@ -0,0 +1,76 @@
+# Tests of the fixed-width binary record store: records are read and changed in place by ID, values are limited in
+# UTF-8 bytes, and a second handle on the same file sees the changes of the first.
+import pytest
+
+import file_manager as fm
+import record_store as rs
+from database import Database
+
+FIELDS = {"name": 6, "city": 8}
+
+
+@pytest.fixture
+def store(make_database):
+    db_name = make_database(storage="binary", fields=FIELDS)
+    store = rs.RecordStore(db_name, FIELDS)
+    yield store
+    store.close()
+
+
+def test_slot_layout_follows_the_field_lengths():
+    layout, slot_size = rs.slot_layout(FIELDS)
+    assert layout == [("name", rs.SLOT_PREFIX, 6), ("city", rs.SLOT_PREFIX + 6, 8)]
+    assert slot_size == rs.SLOT_PREFIX + 14
+
+
+def test_records_are_read_and_changed_by_id(store):
+    assert store.extend([{"name": "ada", "city": "london"}, {"name": "bob", "city": "paris"}]) == [1, 2]
+    assert store.append({"name": "cy"}) == 3
+    assert store.read(3) == {"_id": 3, "name": "cy", "city": ""}
+
+    store.write(2, {"name": "bobby", "city": "rome"})
+    store.delete(1)
+
+    assert 1 not in store and 2 in store
+    assert len(store) == 2 and store.dead_count == 1
+    assert list(store) == [{"_id": 2, "name": "bobby", "city": "rome"}, {"_id": 3, "name": "cy", "city": ""}]
+    with pytest.raises(KeyError):
+        store.read(1)
+
+
+def test_values_are_limited_in_utf8_bytes(store):
+    store.append({"name": "ééé"})  # Three characters, six bytes
+    with pytest.raises(ValueError, match="exceeds maximum length of 6 bytes"):
+        store.append({"name": "éééé"})
+    assert [record["name"] for record in store] == ["ééé"]
+
+
+def test_store_grows_and_other_handles_see_the_changes(store):
+    other = rs.RecordStore(store.db_name, FIELDS)
+    try:
+        store.extend({"name": f"n{number}"} for number in range(rs.GROW_SLOTS + 10))
+        assert len(other) == rs.GROW_SLOTS + 10
+        assert other.read(rs.GROW_SLOTS + 10)["name"] == f"n{rs.GROW_SLOTS + 9}"
+        other.write(1, {"name": "first"})
+        assert store.read(1)["name"] == "first"
+    finally:
+        other.close()
+
+
+def test_store_rejects_a_system_file_with_other_lengths(store):
+    with pytest.raises(ValueError, match="does not match the field lengths"):
+        rs.RecordStore(store.db_name, {"name": 7, "city": 8})
+    assert rs.open_store(store.db_name, {"name": 7, "city": 8}) is None
+
+
+def test_binary_database_keeps_its_records_across_sessions(make_database):
+    db_name = make_database(storage="binary", fields=FIELDS)
+    database = Database(db_name)
+    database.add({"name": "ada", "city": "london"})
+    database.add({"name": "bob", "city": "paris"})
+    database.update(1, {"name": "alice", "city": "london"})
+    database.close()
+
+    assert fm.database_storage(db_name) == "binary"
+    assert fm.load_data_file(db_name) == [{"_id": 1, "name": "alice", "city": "london"},
+                                          {"_id": 2, "name": "bob", "city": "paris"}]
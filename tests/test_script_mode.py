@@ -0,0 +1,59 @@
+# Tests of the non-interactive script mode: one JSON result per command, and a failing exit status when any command
+# did not succeed.
+import io
+import json
+
+import cli
+import write_ahead_log as wal
+
+
+def run(db_name, *commands):
+    output = io.StringIO()
+    failures = cli.run_script(db_name, io.StringIO("".join(json.dumps(command) + "\n" for command in commands)), output)
+    return failures, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_commands_report_their_results(make_database):
+    db_name = make_database()
+    failures, results = run(db_name, {"op": "add", "record": {"name": "ada"}}, {"op": "get", "id": 1},
+                            {"op": "delete", "id": 7})
+    assert failures == 1
+    assert results[0] == {"line": 1, "op": "add", "ok": True, "id": 1}
+    assert results[1]["record"]["name"] == "ada"
+    assert results[2]["ok"] is False and "does not exist" in results[2]["error"]
+
+
+def test_failed_export_is_reported(make_database, workdir):
+    db_name = make_database()
+    failures, results = run(db_name, {"op": "export", "path": str(workdir / "missing" / "out.csv")},
+                            {"op": "export", "path": "out.txt"}, {"op": "export", "path": "out.csv"})
+    assert failures == 2
+    assert [result["ok"] for result in results] == [False, False, True]
+
+
+def test_failed_import_is_reported(make_database, workdir):
+    db_name = make_database()
+    (workdir / "rows.csv").write_text("name\nada\n")
+    (workdir / "empty.csv").write_text("name\n")
+    failures, results = run(db_name, {"op": "import", "path": "missing.csv"}, {"op": "import", "path": "rows.txt"},
+                            {"op": "import", "path": "rows.csv"}, {"op": "import", "path": "empty.csv"})
+    assert failures == 2
+    assert [result["ok"] for result in results] == [False, False, True, True]
+    assert results[2]["imported"] == 1 and results[3]["imported"] == 0
+
+
+def test_changes_are_failed_when_the_batch_cannot_be_committed(make_database, monkeypatch):
+    db_name = make_database()
+
+    def fail(*args):
+        raise IOError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(wal, "append_entries", fail)
+        failures, results = run(db_name, {"op": "add", "record": {"name": "ada"}},
+                                {"op": "aggregate", "func": "count"})
+    assert failures == 1
+    assert results[0]["ok"] is False and "could not be committed" in results[0]["error"]
+    assert results[1]["ok"] is True
+    failures, results = run(db_name, {"op": "aggregate", "func": "count"})
+    assert failures == 0 and results[0]["value"] == 0
@@ -0,0 +1,67 @@
+# Tests of queries: conditions compare finite numbers numerically and everything else (including "nan" and "inf") as
+# text, projections keep only the asked fields, and ordered queries with a limit return the same top rows as a full
+# sort, with or without an index.
+import pytest
+
+import database_operations as db_ops
+from database import Database
+
+ROWS = [("ada", "30"), ("bob", "9"), ("cy", "30.0"), ("dan", "nan"), ("eve", "inf"), ("fay", "10"), ("gus", "abc"),
+        ("hal", "-5"), ("ivy", "100")]
+
+
+@pytest.fixture(params=["none", "hash", "sorted"])
+def database(request, make_database):
+    database = Database(make_database(fields={"name": 5, "age": 5}))
+    with database.batch():
+        for name, age in ROWS:
+            database.add({"name": name, "age": age})
+    if request.param != "none":
+        database.create_index("age", request.param)
+    return database
+
+
+def names(records):
+    return [record["name"] for record in records]
+
+
+@pytest.mark.parametrize("where, expected", [
+    ([("age", "=", "30")], ["ada", "cy"]),
+    ([("age", ">", "9")], ["ada", "cy", "dan", "eve", "fay", "gus", "ivy"]),  # Text sorts after every number
+    ([("age", "<=", "9")], ["bob", "hal"]),
+    ([("age", "=", "nan")], ["dan"]),
+    ([("age", "=", "inf")], ["eve"]),
+    ([("age", ">", "1000")], ["dan", "eve", "gus"]),
+    ([("age", "<", "abc")], ["ada", "bob", "cy", "fay", "hal", "ivy"]),
+    ([("age", "!=", "30"), ("name", "~", "a")], ["dan", "fay", "hal"]),
+])
+def test_conditions_compare_finite_numbers_numerically(database, where, expected):
+    assert sorted(names(db_ops.select(database, where))) == expected
+
+
+def test_numbers_sort_before_text(database):
+    assert names(db_ops.select(database, order_by="age")) == ["hal", "bob", "fay", "ada", "cy", "ivy", "gus", "eve",
+                                                              "dan"]
+
+
+def test_projection_keeps_only_the_asked_fields(database):
+    assert db_ops.select(database, [("name", "=", "ada")], fields=["age"]) == [{"age": "30"}]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("limit", [1, 3, 20])
+def test_top_rows_match_a_full_sort(database, limit, descending):
+    everything = db_ops.select(database, order_by=["age", "name"], descending=descending)
+    top = db_ops.select(database, order_by=["age", "name"], limit=limit, descending=descending)
+    assert top == everything[:limit]
+
+
+def test_limit_without_order_stops_early(database):
+    assert len(db_ops.select(database, limit=2)) == 2
+    assert len(db_ops.select(database, lambda record: record["age"] != "abc", limit=100)) == len(ROWS) - 1
+
+
+def test_parse_condition():
+    assert db_ops.parse_condition("Age >= 30") == ("Age", ">=", "30")
+    assert db_ops.parse_condition("address~abad") == ("address", "~", "abad")
+    assert db_ops.parse_condition("no operator") is None
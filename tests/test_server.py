@@ -0,0 +1,132 @@
+# Tests of the database server and client: requests from several clients are answered, pipelined writes are
+# committed together, failed requests get error responses without affecting the others, and the changes are on disk
+# once the server stops.
+import asyncio
+import socket
+import threading
+
+import pytest
+
+import server
+import write_ahead_log as wal
+from client import Client
+from database import Database
+
+SOCKET = "server.sock"
+
+
+# This fixture runs a server on a Unix socket in the test directory, on its own event loop in a background thread,
+# and stops it (which flushes and closes its databases) when the test ends.
+@pytest.fixture
+def database_server(make_database):
+    make_database()
+    database_server = server.DatabaseServer(max_batch=50)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    stop = asyncio.Event()
+
+    async def run():
+        listener = await asyncio.start_unix_server(database_server.handle_client, SOCKET, limit=server.MAX_LINE)
+        started.set()
+        async with listener:
+            await stop.wait()
+        await database_server.close()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(run(),))
+    thread.start()
+    assert started.wait(5)
+    yield database_server
+    loop.call_soon_threadsafe(stop.set)
+    thread.join(10)
+    loop.close()
+
+
+def connect():
+    return Client(unix_path=SOCKET, timeout=10)
+
+
+def test_requests_are_answered(database_server):
+    with connect() as client:
+        assert client.add("people", {"name": "ada"}) == 1
+        assert client.add("people", {"name": "bob"}) == 2
+        client.edit("people", 2, {"name": "bobby"})
+        assert client.get("people", 2)["name"] == "bobby"
+        assert [record["name"] for record in client.query("people", "name~a", order_by="name")] == ["ada"]
+        assert client.aggregate("people", "count") == 2
+        assert client.transaction("people", [{"op": "add", "record": {"name": "cy"}}, {"op": "delete", "id": 1}]) == [
+            3, 1]
+        records, total = client.view("people", start=1, limit=5)
+        assert total == 2 and [record["name"] for record in records] == ["cy"]
+        assert list(client.list_databases()) == ["people"]
+
+
+def test_pipelined_writes_from_many_clients(database_server):
+    def write(prefix, results):
+        with connect() as client:
+            results.extend(client.pipeline([{"db": "people", "op": "add", "record": {"name": f"{prefix}{number}"}}
+                                             for number in range(120)]))
+
+    results = []
+    threads = [threading.Thread(target=write, args=(prefix, results)) for prefix in "abc"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert all(response["ok"] for response in results)
+    assert sorted(response["result"]["id"] for response in results) == list(range(1, 361))
+    with connect() as client:
+        assert client.aggregate("people", "count") == 360
+
+
+def test_failed_requests_get_error_responses(database_server):
+    with connect() as client:
+        responses = client.pipeline([
+            {"db": "people", "op": "add", "record": {"name": "ada"}},
+            {"db": "people", "op": "add", "record": {"name": "far too long"}},
+            {"db": "people", "op": "delete", "id": 9},
+            {"db": "missing", "op": "get", "id": 1},
+            {"db": "people", "op": "unknown"},
+        ])
+        assert [response["ok"] for response in responses] == [True, False, False, False, False]
+        assert "exceeds maximum length" in responses[1]["error"]
+        with pytest.raises(ValueError, match="does not exist"):
+            client.get("missing", 1)
+
+    with socket.socket(socket.AF_UNIX) as raw:
+        raw.connect(SOCKET)
+        with raw.makefile('rwb') as f:
+            f.write(b"not json\n[1]\n")
+            f.flush()
+            assert b'"ok": false' in f.readline() and b"JSON object" in f.readline()
+
+
+def test_writes_of_a_batch_that_cannot_be_committed_fail(database_server, monkeypatch):
+    def fail(*args):
+        raise IOError("disk full")
+
+    with connect() as client:
+        with monkeypatch.context() as patch:
+            patch.setattr(wal, "append_entries", fail)
+            response = client.pipeline([{"db": "people", "op": "add", "record": {"name": "ada"}}])[0]
+        assert response["ok"] is False and "could not be committed" in response["error"]
+        assert client.aggregate("people", "count") == 0
+
+
+def test_changes_are_on_disk_after_the_server_stops(make_database):
+    make_database()
+    database_server = server.DatabaseServer()
+
+    async def run():
+        listener = await asyncio.start_unix_server(database_server.handle_client, SOCKET)
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(SOCKET)
+            writer.write(b'{"db": "people", "op": "add", "record": {"name": "ada"}}\n')
+            await writer.drain()
+            response = await reader.readline()
+            writer.close()
+        await database_server.close()
+        return response
+
+    assert b'"ok": true' in asyncio.run(run())
+    assert [record["name"] for record in Database("people").iter_records()] == ["ada"]
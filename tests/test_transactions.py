@@ -0,0 +1,167 @@
+# Tests of transactions: a commit applies every change or none (binary databases only against errors found before
+# their changes are made), rollback discards them, the changes of a transaction are one line of the write-ahead log,
+# and threads committing at the same time share writes to the log.
+import json
+import threading
+import time
+
+import pytest
+
+import file_manager as fm
+import record_store as rs
+import write_ahead_log as wal
+from database import Database
+
+STORAGES = ["json", "binary", "zlib"]
+
+
+def names(database):
+    return {record["_id"]: record["name"] for record in database.iter_records()}
+
+
+def fill(database, *values):
+    for value in values:
+        database.add({"name": value})
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_commit_applies_every_change(make_database, storage):
+    database = Database(make_database(storage=storage))
+    fill(database, "ada", "bob")
+
+    with database.begin() as transaction:
+        transaction.add({"name": "cy"})
+        transaction.update(1, {"name": "alice"})
+        transaction.delete(2)
+        assert names(database) == {1: "ada", 2: "bob"}  # Nothing is applied before the commit
+
+    assert transaction.results == [3, 1, 2]
+    assert names(database) == {1: "alice", 3: "cy"}
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_rollback_discards_the_changes(make_database, storage):
+    database = Database(make_database(storage=storage))
+    fill(database, "ada")
+
+    transaction = database.begin()
+    transaction.add({"name": "bob"})
+    transaction.delete(1)
+    assert transaction.rollback() == 2
+
+    assert names(database) == {1: "ada"}
+    with pytest.raises(ValueError):
+        transaction.commit()
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_commit_fails_as_a_whole_when_a_record_is_gone(make_database, storage):
+    database = Database(make_database(storage=storage))
+    fill(database, "ada", "bob")
+
+    transaction = database.begin()
+    transaction.add({"name": "cy"})
+    transaction.update(1, {"name": "alice"})
+    transaction.update(2, {"name": "bobby"})
+    database.delete(2)  # Deleted by someone else before the commit
+
+    with pytest.raises(ValueError, match="no changes were made"):
+        transaction.commit()
+    assert transaction.state == "failed"
+    assert names(database) == {1: "ada"}
+    assert names(Database(database.name)) == {1: "ada"}
+
+
+def test_binary_commit_fails_as_a_whole_when_a_value_does_not_fit(make_database):
+    database = Database(make_database(storage="binary", fields={"name": 3}))
+    fill(database, "old", "two")
+
+    transaction = database.begin()
+    transaction.update(1, {"name": "new"})
+    transaction.update(2, {"name": "ééé"})  # Three characters, but six bytes in UTF-8
+
+    with pytest.raises(ValueError, match="no changes were made"):
+        transaction.commit()
+    assert names(database) == {1: "old", 2: "two"}
+    database.close()
+    assert names(Database(database.name)) == {1: "old", 2: "two"}
+
+
+def test_binary_commit_that_cannot_be_synced_says_changes_may_be_stored(make_database, monkeypatch):
+    database = Database(make_database(storage="binary"))
+    fill(database, "ada")
+
+    def fail(store):
+        raise OSError("disk full")
+
+    transaction = database.begin()
+    transaction.update(1, {"name": "alice"})
+    with monkeypatch.context() as patch:
+        patch.setattr(rs.RecordStore, "sync", fail)
+        with pytest.raises(ValueError, match="may already be stored"):
+            transaction.commit()
+    assert transaction.state == "failed"
+
+
+def test_transaction_is_one_log_line(make_database):
+    database = Database(make_database())
+    fill(database, "ada")
+
+    with database.begin() as transaction:
+        transaction.add({"name": "bob"})
+        transaction.update(1, {"name": "alice"})
+
+    with open(wal.log_path(database.name)) as f:
+        last = json.loads(f.read().splitlines()[-1])
+    assert last["op"] == "transaction"
+    assert [entry["op"] for entry in last["entries"]] == ["add", "edit"]
+    assert fm.load_data_file(database.name) == [{"name": "alice", "_id": 1}, {"name": "bob", "_id": 2}]
+
+
+def test_torn_transaction_is_dropped_as_a_whole(make_database):
+    database = Database(make_database())
+    fill(database, "ada")
+    with database.begin() as transaction:
+        transaction.add({"name": "bob"})
+        transaction.delete(1)
+
+    with open(wal.log_path(database.name), 'r+') as f:
+        data = f.read()
+        f.seek(0)
+        f.truncate()
+        f.write(data[:-20])  # The crash cut the transaction line short
+
+    assert fm.load_data_file(database.name) == [{"name": "ada", "_id": 1}]
+
+
+def test_concurrent_commits_share_log_writes(make_database, monkeypatch):
+    database = Database(make_database())
+    fill(database, *(f"r{number}" for number in range(8)))
+
+    appends = []
+    append_entries = wal.append_entries
+
+    def slow_append(*args):
+        appends.append(len(args[1]))
+        time.sleep(0.05)  # Long enough for the other committers to queue up behind this one
+        append_entries(*args)
+
+    monkeypatch.setattr(wal, "append_entries", slow_append)
+    start = threading.Barrier(8)
+
+    def commit(number):
+        transaction = database.begin()
+        transaction.update(number + 1, {"name": f"t{number}"})
+        start.wait()
+        transaction.commit()
+
+    threads = [threading.Thread(target=commit, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(appends) == 8  # One log entry per transaction
+    assert len(appends) < 8  # Some of them were written together
+    assert names(database) == {number + 1: f"t{number}" for number in range(8)}
+    assert names(Database(database.name)) == names(database)
@@ -0,0 +1,87 @@
+# Tests of the write-ahead log: replaying logged changes over the data file, and recovering from a torn last line and
+# from a log left behind by an interrupted checkpoint.
+import json
+import os
+import zlib
+
+import file_manager as fm
+import write_ahead_log as wal
+from database import Database
+
+
+def log_lines(db_name):
+    with open(wal.log_path(db_name)) as f:
+        return f.read().splitlines()
+
+
+def test_changes_are_logged_and_replayed(make_database):
+    db_name = make_database()
+    database = Database(db_name)
+    first = database.add({"name": "ada"})
+    second = database.add({"name": "bob"})
+    database.update(first, {"name": "alice"})
+    database.delete(second)
+
+    with open(f"{db_name}_data.json") as f:
+        assert json.load(f) == []  # Nothing was folded into the data file yet
+    assert [json.loads(line)["op"] for line in log_lines(db_name)] == ["base", "add", "add", "edit", "delete"]
+    assert fm.load_data_file(db_name) == [{"name": "alice", "_id": 1}, {"_id": 2, "_deleted": True}]
+
+
+def test_flush_folds_the_log_into_the_data_file(make_database):
+    db_name = make_database()
+    database = Database(db_name)
+    database.add({"name": "ada"})
+    database.flush()
+
+    assert not os.path.exists(wal.log_path(db_name))
+    with open(f"{db_name}_data.json") as f:
+        assert json.load(f) == [{"name": "ada", "_id": 1}]
+
+
+def test_torn_last_line_is_ignored_and_truncated(make_database):
+    db_name = make_database()
+    Database(db_name).add({"name": "ada"})
+    with open(wal.log_path(db_name), 'a') as f:
+        f.write('{"op":"add","record":{"name":"bo')  # A write cut short by a crash
+
+    assert fm.load_data_file(db_name) == [{"name": "ada", "_id": 1}]
+
+    Database(db_name).add({"name": "cy"})
+    assert all(line.endswith("}") for line in log_lines(db_name))
+    assert [record["name"] for record in fm.load_data_file(db_name)] == ["ada", "cy"]
+
+
+def test_replay_stops_at_a_line_with_a_bad_checksum(make_database):
+    db_name = make_database()
+    database = Database(db_name)
+    for name in ("ada", "bob", "cy"):
+        database.add({"name": name})
+    lines = log_lines(db_name)
+    lines[2] = lines[2].replace("bob", "bib")  # Damaged in place; its checksum no longer matches
+    with open(wal.log_path(db_name), 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+    assert fm.load_data_file(db_name) == [{"name": "ada", "_id": 1}]
+
+
+def test_log_of_an_older_data_file_is_not_replayed(make_database):
+    db_name = make_database()
+    Database(db_name).add({"name": "ada"})
+    stale_log = log_lines(db_name)
+
+    # A checkpoint writes the data file and then removes the log. If it is interrupted in between, the old log is
+    # still there but belongs to the previous data file, so it must not be applied a second time.
+    fm.write_data_file(db_name, [{"name": "ada", "_id": 1}])
+    with open(wal.log_path(db_name), 'w') as f:
+        f.write("\n".join(stale_log) + "\n")
+
+    assert fm.load_data_file(db_name) == [{"name": "ada", "_id": 1}]
+
+
+def test_base_entry_records_the_checksum_of_the_data_file(make_database):
+    db_name = make_database()
+    Database(db_name).add({"name": "ada"})
+    with open(f"{db_name}_data.json", 'rb') as f:
+        expected = zlib.crc32(f.read())
+    assert json.loads(log_lines(db_name)[0])["crc32"] == expected
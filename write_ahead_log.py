@@ -0,0 +1,167 @@
+# Importing necessary modules for the append-only write-ahead log.
+# The `json` module is used to write each change as one line of JSON (the JSON Lines format).
+# The `os` module is used to flush changes to disk and to manage the log file.
+# The `zlib` module provides the CRC-32 checksums that detect torn or corrupted log lines.
+# The `instrumentation` module counts the bytes appended to the log when profiling is on.
+import json
+import os
+import zlib
+import instrumentation as instr
+
+# Once the log grows past this many bytes it is checkpointed back into the data file, which keeps replay on open cheap.
+CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+
+# This function returns the path of the write-ahead log of a database.
+def log_path(db_name):
+    return f"{db_name}_data.wal"
+
+
+# This function returns the size of the log in bytes, or 0 if the database has no log.
+def log_size(db_name):
+    try:
+        return os.path.getsize(log_path(db_name))
+    except OSError:
+        return 0
+
+
+# This function checks whether the log has grown large enough to be checkpointed into the data file.
+def needs_checkpoint(db_name):
+    return log_size(db_name) > CHECKPOINT_BYTES
+
+
+# This function serializes one log entry and appends its checksum. The checksum covers the entry without the
+# `crc` key, so it can be verified on replay by serializing the entry the same way.
+def encode_entry(entry):
+    payload = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+    entry = dict(entry, crc=zlib.crc32(payload.encode("utf-8")))
+    return json.dumps(entry, separators=(",", ":")) + "\n"
+
+
+# This function checks the checksum of a decoded log line and returns the entry without it,
+# or `None` if the line does not match its checksum.
+def decode_entry(entry):
+    crc = entry.pop("crc", None)
+    payload = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+    if crc != zlib.crc32(payload.encode("utf-8")):
+        return None
+    return entry
+
+
+# This function starts a new log for the given contents of the data file. The first line of every log records the
+# checksum of the data file it applies to; a log left behind by an interrupted checkpoint therefore no longer matches
+# the rewritten data file and is ignored instead of being applied twice.
+def reset_log(db_name, base_bytes):
+    temp_file = log_path(db_name) + ".tmp"
+    with open(temp_file, 'w') as f:
+        f.write(encode_entry({"op": "base", "crc32": zlib.crc32(base_bytes)}))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, log_path(db_name))
+
+
+# This function removes the log of a database, if there is one.
+def clear_log(db_name):
+    if os.path.exists(log_path(db_name)):
+        os.remove(log_path(db_name))
+
+
+# This function appends a batch of entries to the log with a single write followed by an fsync.
+# Each entry is a dict with an `op` of "add", "edit" or "delete" and, depending on the operation, the `id` of the
+# record it applies to and the new `record`. The changes of a transaction are one "transaction" entry holding them
+# all in its `entries`, so they are written as one line with one checksum: a crash in the middle of the write leaves
+# a damaged line that is dropped as a whole, never some of the changes without the rest. The data file is read only
+# when the log has to be started.
+def append_entries(db_name, entries, data_file):
+    if not os.path.exists(log_path(db_name)):
+        with open(data_file, 'rb') as f:
+            reset_log(db_name, f.read())
+    else:
+        truncate_torn_tail(db_name)
+
+    data = "".join(encode_entry(entry) for entry in entries)
+    instr.count("bytes written", len(data))
+    with open(log_path(db_name), 'a') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# This function cuts off a partial last line left behind by an interrupted append, so that new entries are not
+# written after a damaged line (where replay would never reach them).
+def truncate_torn_tail(db_name):
+    with open(log_path(db_name), 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        f.truncate(f.read().rfind(b"\n") + 1)
+
+
+# This function reads the entries of the log that apply to the given contents of the data file.
+# Reading stops at the first line that cannot be decoded or fails its checksum, which is what a write interrupted
+# by a crash leaves behind; everything before it is still replayed.
+def read_entries(db_name, base_bytes):
+    if not os.path.exists(log_path(db_name)):
+        return []
+
+    entries = []
+    with open(log_path(db_name), 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            try:
+                entry = decode_entry(json.loads(line))
+            except (json.JSONDecodeError, AttributeError):
+                entry = None
+            if entry is None:
+                print(f"Warning: ignoring damaged log entries from line {line_number} of '{log_path(db_name)}'.")
+                break
+            if entry["op"] == "base":
+                if entry["crc32"] != zlib.crc32(base_bytes):
+                    return []  # The log belongs to an older version of the data file
+                continue
+            entries.append(entry)
+    return entries
+
+
+# This function returns the tombstone that takes the place of a deleted record until the data file is compacted.
+def tombstone(record_id):
+    return {"_id": record_id, "_deleted": True}
+
+
+# This function yields the changes held by log entries in the order they were made, taking the changes of a
+# transaction out of its entry.
+def iter_changes(entries):
+    for entry in entries:
+        if entry["op"] == "transaction":
+            yield from iter_changes(entry["entries"])
+        else:
+            yield entry
+
+
+# This function applies log entries to a list of records in the order they were written and returns the list.
+# Edits and deletes refer to records by their `_id`; a deleted record is replaced by a tombstone, so the positions
+# of the other records never change.
+def apply_entries(records, entries):
+    positions = None
+    for entry in iter_changes(entries):
+        if entry["op"] == "add":
+            records.append(entry["record"])
+            if positions is not None:
+                positions[entry["record"]["_id"]] = len(records) - 1
+            continue
+        if positions is None:
+            positions = {record["_id"]: position for position, record in enumerate(records)}
+        position = positions[entry["id"]]
+        if entry["op"] == "edit":
+            records[position] = entry["record"]
+        elif entry["op"] == "delete":
+            records[position] = tombstone(entry["id"])
+    return records
+
+
+# This function brings a list of records loaded from the data file up to date by replaying the log over it.
+def replay(db_name, base_bytes, records):
+    return apply_entries(records, read_entries(db_name, base_bytes))